@@ -0,0 +1,148 @@
+"""
+Marquage des absences.
+
+Un employé qui ne pointe pas n'a aucune ligne de présence : sans marquage, un
+jour d'absence ne se distingue pas d'un jour sans données. ``mark`` insère une
+ligne ``absent`` pour chaque employé actif sans présence, par jour ouvré
+(``ATTENDANCE_WORKING_DAYS``) hors jours fériés (``Event`` de type
+``holiday``) et hors congés approuvés.
+
+Le calcul est ensembliste : pour une organisation, les jours candidats sont
+croisés avec ses employés, les présences et congés existants étant exclus par
+anti-jointure, dans un seul ``INSERT ... SELECT`` par mois traité. Le
+marquage est idempotent (``ON CONFLICT DO NOTHING``) et un pointage ultérieur
+complète la ligne absente (api.punches). Les écritures SQL ne passent pas par
+les signaux : les cumuls mensuels (api.rollups) sont mis à jour explicitement.
+"""
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from . import punches, rollups
+from .models import Attendance, AttendanceArchive, Employee, Event, LeaveRequest
+
+
+def get_working_days():
+    """Jours ouvrés (0 = lundi ... 6 = dimanche)"""
+    return set(getattr(settings, 'ATTENDANCE_WORKING_DAYS', (0, 1, 2, 3, 4)))
+
+
+def holidays(organization, start, end):
+    """Jours fériés de ``organization`` entre ``start`` et ``end`` (événements ``holiday``, dates locales)"""
+    events = Event.objects.filter(
+        organization=organization,
+        event_type=Event.TYPE_HOLIDAY,
+        start_time__date__lte=end,
+        end_time__date__gte=start,
+    ).values_list('start_time', 'end_time')
+    days = set()
+    for start_time, end_time in events:
+        day = timezone.localtime(start_time).date()
+        last = max(day, timezone.localtime(end_time).date())
+        while day <= last:
+            days.add(day)
+            day += datetime.timedelta(days=1)
+    return days
+
+
+def working_days(organization, start, end):
+    """Jours ouvrés non fériés de ``start`` à ``end`` inclus"""
+    weekdays = get_working_days()
+    closed = holidays(organization, start, end)
+    days = []
+    day = start
+    while day <= end:
+        if day.weekday() in weekdays and day not in closed:
+            days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def _months(start, end):
+    """Découpe ``[start, end]`` en tranches d'un mois au plus"""
+    while start <= end:
+        last = min(rollups.month_end(start), end)
+        yield start, last
+        start = last + datetime.timedelta(days=1)
+
+
+def _candidates_sql(organization, days, columns):
+    """
+    ``(WITH days, SELECT columns ...)`` des employés actifs de ``organization`` sans présence ni
+    congé approuvé, croisés avec ``days`` (alias ``e`` pour l'employé, ``days.day`` pour le jour)
+    """
+    attendance = Attendance._meta.db_table
+    employee = Employee._meta.db_table
+    leave = LeaveRequest._meta.db_table
+    placeholder = 'CAST(%s AS date)' if connection.vendor == 'postgresql' else '%s'
+    with_sql = f"WITH days (day) AS (VALUES {', '.join(f'({placeholder})' for _ in days)})"
+    select_sql = (
+        f"SELECT {columns} FROM {employee} e CROSS JOIN days "
+        f"WHERE e.organization_id = %s AND e.is_active AND e.status = %s "
+        f"AND e.hire_date <= days.day AND (e.termination_date IS NULL OR e.termination_date >= days.day) "
+        f"AND NOT EXISTS (SELECT 1 FROM {attendance} a WHERE a.employee_id = e.id AND a.date = days.day) "
+        f"AND NOT EXISTS (SELECT 1 FROM {leave} l WHERE l.employee_id = e.id AND l.status = %s "
+        f"AND l.start_date <= days.day AND l.end_date >= days.day)"
+    )
+    params = [punches.prep_value('date', day) for day in days]
+    return with_sql, select_sql, params, [organization.pk, Employee.STATUS_ACTIVE, LeaveRequest.STATUS_APPROVED]
+
+
+def _insert(organization, days, now):
+    """Insère les absences des ``days`` ; retourne les cellules ``{(employee_id, date)}`` créées"""
+    if not punches.supports_upsert():
+        with_sql, select_sql, days_params, params = _candidates_sql(organization, days, 'e.id, days.day')
+        with connection.cursor() as cursor:
+            cursor.execute(f"{with_sql} {select_sql}", days_params + params)
+            rows = cursor.fetchall()
+        Attendance.objects.bulk_create(
+            [
+                Attendance(organization=organization, employee_id=employee_id, date=day, status=Attendance.STATUS_ABSENT)
+                for employee_id, day in rows
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        return set(rows)
+    
+    table = Attendance._meta.db_table
+    with_sql, select_sql, days_params, params = _candidates_sql(
+        organization, days, "e.organization_id, e.id, days.day, %s, %s, '', %s, %s"
+    )
+    # Le WHERE du SELECT lève l'ambiguïté de syntaxe SQLite entre jointure et ON CONFLICT
+    sql = (
+        f"{with_sql} INSERT INTO {table} "
+        f"(organization_id, employee_id, date, status, hours_worked, notes, created_at, updated_at) "
+        f"{select_sql} ON CONFLICT (employee_id, date) DO NOTHING RETURNING employee_id, date"
+    )
+    values = [
+        Attendance.STATUS_ABSENT, punches.prep_value('hours_worked', Decimal('0')),
+        punches.prep_value('created_at', now), punches.prep_value('updated_at', now),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, days_params + values + params)
+        rows = cursor.fetchall()
+    date_field = Attendance._meta.get_field('date')
+    return {(employee_id, date_field.to_python(day)) for employee_id, day in rows}
+
+
+def mark(organization, start, end=None):
+    """Marque absents les employés sans présence de ``start`` à ``end`` (inclus) ; retourne le nombre de lignes créées"""
+    end = end or start
+    now = timezone.now()
+    # Une année archivée n'est plus en table : l'anti-jointure y verrait tout le monde absent
+    archived = set(AttendanceArchive.objects.filter(organization=organization).values_list('year', flat=True))
+    created = 0
+    for first, last in _months(start, end):
+        if first.year in archived:
+            continue
+        days = working_days(organization, first, last)
+        if not days:
+            continue
+        cells = _insert(organization, days, now)
+        rollups.refresh(cells)
+        created += len(cells)
+    return created
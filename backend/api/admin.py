@@ -2,8 +2,8 @@ from django.contrib import admin
 from .models import (
     Organization, OrganizationMember,
     Department, Employee,
-    LeaveType, LeaveRequest,
-    Attendance, Document, Payroll
+    LeaveType, LeaveRequest, LeaveApproval,
+    Attendance, AttendanceMonthlySummary, AttendanceArchive, PunchEvent, Document, Payroll
 )
 
 
@@ -30,6 +30,9 @@ class OrganizationAdmin(admin.ModelAdmin):
         ('Contact', {
             'fields': ('email', 'phone', 'address', 'website')
         }),
+        ('Banque', {
+            'fields': ('siret', 'iban', 'bic')
+        }),
         ('Paramètres', {
             'fields': ('timezone', 'date_format', 'currency')
         }),
@@ -95,7 +98,7 @@ class EmployeeAdmin(admin.ModelAdmin):
             )
         }),
         ('Salaire', {
-            'fields': ('salary', 'salary_currency'),
+            'fields': ('salary', 'salary_currency', 'iban', 'bic'),
             'classes': ('collapse',)
         }),
         ('Documents', {
@@ -123,6 +126,14 @@ class LeaveTypeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'code', 'description')
 
 
+class LeaveApprovalInline(admin.TabularInline):
+    model = LeaveApproval
+    extra = 0
+    fields = ('approver', 'level', 'status', 'decided_at')
+    readonly_fields = ('decided_at',)
+    autocomplete_fields = ('approver',)
+
+
 @admin.register(LeaveRequest)
 class LeaveRequestAdmin(admin.ModelAdmin):
     list_display = (
@@ -133,6 +144,7 @@ class LeaveRequestAdmin(admin.ModelAdmin):
     search_fields = ('employee__first_name', 'employee__last_name', 'reason')
     readonly_fields = ('total_days', 'created_at', 'updated_at', 'approved_at')
     autocomplete_fields = ('employee', 'approved_by')
+    inlines = [LeaveApprovalInline]
     
     fieldsets = (
         ('Demande', {
@@ -171,6 +183,35 @@ class AttendanceAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
 
 
+@admin.register(AttendanceMonthlySummary)
+class AttendanceMonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        'employee', 'month', 'hours_worked',
+        'days_present', 'days_late', 'days_half_day', 'days_absent'
+    )
+    list_filter = ('organization', 'month')
+    search_fields = ('employee__first_name', 'employee__last_name')
+    readonly_fields = ('updated_at',)
+    date_hierarchy = 'month'
+
+
+@admin.register(AttendanceArchive)
+class AttendanceArchiveAdmin(admin.ModelAdmin):
+    list_display = ('organization', 'year', 'rows', 'updated_at')
+    list_filter = ('organization', 'year')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(PunchEvent)
+class PunchEventAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'timestamp', 'direction', 'device_id', 'received_at')
+    list_filter = ('organization', 'direction', 'device_id')
+    search_fields = ('employee__first_name', 'employee__last_name', 'employee__employee_id', 'device_id')
+    readonly_fields = ('received_at',)
+    autocomplete_fields = ('employee',)
+    date_hierarchy = 'timestamp'
+
+
 # ==================== DOCUMENT ====================
 
 @admin.register(Document)
@@ -194,7 +235,7 @@ class PayrollAdmin(admin.ModelAdmin):
     )
     list_filter = ('organization', 'status', 'year', 'month')
     search_fields = ('employee__first_name', 'employee__last_name')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('gross_salary', 'created_at', 'updated_at')
     autocomplete_fields = ('employee',)
     
     fieldsets = (
@@ -202,7 +243,7 @@ class PayrollAdmin(admin.ModelAdmin):
             'fields': ('organization', 'employee', 'month', 'year')
         }),
         ('Montants', {
-            'fields': ('base_salary', 'bonuses', 'deductions', 'net_salary')
+            'fields': ('base_salary', 'bonuses', 'deductions', 'gross_salary', 'net_salary')
         }),
         ('Statut', {
             'fields': ('status', 'payment_date', 'notes')
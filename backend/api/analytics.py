@@ -0,0 +1,294 @@
+"""
+Statistiques agrégées en base : présences et masse salariale.
+
+La carte des arrivées compte les heures d'arrivée (``check_in``) par
+département, jour de la semaine et créneau de 15 minutes dans une seule
+requête ``GROUP BY`` : seuls les compteurs quittent la base, jamais les
+présences elles-mêmes. Le résultat, une matrice compacte, est mis en cache
+par organisation, période et département.
+
+Le récapitulatif de paie totalise brut, primes, retenues et net par mois,
+département et type de contrat, pour l'année demandée et la précédente
+(comparaison d'une année sur l'autre), en une requête ``GROUP BY``. Les lignes
+groupées sont mises en cache par organisation, année et mois ; toute fiche de
+paie modifiée invalide les périodes qui la contiennent.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, Q, Sum, Value
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, ExtractMinute, Floor
+
+from . import timesheets
+from .models import Attendance, Department, Employee, Payroll
+
+
+SLOT_MINUTES = 15
+
+WEEKDAYS = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+HEATMAP_CACHE_KEY = 'arrival_heatmap:{organization_id}:{start}:{end}:{department_id}'
+HEATMAP_CACHE_TIMEOUT = 900
+
+
+def _late_window(rules):
+    """``(après, avant)`` : une arrivée dans cet intervalle est un retard (mêmes règles que les feuilles de temps)"""
+    work_start = datetime.datetime.strptime(rules.work_start, '%H:%M')
+    after = work_start + datetime.timedelta(minutes=rules.late_grace)
+    before = work_start + datetime.timedelta(hours=rules.daily_threshold)
+    if before.date() != work_start.date():
+        before = work_start.replace(hour=23, minute=59, second=59)
+    return after.time(), before.time()
+
+
+def _slot_label(slot):
+    minutes = slot * SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def build_arrival_heatmap(organization_id, start, end, department_id=None):
+    """
+    Arrivées de ``start`` à ``end`` inclus par département, jour (lundi → dimanche) et créneau :
+    ``{slots, weekdays, departments: [{id, name, arrivals, late, arrivals_by_weekday, late_by_weekday, matrix}]}``,
+    ``matrix[jour][créneau]`` étant un nombre d'arrivées
+    """
+    late_after, late_before = _late_window(timesheets.get_rules())
+    attendances = Attendance.objects.filter(
+        organization_id=organization_id,
+        date__range=(start, end),
+        check_in__isnull=False,
+    )
+    if department_id is not None:
+        attendances = attendances.filter(employee__department_id=department_id)
+    cells = attendances.annotate(
+        weekday=ExtractIsoWeekDay('date'),
+        slot=Floor(
+            (ExtractHour('check_in') * 60 + ExtractMinute('check_in')) / Value(SLOT_MINUTES),
+            output_field=IntegerField()
+        ),
+    ).order_by().values('employee__department_id', 'weekday', 'slot').annotate(
+        arrivals=Count('id'),
+        late=Count('id', filter=Q(check_in__gt=late_after, check_in__lt=late_before)),
+    )
+    cells = [
+        (row['employee__department_id'], row['weekday'] - 1, int(row['slot']), row['arrivals'], row['late'])
+        for row in cells
+    ]
+    
+    # Créneaux limités à la plage observée : la matrice reste compacte
+    first = min((slot for _, _, slot, _, _ in cells), default=0)
+    last = max((slot for _, _, slot, _, _ in cells), default=-1)
+    names = dict(Department.objects.filter(
+        pk__in={department for department, *_ in cells if department is not None}
+    ).values_list('id', 'name'))
+    
+    departments = {}
+    for department, weekday, slot, arrivals, late in cells:
+        entry = departments.get(department)
+        if entry is None:
+            entry = departments[department] = {
+                'id': department,
+                'name': names.get(department, "Sans département"),
+                'arrivals': 0,
+                'late': 0,
+                'arrivals_by_weekday': [0] * 7,
+                'late_by_weekday': [0] * 7,
+                'matrix': [[0] * (last - first + 1) for _ in range(7)],
+            }
+        entry['arrivals'] += arrivals
+        entry['late'] += late
+        entry['arrivals_by_weekday'][weekday] += arrivals
+        entry['late_by_weekday'][weekday] += late
+        entry['matrix'][weekday][slot - first] += arrivals
+    
+    for entry in departments.values():
+        entry['late_rate'] = round(entry['late'] / entry['arrivals'], 4) if entry['arrivals'] else 0
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'slot_minutes': SLOT_MINUTES,
+        'slots': [_slot_label(slot) for slot in range(first, last + 1)],
+        'weekdays': WEEKDAYS,
+        'late_after': late_after.strftime('%H:%M'),
+        'departments': sorted(departments.values(), key=lambda entry: (entry['id'] is None, entry['name'])),
+    }
+
+
+def get_arrival_heatmap(organization_id, start, end, department_id=None):
+    key = HEATMAP_CACHE_KEY.format(
+        organization_id=organization_id, start=start.isoformat(), end=end.isoformat(), department_id=department_id or 'all'
+    )
+    heatmap = cache.get(key)
+    if heatmap is None:
+        heatmap = build_arrival_heatmap(organization_id, start, end, department_id)
+        cache.set(key, heatmap, HEATMAP_CACHE_TIMEOUT)
+    return heatmap
+
+
+# ==================== MASSE SALARIALE ====================
+
+PAYROLL_SUMMARY_CACHE_KEY = 'payroll_summary:v2:{organization_id}:{year}:{month}'
+PAYROLL_SUMMARY_CACHE_TIMEOUT = 3600
+
+PAYROLL_AMOUNTS = ['base_salary', 'bonuses', 'deductions', 'gross', 'net_salary']
+CENT = Decimal('0.01')
+PAYROLL_PIVOTS = {
+    'department': 'Département',
+    'employment_type': 'Type de contrat',
+}
+
+
+def _payroll_summary_rows(organization_id, year, month=None):
+    """Totaux groupés par année, mois, statut, département et type de contrat (année ``year`` et précédente)"""
+    payrolls = Payroll.objects.filter(organization_id=organization_id, year__in=(year - 1, year))
+    if month is not None:
+        payrolls = payrolls.filter(month=month)
+    rows = payrolls.order_by().values(
+        'year', 'month', 'status', 'employee__department_id', 'employee__department__name', 'employee__employment_type'
+    ).annotate(
+        payslips=Count('id'),
+        base_salary=Sum('base_salary'),
+        bonuses=Sum('bonuses'),
+        deductions=Sum('deductions'),
+        gross=Sum('gross_salary'),
+        net_salary=Sum('net_salary'),
+    )
+    return [
+        (
+            row['year'], row['month'], row['status'], row['employee__department_id'], row['employee__department__name'],
+            row['employee__employment_type'], row['payslips'], row['base_salary'], row['bonuses'], row['deductions'],
+            row['gross'], row['net_salary'],
+        )
+        for row in rows
+    ]
+
+
+def get_payroll_summary_rows(organization_id, year, month=None):
+    key = PAYROLL_SUMMARY_CACHE_KEY.format(organization_id=organization_id, year=year, month=month or 'all')
+    rows = cache.get(key)
+    if rows is None:
+        rows = _payroll_summary_rows(organization_id, year, month)
+        cache.set(key, rows, PAYROLL_SUMMARY_CACHE_TIMEOUT)
+    return rows
+
+
+def invalidate_payroll_summary(organization_id, year, month):
+    """Périodes contenant le mois ``month/year`` : l'année elle-même et la suivante (qui s'y compare)"""
+    cache.delete_many([
+        PAYROLL_SUMMARY_CACHE_KEY.format(organization_id=organization_id, year=current, month=current_month)
+        for current in (year, year + 1)
+        for current_month in (month, 'all')
+    ])
+
+
+def _empty_totals():
+    return {'payslips': 0, **{amount: Decimal('0.00') for amount in PAYROLL_AMOUNTS}}
+
+
+def _amounts(base_salary, bonuses, deductions, gross, net_salary):
+    return {
+        'base_salary': base_salary,
+        'bonuses': bonuses,
+        'deductions': deductions,
+        'gross': gross,
+        'net_salary': net_salary,
+    }
+
+
+def amount_text(value):
+    """Montant en chaîne au centime, comme les DecimalField des sérialiseurs (``COERCE_DECIMAL_TO_STRING``)"""
+    return str(Decimal(value).quantize(CENT))
+
+
+def amounts_text(totals):
+    return {key: amount_text(value) if isinstance(value, Decimal) else value for key, value in totals.items()}
+
+
+def _add(totals, payslips, amounts):
+    totals['payslips'] += payslips
+    for amount, value in amounts.items():
+        totals[amount] += value
+
+
+def _compare(current, previous):
+    """``{current, previous, change}``, ``change`` étant l'évolution relative de chaque montant (``None`` sans base)"""
+    return {
+        'current': amounts_text(current),
+        'previous': amounts_text(previous),
+        'change': {
+            amount: round(float((current[amount] - previous[amount]) / previous[amount]), 4) if previous[amount] else None
+            for amount in PAYROLL_AMOUNTS
+        },
+    }
+
+
+def build_payroll_summary(organization_id, year, month=None, statuses=None, pivot=None, metric='net_salary'):
+    """
+    Récapitulatif de la masse salariale de ``year`` (ou du seul mois ``month``) comparé à l'année précédente :
+    totaux, puis détail par mois, département et type de contrat. ``statuses`` limite aux fiches de ces statuts.
+    ``pivot`` (``department`` ou ``employment_type``) ajoute un tableau croisé ``metric`` par mois.
+    """
+    employment_types = dict(Employee.EMPLOYMENT_CHOICES)
+    totals = {year: _empty_totals(), year - 1: _empty_totals()}
+    dimensions = {'month': {}, 'department': {}, 'employment_type': {}}
+    labels = {'department': {}, 'employment_type': {}}
+    pivot_cells = defaultdict(lambda: defaultdict(Decimal))
+    
+    rows = get_payroll_summary_rows(organization_id, year, month)
+    for row_year, row_month, status, department, department_name, employment_type, payslips, *values in rows:
+        if statuses and status not in statuses:
+            continue
+        amounts = _amounts(*values)
+        _add(totals[row_year], payslips, amounts)
+        keys = {'month': row_month, 'department': department, 'employment_type': employment_type}
+        labels['department'][department] = department_name or "Sans département"
+        labels['employment_type'][employment_type] = employment_types.get(employment_type, employment_type)
+        for dimension, key in keys.items():
+            entry = dimensions[dimension].get(key)
+            if entry is None:
+                entry = dimensions[dimension][key] = {year: _empty_totals(), year - 1: _empty_totals()}
+            _add(entry[row_year], payslips, amounts)
+        if pivot and row_year == year:
+            pivot_cells[keys[pivot]][row_month] += amounts[metric]
+    
+    def detail(dimension, key_name):
+        entries = []
+        for key, entry in dimensions[dimension].items():
+            line = {key_name: key}
+            if dimension in labels:
+                line['name'] = labels[dimension][key]
+            entries.append({**line, **_compare(entry[year], entry[year - 1])})
+        if dimension == 'month':
+            return sorted(entries, key=lambda entry: entry['month'])
+        return sorted(entries, key=lambda entry: (entry[key_name] is None, entry['name']))
+    
+    summary = {
+        'year': year,
+        'previous_year': year - 1,
+        'month': month,
+        'statuses': sorted(statuses) if statuses else None,
+        'totals': _compare(totals[year], totals[year - 1]),
+        'by_month': detail('month', 'month'),
+        'by_department': detail('department', 'id'),
+        'by_employment_type': detail('employment_type', 'code'),
+    }
+    if pivot:
+        months = [month] if month else list(range(1, 13))
+        summary['pivot'] = {
+            'rows': pivot,
+            'label': PAYROLL_PIVOTS[pivot],
+            'metric': metric,
+            'months': months,
+            'lines': sorted((
+                {
+                    'key': key,
+                    'name': labels[pivot][key],
+                    'values': [amount_text(cells[current]) for current in months],
+                    'total': amount_text(sum(cells.values(), Decimal('0.00'))),
+                }
+                for key, cells in pivot_cells.items()
+            ), key=lambda line: (line['key'] is None, line['name'])),
+        }
+    return summary
@@ -0,0 +1,205 @@
+"""
+Circuit d'approbation des congés.
+
+Les approbateurs sont calculés une seule fois, à la création de la demande,
+à partir de la chaîne hiérarchique (manager, manager du manager, ...) et du
+manager du département. La boîte de réception d'un approbateur devient alors
+une simple lecture indexée sur ``LeaveApproval(approver, status)``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Employee, LeaveApproval, LeaveRequest
+
+
+PENDING_COUNT_CACHE_KEY = 'leave_inbox:pending:{approver_id}'
+PENDING_COUNT_CACHE_TIMEOUT = 300
+
+NO_PENDING_STEP = "Aucune étape d'approbation en attente pour cet approbateur."
+
+
+class DecisionError(ValueError):
+    """Demande déjà approuvée, rejetée ou annulée, ou approbateur sans étape en attente"""
+
+
+def get_max_levels():
+    return getattr(settings, 'LEAVE_APPROVAL_LEVELS', 2)
+
+
+def build_approver_chain(employee):
+    """
+    Retourne la liste ordonnée des approbateurs ``[(employee, level), ...]``.
+
+    La chaîne des managers est chargée en une seule requête grâce à un
+    ``select_related`` de profondeur fixe (``LEAVE_APPROVAL_LEVELS``).
+    """
+    max_levels = get_max_levels()
+    related = ['department__manager']
+    if max_levels > 0:
+        related.append('__'.join(['manager'] * max_levels))
+
+    employee = Employee.objects.select_related(*related).get(pk=employee.pk)
+
+    chain = []
+    seen = {employee.pk}
+    manager = employee.manager
+    while manager is not None and len(chain) < max_levels:
+        if manager.pk in seen or not manager.is_active:
+            break
+        chain.append(manager)
+        seen.add(manager.pk)
+        manager = manager.manager
+
+    # Le manager du département valide en dernier s'il n'est pas déjà dans la chaîne
+    department_manager = employee.department.manager if employee.department else None
+    if department_manager and department_manager.is_active and department_manager.pk not in seen:
+        chain.append(department_manager)
+
+    return [(approver, level) for level, approver in enumerate(chain, start=1)]
+
+
+def invalidate_pending_count(*approver_ids):
+    cache.delete_many([PENDING_COUNT_CACHE_KEY.format(approver_id=pk) for pk in approver_ids])
+
+
+def pending_count(approver):
+    """Nombre de demandes en attente pour un approbateur (mis en cache)"""
+    key = PENDING_COUNT_CACHE_KEY.format(approver_id=approver.pk)
+    count = cache.get(key)
+    if count is None:
+        count = LeaveApproval.objects.filter(
+            approver=approver,
+            status=LeaveApproval.STATUS_PENDING
+        ).count()
+        cache.set(key, count, PENDING_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def assign_approvers(leave_request):
+    """Matérialise les étapes d'approbation d'une nouvelle demande"""
+    chain = build_approver_chain(leave_request.employee)
+    steps = [
+        LeaveApproval(
+            leave_request=leave_request,
+            approver=approver,
+            level=level,
+            status=LeaveApproval.STATUS_PENDING if level == 1 else LeaveApproval.STATUS_WAITING
+        )
+        for approver, level in chain
+    ]
+    LeaveApproval.objects.bulk_create(steps)
+    invalidate_pending_count(*[step.approver_id for step in steps if step.status == LeaveApproval.STATUS_PENDING])
+    return steps
+
+
+def _close_open_steps(leave_request, now):
+    """Clôture les étapes restantes quand la demande est tranchée"""
+    open_steps = leave_request.approvals.filter(
+        status__in=[LeaveApproval.STATUS_PENDING, LeaveApproval.STATUS_WAITING]
+    )
+    pending_ids = list(
+        open_steps.filter(status=LeaveApproval.STATUS_PENDING).values_list('approver_id', flat=True)
+    )
+    open_steps.update(status=LeaveApproval.STATUS_SKIPPED, decided_at=now)
+    return pending_ids
+
+
+def _lock_pending(leave_request):
+    """Verrouille la demande et la relit : deux décisions simultanées se succèdent, la seconde est refusée"""
+    status = LeaveRequest.objects.select_for_update().values_list('status', flat=True).get(pk=leave_request.pk)
+    if status != LeaveRequest.STATUS_PENDING:
+        raise DecisionError("Cette demande a déjà été traitée")
+    leave_request.refresh_from_db()
+
+
+@transaction.atomic
+def approve(leave_request, approver, override=False):
+    """
+    Enregistre l'approbation de ``approver``.
+
+    Retourne ``True`` si la demande est définitivement approuvée, ``False``
+    si elle passe simplement au niveau suivant. Avec ``override`` (admin/owner),
+    la demande est approuvée quel que soit le niveau courant. DecisionError si
+    elle a déjà été tranchée ou si, sans ``override``, ``approver`` n'a pas d'étape en attente.
+    """
+    _lock_pending(leave_request)
+    now = timezone.now()
+    touched = []
+
+    step = None
+    if approver is not None:
+        step = leave_request.approvals.select_for_update().filter(
+            approver=approver,
+            status=LeaveApproval.STATUS_PENDING
+        ).first()
+    if step is None and not override:
+        # Niveau déjà consommé (double envoi) : ne pas sauter les niveaux suivants
+        raise DecisionError(NO_PENDING_STEP)
+
+    if step is not None:
+        step.status = LeaveApproval.STATUS_APPROVED
+        step.decided_at = now
+        step.save(update_fields=['status', 'decided_at'])
+        touched.append(step.approver_id)
+
+        # Les autres approbateurs du même niveau n'ont plus à se prononcer
+        same_level = leave_request.approvals.filter(level=step.level, status=LeaveApproval.STATUS_PENDING)
+        touched += list(same_level.values_list('approver_id', flat=True))
+        same_level.update(status=LeaveApproval.STATUS_SKIPPED, decided_at=now)
+
+        next_level = leave_request.approvals.filter(
+            status=LeaveApproval.STATUS_WAITING
+        ).order_by('level').values_list('level', flat=True).first()
+
+        if next_level is not None and not override:
+            activated = leave_request.approvals.filter(level=next_level, status=LeaveApproval.STATUS_WAITING)
+            touched += list(activated.values_list('approver_id', flat=True))
+            activated.update(status=LeaveApproval.STATUS_PENDING)
+            invalidate_pending_count(*touched)
+            return False
+
+    touched += _close_open_steps(leave_request, now)
+
+    leave_request.status = LeaveRequest.STATUS_APPROVED
+    leave_request.approved_by = approver
+    leave_request.approved_at = now
+    leave_request.save()
+
+    invalidate_pending_count(*touched)
+    return True
+
+
+@transaction.atomic
+def reject(leave_request, approver, reason='', override=False):
+    """
+    Un rejet à n'importe quel niveau clôt la demande ; DecisionError si elle a déjà été tranchée
+    ou si, sans ``override``, ``approver`` n'a pas d'étape en attente
+    """
+    _lock_pending(leave_request)
+    now = timezone.now()
+    touched = []
+
+    step = leave_request.approvals.none()
+    if approver is not None:
+        step = leave_request.approvals.filter(approver=approver, status=LeaveApproval.STATUS_PENDING)
+        touched += list(step.values_list('approver_id', flat=True))
+    if not touched and not override:
+        raise DecisionError(NO_PENDING_STEP)
+    step.update(status=LeaveApproval.STATUS_REJECTED, decided_at=now)
+
+    touched += _close_open_steps(leave_request, now)
+
+    leave_request.status = LeaveRequest.STATUS_REJECTED
+    leave_request.rejection_reason = reason
+    leave_request.save()
+
+    invalidate_pending_count(*touched)
+
+
+def has_pending_step(leave_request, approver):
+    return approver is not None and leave_request.approvals.filter(
+        approver=approver,
+        status=LeaveApproval.STATUS_PENDING
+    ).exists()
@@ -1,7 +1,10 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
     def ready(self):
         import api.signals
+        from api.search import setup_search_backend_after_migrate
+        post_migrate.connect(setup_search_backend_after_migrate, sender=self)
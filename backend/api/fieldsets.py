@@ -0,0 +1,228 @@
+"""
+Champs à la demande (« sparse fieldsets ») : ``?fields=a,b``, ``?omit=c`` et
+``?expand=department,manager``.
+
+Les relations imbriquées déclarées dans ``Meta.expandable_fields`` ne sont
+rendues que si elles sont demandées via ``?expand``. Le serializer ne construit
+que les champs retenus et la vue en déduit un plan de requête : colonnes
+(``.only()``), jointures ``select_related`` et ``prefetch_related`` strictement
+nécessaires, y compris pour les serializers imbriqués.
+
+Les champs calculés (SerializerMethodField, propriétés, ``source='a.b'`` vers
+une méthode) déclarent leurs dépendances dans ``Meta.field_dependencies`` sous
+forme de chemins ORM. Un champ dont les dépendances restent inconnues désactive
+l'optimisation de la requête : la réponse est filtrée, la requête inchangée.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_field_list(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class SparseFieldsSerializerMixin:
+    """Serializer : accepte ``fields=[...]`` et ``omit=[...]`` à l'instanciation"""
+    
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in omit or ():
+            self.fields.pop(name, None)
+
+
+@lru_cache(maxsize=None)
+def serializer_field_names(serializer_class):
+    return tuple(serializer_class().fields)
+
+
+# ==================== PLAN DE REQUÊTE ====================
+
+def _resolve(model, path, columns, relations, prefetches):
+    """
+    Ajoute au plan ce qu'il faut charger pour ``path``. Un chemin qui s'arrête
+    sur une clé étrangère charge l'objet lié complet ; ``<fk>_id`` ne charge que
+    la colonne. Au-delà d'une relation inverse ou M2M, les relations suivantes
+    passent par la requête du prefetch. Retourne False si le chemin est inconnu.
+    """
+    parts = path.split('__')
+    prefix = ''
+    root = None
+    for index, part in enumerate(parts):
+        last = index == len(parts) - 1
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return False
+        
+        if not field.is_relation:
+            if last and root is None:
+                columns.add(prefix + part)
+            return last
+        if last and root is None and part == getattr(field, 'attname', None):
+            columns.add(prefix + field.name)
+            return True
+        
+        model = field.related_model
+        if not field.concrete:
+            # Relation inverse : le prefetch passe par le nom de l'accesseur
+            lookup = prefix + field.get_accessor_name()
+        else:
+            lookup = prefix + field.name
+        if field.many_to_many or not field.concrete:
+            root = lookup
+            prefetches.setdefault(root, (model, set()))
+        elif root is not None:
+            prefetches[root][1].add(lookup[len(root) + 2:])
+        else:
+            columns.add(lookup)
+            relations.add(lookup)
+        prefix = lookup + '__'
+        if last and root is None:
+            columns.update(prefix + related.name for related in model._meta.concrete_fields)
+    return True
+
+
+@lru_cache(maxsize=None)
+def _serializer_paths(serializer_class, field_names):
+    """Chemins ORM lus par ``field_names`` (serializers imbriqués compris) ; None si inconnus"""
+    dependencies = getattr(serializer_class.Meta, 'field_dependencies', {})
+    declared = serializer_class().fields
+    
+    paths = []
+    for name in field_names:
+        if name in dependencies:
+            paths.extend(dependencies[name])
+            continue
+        
+        field = declared[name]
+        nested = getattr(field, 'child', field)
+        if field.source == '*':
+            return None
+        path = '__'.join(field.source_attrs)
+        if isinstance(nested, serializers.BaseSerializer):
+            nested_class = type(nested)
+            nested_paths = _serializer_paths(nested_class, serializer_field_names(nested_class))
+            if nested_paths is None:
+                paths.append(path)
+            else:
+                paths.append(f'{path}__{nested_class.Meta.model._meta.pk.name}')
+                paths.extend(f'{path}__{nested_path}' for nested_path in nested_paths)
+        elif isinstance(field, serializers.RelatedField):
+            paths.append(path + '_id')
+        else:
+            paths.append(path)
+    return tuple(paths)
+
+
+@lru_cache(maxsize=None)
+def queryset_plan(serializer_class, field_names):
+    """
+    ``(colonnes, select_related, prefetches)`` nécessaires aux champs ``field_names``,
+    ou None si une dépendance est inconnue. ``prefetches`` : ``(lookup, modèle, select_related)``.
+    """
+    paths = _serializer_paths(serializer_class, field_names)
+    if paths is None:
+        return None
+    
+    model = serializer_class.Meta.model
+    columns, relations, prefetches = {model._meta.pk.name}, set(), {}
+    for path in paths:
+        if not _resolve(model, path, columns, relations, prefetches):
+            return None
+    return (
+        tuple(sorted(columns)),
+        tuple(sorted(relations)),
+        tuple((lookup, related_model, tuple(sorted(select))) for lookup, (related_model, select) in sorted(prefetches.items())),
+    )
+
+
+def apply_queryset_plan(queryset, plan, restrict=True):
+    """``restrict=False`` : ajoute jointures et prefetches sans retirer ni colonnes ni jointures existantes"""
+    columns, relations, prefetches = plan
+    if restrict:
+        queryset = queryset.select_related(None).only(*columns)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    if prefetches:
+        queryset = queryset.prefetch_related(*(
+            Prefetch(lookup, queryset=related_model._default_manager.select_related(*select)) if select else lookup
+            for lookup, related_model, select in prefetches
+        ))
+    return queryset
+
+
+# ==================== VIEWSETS ====================
+
+class SparseFieldsViewMixin:
+    """
+    ViewSet : applique ``?fields`` / ``?omit`` (lecture seule) et ``?expand`` au
+    serializer, puis le plan de requête correspondant en liste et en détail. Les
+    réponses des écritures et des actions gardent les relations imbriquées, sauf
+    ``?expand`` explicite.
+    """
+    fields_param = 'fields'
+    omit_param = 'omit'
+    expand_param = 'expand'
+    # Lectures où ``?expand`` est opt-in ; ailleurs (écritures, actions), toutes les relations sont rendues par défaut
+    expand_opt_in_actions = ('list', 'retrieve')
+    
+    def get_sparse_fields(self, serializer_class):
+        """Noms des champs à rendre, ou None pour tous"""
+        request = self.request
+        if request is None or not issubclass(serializer_class, SparseFieldsSerializerMixin):
+            return None
+        
+        params = request.query_params
+        expandable = getattr(serializer_class.Meta, 'expandable_fields', {})
+        expand = parse_field_list(params.get(self.expand_param))
+        if self.expand_param not in params and getattr(self, 'action', None) not in self.expand_opt_in_actions:
+            expand = list(expandable)
+        if request.method in SAFE_METHODS:
+            requested = parse_field_list(params.get(self.fields_param))
+            omitted = parse_field_list(params.get(self.omit_param))
+        else:
+            requested, omitted = [], []
+        if not expandable and not requested and not omitted:
+            return None
+        
+        available = serializer_field_names(serializer_class)
+        for param, names, known in (
+            (self.fields_param, requested, available),
+            (self.omit_param, omitted, available),
+            (self.expand_param, expand, expandable),
+        ):
+            unknown = sorted(set(names) - set(known))
+            if unknown:
+                raise serializers.ValidationError({param: f"Champs inconnus : {', '.join(unknown)}"})
+        
+        hidden = {field_name for name, field_name in expandable.items() if name not in expand}
+        return tuple(
+            name for name in available
+            if name not in hidden and (not requested or name in requested) and name not in omitted
+        )
+    
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields(self.get_serializer_class())
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS or self.action not in ('list', 'retrieve'):
+            return queryset
+        
+        serializer_class = self.get_serializer_class()
+        fields = self.get_sparse_fields(serializer_class)
+        plan = queryset_plan(serializer_class, fields if fields is not None else serializer_field_names(serializer_class))
+        if plan is not None:
+            # En détail, les jointures existantes servent aussi aux contrôles de permission
+            queryset = apply_queryset_plan(queryset, plan, restrict=self.action == 'list')
+        return queryset
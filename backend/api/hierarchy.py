@@ -0,0 +1,327 @@
+"""
+Hiérarchies de l'organisation : employés (Employee.manager) sous forme de table
+de fermeture, organigramme en cache et arborescence des départements.
+
+Chaque déplacement d'un employé (changement de manager) réécrit uniquement les
+liens entre son sous-arbre et ses anciens/nouveaux ancêtres : toute question
+du type « qui est sous X ? » ou « qui est au-dessus de Y ? » devient une seule
+requête indexée sur EmployeeHierarchy.
+"""
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Department, Employee, EmployeeHierarchy
+
+
+class HierarchyCycleError(ValueError):
+    """Le manager demandé fait partie du sous-arbre de l'employé"""
+
+
+def compute_closure(pairs):
+    """
+    Calcule la fermeture à partir de couples ``(id, manager_id)``.
+    Retourne une liste de tuples ``(ancestor_id, descendant_id, depth)``.
+    """
+    parents = dict(pairs)
+    rows = []
+    for employee_id in parents:
+        rows.append((employee_id, employee_id, 0))
+        seen = {employee_id}
+        depth = 0
+        current = parents.get(employee_id)
+        while current is not None and current not in seen:
+            depth += 1
+            rows.append((current, employee_id, depth))
+            seen.add(current)
+            current = parents.get(current)
+    return rows
+
+
+def is_in_subtree(root_id, employee_id):
+    """``employee_id`` est-il ``root_id`` ou l'un de ses subordonnés (directs ou non) ?"""
+    return EmployeeHierarchy.objects.filter(ancestor_id=root_id, descendant_id=employee_id).exists()
+
+
+def _subtree(employee_id):
+    return EmployeeHierarchy.objects.filter(ancestor_id=employee_id).values('descendant_id')
+
+
+def detach_subtree(employee_id):
+    """Supprime les liens entre le sous-arbre de l'employé et ses ancêtres actuels"""
+    subtree = _subtree(employee_id)
+    EmployeeHierarchy.objects.filter(
+        descendant_id__in=subtree
+    ).exclude(
+        ancestor_id__in=subtree
+    ).delete()
+
+
+@transaction.atomic
+def move_subtree(employee_id, new_manager_id):
+    """Rattache le sous-arbre de ``employee_id`` sous ``new_manager_id`` (ou à la racine)"""
+    if new_manager_id is not None and is_in_subtree(employee_id, new_manager_id):
+        raise HierarchyCycleError(f"{new_manager_id} est subordonné à {employee_id}")
+
+    # Ligne réflexive (employé créé, ou table pas encore initialisée)
+    EmployeeHierarchy.objects.get_or_create(ancestor_id=employee_id, descendant_id=employee_id, defaults={'depth': 0})
+
+    detach_subtree(employee_id)
+    if new_manager_id is None:
+        return
+
+    ancestors = list(
+        EmployeeHierarchy.objects.filter(descendant_id=new_manager_id).values_list('ancestor_id', 'depth')
+    )
+    if not ancestors:
+        # Le manager n'a encore aucune ligne : il devient sa propre racine
+        EmployeeHierarchy.objects.create(ancestor_id=new_manager_id, descendant_id=new_manager_id, depth=0)
+        ancestors = [(new_manager_id, 0)]
+
+    descendants = list(
+        EmployeeHierarchy.objects.filter(ancestor_id=employee_id).values_list('descendant_id', 'depth')
+    )
+    EmployeeHierarchy.objects.bulk_create([
+        EmployeeHierarchy(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+        for ancestor_id, up in ancestors
+        for descendant_id, down in descendants
+    ], batch_size=1000)
+
+
+@transaction.atomic
+def rebuild(organization=None, batch_size=1000):
+    """Reconstruit la table de fermeture (une organisation ou toutes) en une passe"""
+    employees = Employee.objects.all()
+    if organization is not None:
+        employees = employees.filter(organization=organization)
+
+    pairs = list(employees.values_list('id', 'manager_id'))
+    EmployeeHierarchy.objects.filter(descendant_id__in=[employee_id for employee_id, _ in pairs]).delete()
+    rows = compute_closure(pairs)
+    EmployeeHierarchy.objects.bulk_create([
+        EmployeeHierarchy(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+        for ancestor_id, descendant_id, depth in rows
+    ], batch_size=batch_size)
+    return len(rows)
+
+
+def descendants_of(queryset, manager_id, max_depth=1):
+    """Filtre ``queryset`` (Employee) sur les subordonnés de ``manager_id``. ``max_depth=None`` = tous niveaux"""
+    filters = {
+        'ancestor_links__ancestor_id': manager_id,
+        'ancestor_links__depth__gte': 1,
+    }
+    if max_depth is not None:
+        filters['ancestor_links__depth__lte'] = max_depth
+    return queryset.filter(**filters)
+
+
+def ancestors_of(employee_id):
+    """Chaîne managériale de l'employé, du manager direct jusqu'à la racine"""
+    return EmployeeHierarchy.objects.filter(
+        descendant_id=employee_id,
+        depth__gte=1
+    ).select_related('ancestor', 'ancestor__department').order_by('depth')
+
+
+# ==================== ORGANIGRAMME ====================
+
+ORG_CHART_CACHE_KEY = 'org_chart:v2:{organization_id}'
+ORG_CHART_CACHE_TIMEOUT = 3600
+
+# Champs affichés dans l'organigramme : toute modification invalide le cache
+ORG_CHART_FIELDS = ('manager_id', 'department_id', 'first_name', 'last_name', 'position', 'profile_photo', 'is_active')
+
+
+def build_org_chart(organization_id):
+    """Construit l'arbre complet d'une organisation à partir d'une seule requête projetée"""
+    rows = Employee.objects.filter(
+        organization_id=organization_id,
+        is_active=True
+    ).order_by('last_name', 'first_name').values_list(
+        'id', 'manager_id', 'first_name', 'last_name', 'position', 'department_id', 'profile_photo'
+    )
+    
+    nodes = {}
+    for employee_id, manager_id, first_name, last_name, position, department_id, photo in rows:
+        nodes[employee_id] = {
+            'id': employee_id,
+            'manager': manager_id,
+            'full_name': f"{first_name} {last_name}",
+            'position': position,
+            'department': department_id,
+            # Chemin de stockage : l'URL (éventuellement signée, donc périssable) est résolue à l'affichage
+            'profile_photo': photo or None,
+            'children': [],
+        }
+    
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node['manager'])
+        if parent is not None and parent is not node:
+            parent['children'].append(node)
+        else:
+            # Sans manager (ou manager inactif) : racine de l'organigramme
+            roots.append(node)
+    return roots
+
+
+def get_org_chart(organization_id):
+    key = ORG_CHART_CACHE_KEY.format(organization_id=organization_id)
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_org_chart(organization_id)
+        cache.set(key, tree, ORG_CHART_CACHE_TIMEOUT)
+    return tree
+
+
+def invalidate_org_chart(organization_id):
+    cache.delete(ORG_CHART_CACHE_KEY.format(organization_id=organization_id))
+
+
+def find_node(tree, employee_id):
+    stack = list(tree)
+    while stack:
+        node = stack.pop()
+        if node['id'] == employee_id:
+            return node
+        stack.extend(node['children'])
+    return None
+
+
+def render_org_chart(nodes, max_depth=None, url_builder=None, _level=0):
+    """
+    Copie de l'arbre limitée à ``max_depth`` niveaux sous les nœuds donnés.
+    Les nœuds tronqués gardent leur nombre de subordonnés directs ; les URL des photos sont résolues ici.
+    """
+    rendered = []
+    for node in nodes:
+        photo = default_storage.url(node['profile_photo']) if node['profile_photo'] else None
+        item = {
+            'id': node['id'],
+            'manager': node['manager'],
+            'full_name': node['full_name'],
+            'position': node['position'],
+            'department': node['department'],
+            'profile_photo': url_builder(photo) if photo and url_builder else photo,
+            'children_count': len(node['children']),
+        }
+        if max_depth is None or _level < max_depth:
+            item['children'] = render_org_chart(node['children'], max_depth, url_builder, _level + 1)
+        else:
+            item['children'] = []
+        rendered.append(item)
+    return rendered
+
+
+# ==================== DÉPARTEMENTS ====================
+# Department.parent : CTE récursive sur PostgreSQL, carte d'adjacence en cache ailleurs.
+
+DEPARTMENT_TREE_CACHE_KEY = 'department_tree:{organization_id}'
+DEPARTMENT_TREE_CACHE_TIMEOUT = 3600
+
+_DESCENDANTS_CTE = f"""
+    WITH RECURSIVE subtree (id, depth) AS (
+        SELECT id, 0 FROM {Department._meta.db_table} WHERE id = %s
+        UNION ALL
+        SELECT d.id, s.depth + 1 FROM {Department._meta.db_table} d
+        JOIN subtree s ON d.parent_id = s.id
+        WHERE s.depth < 64
+    )
+"""
+
+_ANCESTORS_CTE = f"""
+    WITH RECURSIVE chain (id, parent_id, depth) AS (
+        SELECT id, parent_id, 0 FROM {Department._meta.db_table} WHERE id = %s
+        UNION ALL
+        SELECT d.id, d.parent_id, c.depth + 1 FROM {Department._meta.db_table} d
+        JOIN chain c ON d.id = c.parent_id
+        WHERE c.depth < 64
+    )
+"""
+
+
+def _use_cte():
+    return connection.vendor == 'postgresql'
+
+
+def get_department_tree(organization_id):
+    """Carte ``{department_id: parent_id}`` d'une organisation (en cache)"""
+    key = DEPARTMENT_TREE_CACHE_KEY.format(organization_id=organization_id)
+    tree = cache.get(key)
+    if tree is None:
+        tree = dict(Department.objects.filter(organization_id=organization_id).values_list('id', 'parent_id'))
+        cache.set(key, tree, DEPARTMENT_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def invalidate_department_tree(organization_id):
+    cache.delete(DEPARTMENT_TREE_CACHE_KEY.format(organization_id=organization_id))
+
+
+def _walk_descendants(tree, department_id):
+    children = {}
+    for child_id, parent_id in tree.items():
+        children.setdefault(parent_id, []).append(child_id)
+    
+    result = [(department_id, 0)]
+    seen = {department_id}
+    index = 0
+    while index < len(result):
+        current, depth = result[index]
+        for child_id in children.get(current, []):
+            if child_id not in seen:
+                seen.add(child_id)
+                result.append((child_id, depth + 1))
+        index += 1
+    return result
+
+
+def _walk_ancestors(tree, department_id):
+    result = []
+    seen = {department_id}
+    current = tree.get(department_id)
+    depth = 1
+    while current is not None and current not in seen:
+        result.append((current, depth))
+        seen.add(current)
+        current = tree.get(current)
+        depth += 1
+    return result
+
+
+def department_descendants(department, include_self=True):
+    """Liste ``[(department_id, depth), ...]`` du sous-arbre (largeur d'abord)"""
+    if _use_cte():
+        with connection.cursor() as cursor:
+            cursor.execute(_DESCENDANTS_CTE + "SELECT id, depth FROM subtree ORDER BY depth", [department.pk])
+            rows = cursor.fetchall()
+    else:
+        rows = _walk_descendants(get_department_tree(department.organization_id), department.pk)
+    return rows if include_self else [row for row in rows if row[1] > 0]
+
+
+def department_ancestors(department):
+    """Liste ``[(department_id, depth), ...]`` du parent direct jusqu'à la racine"""
+    if _use_cte():
+        with connection.cursor() as cursor:
+            cursor.execute(_ANCESTORS_CTE + "SELECT id, depth FROM chain WHERE depth > 0 ORDER BY depth", [department.pk])
+            return cursor.fetchall()
+    return _walk_ancestors(get_department_tree(department.organization_id), department.pk)
+
+
+def filter_department_subtree(queryset, department_id, field='department'):
+    """
+    Restreint ``queryset`` aux lignes dont ``field`` appartient au sous-arbre de
+    ``department_id``. Sur PostgreSQL la CTE est injectée en sous-requête : une seule requête.
+    """
+    lookup = f'{field}__in'
+    if _use_cte():
+        return queryset.filter(**{lookup: RawSQL(_DESCENDANTS_CTE + "SELECT id FROM subtree", [department_id])})
+    
+    organization_id = Department.objects.filter(pk=department_id).values_list('organization_id', flat=True).first()
+    if organization_id is None:
+        return queryset.none()
+    ids = [pk for pk, _ in _walk_descendants(get_department_tree(organization_id), department_id)]
+    return queryset.filter(**{lookup: ids})
@@ -0,0 +1,370 @@
+"""
+Import en masse d'employés (CSV ou XLSX).
+
+Le fichier est lu en flux et traité par paquets : validation de chaque ligne,
+contrôles d'unicité groupés (une requête par paquet), puis ``bulk_create`` des
+User, Employee et OrganizationMember. Les comptes sont créés avec un mot de
+passe inutilisable : l'employé choisit le sien via un lien d'invitation, ce
+qui évite un hachage PBKDF2 complet par ligne.
+"""
+import csv
+import datetime
+import io
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from . import hierarchy, sequences
+from .search import build_search_text, invalidate_lookup
+from .models import Department, Employee, OrganizationMember
+
+
+IMPORT_CHUNK_SIZE = 500
+
+REQUIRED_COLUMNS = ('first_name', 'last_name', 'email', 'position', 'hire_date')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+ROLE_VALUES = {choice for choice, _ in OrganizationMember.ROLE_CHOICES}
+EMPLOYMENT_VALUES = {choice for choice, _ in Employee.EMPLOYMENT_CHOICES}
+
+
+class ImportFileError(ValueError):
+    """Fichier illisible ou colonnes obligatoires manquantes"""
+
+
+# ==================== LECTURE ====================
+
+def _normalize_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def _iter_csv(uploaded_file):
+    stream = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(stream, dialect)
+    header = [_normalize_header(value) for value in next(reader, [])]
+    yield header
+    for values in reader:
+        yield values
+
+
+def _iter_xlsx(uploaded_file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("Le support XLSX nécessite le paquet openpyxl.")
+
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalize_header(value) for value in next(rows, ())]
+        yield header
+        for values in rows:
+            yield values
+    finally:
+        workbook.close()
+
+
+def iter_rows(uploaded_file):
+    """Génère ``(numéro_de_ligne, dict)`` sans charger tout le fichier en mémoire"""
+    name = (getattr(uploaded_file, 'name', '') or '').lower()
+    raw = _iter_xlsx(uploaded_file) if name.endswith('.xlsx') else _iter_csv(uploaded_file)
+
+    header = next(raw, [])
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ImportFileError(f"Colonnes obligatoires manquantes : {', '.join(missing)}")
+
+    for line_number, values in enumerate(raw, start=2):
+        if values is None or not any(value not in (None, '') for value in values):
+            continue
+        row = {}
+        for column, value in zip(header, values):
+            if column:
+                row[column] = value.strip() if isinstance(value, str) else value
+        yield line_number, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ==================== VALIDATION ====================
+
+def _parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(str(value), date_format).date()
+        except (TypeError, ValueError):
+            continue
+    raise ValueError
+
+
+def _with_emails(queryset, emails, field='email'):
+    """Lignes dont ``field`` figure dans ``emails``, sans tenir compte de la casse (annotée en ``email_lower``)"""
+    return queryset.annotate(email_lower=Lower(field)).filter(email_lower__in={email.lower() for email in emails})
+
+
+def _clean_row(row, departments):
+    """Retourne ``(données nettoyées, erreurs)`` pour une ligne"""
+    errors = {}
+    data = {}
+
+    for column in REQUIRED_COLUMNS:
+        if row.get(column) in (None, ''):
+            errors[column] = "Champ obligatoire."
+
+    email = str(row.get('email') or '').strip()
+    if email:
+        try:
+            validate_email(email)
+            data['email'] = email
+        except ValidationError:
+            errors['email'] = "Adresse e-mail invalide."
+
+    for column in ('first_name', 'last_name', 'position', 'phone', 'employee_id'):
+        if row.get(column) not in (None, ''):
+            data[column] = str(row[column]).strip()
+
+    if row.get('hire_date') not in (None, ''):
+        try:
+            data['hire_date'] = _parse_date(row['hire_date'])
+        except ValueError:
+            errors['hire_date'] = "Date invalide (AAAA-MM-JJ ou JJ/MM/AAAA)."
+
+    employment_type = str(row.get('employment_type') or Employee.EMPLOYMENT_FULL_TIME).strip()
+    if employment_type not in EMPLOYMENT_VALUES:
+        errors['employment_type'] = f"Valeur inconnue : {employment_type}."
+    data['employment_type'] = employment_type
+
+    role = str(row.get('role') or OrganizationMember.ROLE_EMPLOYEE).strip()
+    if role not in ROLE_VALUES:
+        errors['role'] = f"Rôle inconnu : {role}."
+    data['role'] = role
+
+    if row.get('salary') not in (None, ''):
+        try:
+            data['salary'] = Decimal(str(row['salary']).replace(' ', '').replace(',', '.'))
+        except InvalidOperation:
+            errors['salary'] = "Montant invalide."
+
+    department = str(row.get('department') or '').strip().lower()
+    if department:
+        department_id = departments.get(department)
+        if department_id is None:
+            errors['department'] = f"Département introuvable : {row['department']}."
+        data['department_id'] = department_id
+
+    manager_email = str(row.get('manager_email') or '').strip()
+    if manager_email:
+        data['manager_email'] = manager_email
+
+    return data, errors
+
+
+# ==================== IMPORT ====================
+
+class EmployeeImporter:
+    """Import d'un fichier pour une organisation ; ``run()`` retourne le rapport"""
+
+    def __init__(self, organization, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+        self.organization = organization
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+
+        self.departments = {}
+        for pk, name, code in Department.objects.filter(organization=organization).values_list('id', 'name', 'code'):
+            self.departments[name.lower()] = pk
+            if code:
+                self.departments.setdefault(code.lower(), pk)
+
+        self.seen_emails = set()
+        self.seen_usernames = set()
+        self.pending_managers = []  # (employee_id, manager_email, line_number)
+        self.created_user_ids = []
+        self.report = {'total_rows': 0, 'created': 0, 'errors': [], 'dry_run': dry_run}
+
+    def _error(self, line_number, row, errors):
+        self.report['errors'].append({
+            'row': line_number,
+            'email': row.get('email'),
+            'errors': errors,
+        })
+
+    def run(self, uploaded_file):
+        for chunk in chunked(iter_rows(uploaded_file), self.chunk_size):
+            self.report['total_rows'] += len(chunk)
+            valid = self._validate_chunk(chunk)
+            if valid and not self.dry_run:
+                self._create_chunk(valid)
+
+        if not self.dry_run and self.report['created']:
+            self._link_managers()
+            hierarchy.rebuild(self.organization)
+            hierarchy.invalidate_org_chart(self.organization.id)
+            invalidate_lookup(self.organization.id)
+        return self.report
+
+    def _validate_chunk(self, chunk):
+        cleaned = []
+        for line_number, row in chunk:
+            data, errors = _clean_row(row, self.departments)
+            email = (data.get('email') or '').lower()
+            if email and email in self.seen_emails:
+                errors['email'] = "E-mail en double dans le fichier."
+            if email:
+                self.seen_emails.add(email)
+            if errors:
+                self._error(line_number, row, errors)
+            else:
+                cleaned.append((line_number, row, data))
+
+        # Contrôles d'unicité groupés : une requête par paquet
+        emails = [data['email'] for _, _, data in cleaned]
+        taken_emails = set(_with_emails(Employee.objects, emails).values_list('email_lower', flat=True))
+        employee_ids = [data['employee_id'] for _, _, data in cleaned if data.get('employee_id')]
+        taken_ids = set(Employee.objects.filter(employee_id__in=employee_ids).values_list('employee_id', flat=True))
+
+        valid = []
+        for line_number, row, data in cleaned:
+            if data['email'].lower() in taken_emails:
+                self._error(line_number, row, {'email': "Un employé avec cet e-mail existe déjà."})
+            elif data.get('employee_id') in taken_ids:
+                self._error(line_number, row, {'employee_id': "Cet identifiant employé existe déjà."})
+            else:
+                valid.append((line_number, row, data))
+        return valid
+
+    def _usernames(self, emails):
+        """Nom d'utilisateur = partie locale de l'e-mail (comme la création unitaire), e-mail complet en cas de conflit"""
+        candidates = {email: email.split('@')[0] for email in emails}
+        taken = set(User.objects.filter(
+            username__in=list(candidates.values()) + list(emails)
+        ).values_list('username', flat=True)) | self.seen_usernames
+
+        usernames = {}
+        for email, local_part in candidates.items():
+            username = local_part if local_part not in taken else email
+            taken.add(username)
+            usernames[email] = username
+        self.seen_usernames |= set(usernames.values())
+        return usernames
+
+    def _create_chunk(self, valid):
+        emails = [data['email'] for _, _, data in valid]
+
+        with transaction.atomic():
+            # 1. Comptes utilisateurs : réutilisés s'ils existent, sinon créés sans mot de passe
+            users = {user.email_lower: user for user in _with_emails(User.objects, emails)}
+            linked = set(_with_emails(
+                Employee.objects.filter(user__in=users.values()), emails, field='user__email'
+            ).values_list('email_lower', flat=True))
+
+            rows = []
+            for line_number, row, data in valid:
+                if data['email'].lower() in linked:
+                    self._error(line_number, row, {'email': "Ce compte utilisateur est déjà lié à un employé."})
+                else:
+                    rows.append((line_number, row, data))
+            if not rows:
+                return
+
+            usernames = self._usernames([data['email'] for _, _, data in rows if data['email'].lower() not in users])
+            new_users = [
+                User(
+                    username=usernames[data['email']],
+                    email=data['email'],
+                    first_name=data['first_name'],
+                    last_name=data['last_name'],
+                    password=make_password(None),
+                )
+                for _, _, data in rows if data['email'].lower() not in users
+            ]
+            User.objects.bulk_create(new_users, batch_size=self.chunk_size)
+            self.created_user_ids += [user.pk for user in new_users]
+            users.update({user.email.lower(): user for user in new_users})
+
+            # 2. Identifiants employés réservés en un bloc
+            missing_ids = sum(1 for _, _, data in rows if not data.get('employee_id'))
+            auto_ids = iter(sequences.allocate_employee_ids(self.organization, missing_ids)) if missing_ids else iter(())
+
+            # 3. Employés et adhésions
+            employees = []
+            for _, _, data in rows:
+                employees.append(Employee(
+                    organization=self.organization,
+                    user=users[data['email'].lower()],
+                    employee_id=data.get('employee_id') or next(auto_ids),
+                    first_name=data['first_name'],
+                    last_name=data['last_name'],
+                    email=data['email'],
+                    phone=data.get('phone', ''),
+                    position=data['position'],
+                    employment_type=data['employment_type'],
+                    hire_date=data['hire_date'],
+                    salary=data.get('salary'),
+                    department_id=data.get('department_id'),
+                ))
+            for employee in employees:
+                employee.search_text = build_search_text(employee)
+            Employee.objects.bulk_create(employees, batch_size=self.chunk_size)
+
+            OrganizationMember.objects.bulk_create([
+                OrganizationMember(organization=self.organization, user=users[data['email'].lower()], role=data['role'])
+                for _, _, data in rows
+            ], batch_size=self.chunk_size, ignore_conflicts=True)
+
+        for employee, (line_number, _, data) in zip(employees, rows):
+            if data.get('manager_email'):
+                self.pending_managers.append((employee.pk, data['manager_email'], line_number))
+        self.report['created'] += len(employees)
+
+    def _link_managers(self):
+        """Les managers peuvent figurer n'importe où dans le fichier : rattachement en fin d'import"""
+        if not self.pending_managers:
+            return
+
+        manager_emails = {email for _, email, _ in self.pending_managers}
+        managers = dict(_with_emails(
+            Employee.objects.filter(organization=self.organization),
+            manager_emails
+        ).values_list('email_lower', 'id'))
+
+        updates = []
+        for employee_pk, manager_email, line_number in self.pending_managers:
+            manager_id = managers.get(manager_email.lower())
+            if manager_id is None or manager_id == employee_pk:
+                self.report['errors'].append({
+                    'row': line_number,
+                    'email': None,
+                    'errors': {'manager_email': f"Manager introuvable : {manager_email} (employé créé sans manager)."},
+                })
+                continue
+            updates.append(Employee(pk=employee_pk, manager_id=manager_id))
+        Employee.objects.bulk_update(updates, ['manager'], batch_size=self.chunk_size)
+
+
+def invite_frontend_url(uid, token):
+    return f"{settings.FRONTEND_URL}/invite/{uid}/{token}"
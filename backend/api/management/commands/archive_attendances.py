@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import partitions
+from api.models import Organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive les présences d'une année close dans un CSV compressé par organisation (AttendanceArchive) "
+        "puis les retire de la table ; les exports continuent de les lire"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, required=True, help="Année close à archiver")
+        parser.add_argument('--organization', help="Slug de l'organisation (toutes par défaut)")
+    
+    def handle(self, *args, **options):
+        organization = None
+        if options['organization']:
+            organization = Organization.objects.filter(slug=options['organization']).first()
+            if organization is None:
+                raise CommandError("Organisation introuvable.")
+        
+        try:
+            archived = partitions.archive_year(options['year'], organization)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        
+        for current, count in archived.items():
+            self.stdout.write(f"{current.name} : {count} présences archivées")
+        self.stdout.write(self.style.SUCCESS(f"Année {options['year']} archivée."))
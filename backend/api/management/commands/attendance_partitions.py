@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée les partitions mensuelles à venir de la table des présences (PostgreSQL) ; "
+        "sans effet sur les autres moteurs, qui gardent une table unique"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, help="Mois à venir à préparer (défaut : ATTENDANCE_PARTITIONS_AHEAD)"
+        )
+        parser.add_argument('--list', action='store_true', help="Affiche les partitions existantes")
+    
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            self.stdout.write("Table des présences non partitionnée (PostgreSQL requis) : rien à faire.")
+            return
+        if options['ahead'] is not None and options['ahead'] < 0:
+            raise CommandError("--ahead doit être positif.")
+        
+        created = partitions.ensure_partitions(options['ahead'])
+        for name in created:
+            self.stdout.write(f"Partition créée : {name}")
+        if options['list']:
+            for name, bound in partitions.list_partitions():
+                self.stdout.write(f"{name} : {bound}")
+        
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partition(s) créée(s)."))
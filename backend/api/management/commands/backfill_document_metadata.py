@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Document
+
+
+class Command(BaseCommand):
+    help = (
+        "Relève taille, empreinte SHA-256 et type MIME des documents enregistrés avant ces colonnes "
+        "(lecture de chaque fichier dans le stockage)"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Relit aussi les documents déjà renseignés")
+        parser.add_argument('--batch-size', type=int, default=200, help="Documents mis à jour par requête")
+    
+    def handle(self, *args, **options):
+        documents = Document.objects.exclude(file='').order_by('pk').only('pk', 'file', *Document.METADATA_FIELDS)
+        if not options['force']:
+            documents = documents.filter(sha256='')
+        
+        batch, filled, missing = [], 0, 0
+        for document in documents.iterator(chunk_size=options['batch_size']):
+            try:
+                with document.file.open('rb'):
+                    document.fill_file_metadata()
+            except (FileNotFoundError, OSError):
+                missing += 1
+                self.stderr.write(f"Fichier introuvable : document {document.pk} ({document.file.name})")
+                continue
+            batch.append(document)
+            if len(batch) >= options['batch_size']:
+                filled += Document.objects.bulk_update(batch, Document.METADATA_FIELDS)
+                batch = []
+        if batch:
+            filled += Document.objects.bulk_update(batch, Document.METADATA_FIELDS)
+        
+        self.stdout.write(self.style.SUCCESS(f"{filled} documents renseignés, {missing} fichiers introuvables."))
@@ -0,0 +1,100 @@
+import datetime
+import gzip
+import io
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.middleware import brotli
+from api.renderers import FastJSONParser, FastJSONRenderer
+
+
+class Command(BaseCommand):
+    help = "Compare JSONRenderer/JSONParser de DRF et leurs équivalents orjson (api.renderers)"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help="Tailles de liste (défaut : 1000 10000)")
+        parser.add_argument('--repeat', type=int, default=5, help="Nombre de mesures par chemin (on garde la meilleure)")
+    
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING("orjson n'est pas installé : FastJSONRenderer utilise le rendu DRF"))
+        
+        for rows in options['rows']:
+            for label, payload in (
+                ("serializer", self._serialized_rows(rows)),
+                ("natif", self._native_rows(rows)),
+            ):
+                self._compare(label, payload, rows, options['repeat'])
+    
+    @staticmethod
+    def _native_rows(rows):
+        """Lignes de présence/paie avec types Python (agrégats, statistiques)"""
+        now = timezone.now()
+        return [
+            {
+                'id': index,
+                'employee': {'id': index % 100, 'full_name': f"Prénom{index % 100} Nom", 'employee_id': f"EMP-{index:05d}"},
+                'date': datetime.date(2024, 1, 1) + datetime.timedelta(days=index % 365),
+                'check_in': datetime.time(9, index % 60),
+                'check_out': datetime.time(17, 30),
+                'hours_worked': Decimal('8.25'),
+                'base_salary': Decimal('3250.00') + index,
+                'net_salary': Decimal('2534.17'),
+                'created_at': now,
+                'notes': "Saisie « automatique »",
+                'is_validated': bool(index % 2),
+            }
+            for index in range(rows)
+        ]
+    
+    @classmethod
+    def _serialized_rows(cls, rows):
+        """Mêmes lignes telles que les rend un serializer (dates et décimaux déjà en chaînes)"""
+        return [
+            {
+                key: value.isoformat().replace('+00:00', 'Z') if hasattr(value, 'isoformat')
+                else str(value) if isinstance(value, Decimal) else value
+                for key, value in row.items()
+            }
+            for row in cls._native_rows(rows)
+        ]
+    
+    def _compare(self, label, payload, rows, repeat):
+        slow, slow_output = self._measure(lambda: JSONRenderer().render(payload), repeat)
+        fast, fast_output = self._measure(lambda: FastJSONRenderer().render(payload), repeat)
+        identical = slow_output == fast_output
+        self.stdout.write(
+            f"rendu   {label:<10} {rows:>7} lignes | DRF {slow * 1000:8.1f} ms | "
+            f"orjson {fast * 1000:8.1f} ms | x{slow / fast:4.1f} | "
+            + (self.style.SUCCESS("JSON identique") if identical else self.style.ERROR("JSON DIFFÉRENT"))
+        )
+        
+        slow, slow_data = self._measure(lambda: JSONParser().parse(io.BytesIO(slow_output)), repeat)
+        fast, fast_data = self._measure(lambda: FastJSONParser().parse(io.BytesIO(slow_output)), repeat)
+        self.stdout.write(
+            f"lecture {label:<10} {rows:>7} lignes | DRF {slow * 1000:8.1f} ms | "
+            f"orjson {fast * 1000:8.1f} ms | x{slow / fast:4.1f} | "
+            + (self.style.SUCCESS("données identiques") if slow_data == fast_data else self.style.ERROR("DONNÉES DIFFÉRENTES"))
+        )
+        
+        sizes = [f"brut {len(fast_output) / 1024:.0f} Ko", f"gzip {len(gzip.compress(fast_output, 6)) / 1024:.0f} Ko"]
+        if brotli is not None:
+            sizes.append(f"brotli {len(brotli.compress(fast_output, quality=settings.RESPONSE_BROTLI_QUALITY)) / 1024:.0f} Ko")
+        self.stdout.write(f"taille  {label:<10} {rows:>7} lignes | " + " | ".join(sizes))
+    
+    @staticmethod
+    def _measure(func, repeat):
+        best, output = None, None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            output = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
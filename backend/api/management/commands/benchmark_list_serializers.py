@@ -0,0 +1,118 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fieldsets import apply_queryset_plan, queryset_plan, serializer_field_names
+from api.models import Attendance, Employee, LeaveRequest, LeaveType, Organization
+from api.readers import AttendanceReader, LeaveRequestListReader
+from api.search import build_search_text
+
+
+EMPLOYEES = 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le serializer DRF et le lecteur values() des listes de présences et de congés "
+        "(données synthétiques, annulées en fin de commande)"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help="Tailles de liste (défaut : 1000 10000)")
+        parser.add_argument('--repeat', type=int, default=3, help="Nombre de mesures par chemin (on garde la meilleure)")
+    
+    def handle(self, *args, **options):
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        request = Request(APIRequestFactory().get('/', HTTP_HOST=host))
+        renderer = JSONRenderer()
+        
+        with transaction.atomic():
+            organization = self._populate(max(options['rows']))
+            for rows in options['rows']:
+                for reader_class in (AttendanceReader, LeaveRequestListReader):
+                    self._compare(reader_class, organization, rows, options['repeat'], request, renderer)
+            transaction.set_rollback(True)
+    
+    def _populate(self, rows):
+        organization = Organization.objects.create(name="Benchmark", slug=f"benchmark-{int(time.time())}", email="bench@example.com")
+        leave_type = LeaveType.objects.create(organization=organization, name="Congés payés", code="CP")
+        
+        employees = []
+        for index in range(EMPLOYEES):
+            employee = Employee(
+                organization=organization,
+                employee_id=f"BENCH-{index:05d}",
+                first_name=f"Prénom{index}",
+                last_name=f"Nom{index}",
+                email=f"bench{index}@example.com",
+                position="Développeur",
+                hire_date=datetime.date(2020, 1, 1),
+                profile_photo=f"employees/photos/bench{index}.jpg" if index % 2 else '',
+            )
+            employee.search_text = build_search_text(employee)
+            employees.append(employee)
+        employees = Employee.objects.bulk_create(employees)
+        
+        # bulk_create : ni signaux ni save() (circuit d'approbation, notifications)
+        start = datetime.date(2000, 1, 1)
+        per_employee = -(-rows // EMPLOYEES)
+        attendances, leaves = [], []
+        for employee in employees:
+            for day in range(per_employee):
+                date = start + datetime.timedelta(days=day)
+                attendances.append(Attendance(
+                    organization=organization, employee=employee, date=date,
+                    check_in=datetime.time(9, day % 60), check_out=datetime.time(17, 30),
+                    hours_worked=Decimal('8.25'), notes="Saisie automatique"
+                ))
+                leaves.append(LeaveRequest(
+                    organization=organization, employee=employee, leave_type=leave_type,
+                    start_date=date, end_date=date + datetime.timedelta(days=2), total_days=3,
+                    reason="Motif « test »", approved_by=employees[0] if day % 3 == 0 else None,
+                    status='approved' if day % 3 == 0 else 'pending'
+                ))
+        Attendance.objects.bulk_create(attendances, batch_size=2000)
+        LeaveRequest.objects.bulk_create(leaves, batch_size=2000)
+        return organization
+    
+    def _compare(self, reader_class, organization, rows, repeat, request, renderer):
+        serializer_class = reader_class.serializer_class
+        model = serializer_class.Meta.model
+        field_names = serializer_field_names(serializer_class)
+        queryset = model.objects.filter(organization=organization).order_by('pk')
+        plan = queryset_plan(serializer_class, field_names)
+        reader = reader_class.for_fields(field_names)
+        
+        def serializer_path():
+            instances = list(apply_queryset_plan(queryset, plan)[:rows])
+            data = serializer_class(instances, many=True, context={'request': request}).data
+            return renderer.render(data)
+        
+        def reader_path():
+            return renderer.render(reader.rows(queryset.values(*reader.keys)[:rows], request))
+        
+        slow, slow_output = self._measure(serializer_path, repeat)
+        fast, fast_output = self._measure(reader_path, repeat)
+        identical = slow_output == fast_output
+        self.stdout.write(
+            f"{model.__name__:<14} {rows:>7} lignes | serializer {slow * 1000:8.1f} ms | "
+            f"values() {fast * 1000:8.1f} ms | x{slow / fast:4.1f} | "
+            + (self.style.SUCCESS("JSON identique") if identical else self.style.ERROR("JSON DIFFÉRENT"))
+        )
+    
+    @staticmethod
+    def _measure(func, repeat):
+        best, output = None, None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            output = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
@@ -0,0 +1,118 @@
+import datetime
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from api import punches
+from api.models import Attendance, AttendanceMonthlySummary, Employee, Organization
+from api.search import build_search_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Pointages concurrents (arrivées puis départs, chaque employé pointant deux fois en même temps) : "
+        "vérifie l'absence de doublon, d'écrasement et d'erreur de clé (données supprimées en fin de commande)"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--punches', type=int, default=1000, help="Pointages simultanés par vague (défaut : 1000)")
+        parser.add_argument('--workers', type=int, default=50, help="Nombre de threads (défaut : 50)")
+    
+    def handle(self, *args, **options):
+        employees_count = max(options['punches'] // 2, 1)
+        organization = Organization.objects.create(name="Benchmark", slug=f"benchmark-{int(time.time())}", email="bench@example.com")
+        try:
+            employees = self._populate(organization, employees_count)
+            day = timezone.localtime().replace(hour=9, minute=0, second=0, microsecond=0)
+            ok = self._wave("arrivées", punches.check_in, employees, day, options['workers'])
+            ok &= self._wave("départs", punches.check_out, employees, day + datetime.timedelta(hours=8, minutes=15), options['workers'])
+            ok &= self._verify(organization, employees_count)
+        finally:
+            organization.delete()
+        if ok:
+            self.stdout.write(self.style.SUCCESS("Aucune perte, aucun doublon, aucune erreur"))
+    
+    @staticmethod
+    def _populate(organization, count):
+        employees = []
+        for index in range(count):
+            employee = Employee(
+                organization=organization,
+                employee_id=f"BENCH-{index:05d}",
+                first_name=f"Prénom{index}",
+                last_name=f"Nom{index}",
+                email=f"bench{index}@example.com",
+                hire_date=datetime.date(2020, 1, 1),
+            )
+            employee.search_text = build_search_text(employee)
+            employees.append(employee)
+        return Employee.objects.bulk_create(employees)
+    
+    def _wave(self, label, punch, employees, at, workers):
+        """Chaque employé pointe deux fois ; les appels sont répartis entre threads démarrés ensemble"""
+        calls = [employee for employee in employees for _ in range(2)]
+        random.shuffle(calls)
+        barrier = threading.Barrier(workers)
+        outcomes = Counter()
+        lock = threading.Lock()
+        
+        def run(chunk):
+            local = Counter()
+            barrier.wait()
+            try:
+                for employee in chunk:
+                    try:
+                        punch(employee, at=at)
+                        local['accepted'] += 1
+                    except punches.PunchError:
+                        local['rejected'] += 1
+                    except Exception as exc:
+                        local[f"{type(exc).__name__}: {exc}"] += 1
+            finally:
+                connections.close_all()
+            with lock:
+                outcomes.update(local)
+        
+        threads = [threading.Thread(target=run, args=(calls[index::workers],)) for index in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        errors = {key: value for key, value in outcomes.items() if key not in ('accepted', 'rejected')}
+        ok = outcomes['accepted'] == len(employees) and outcomes['rejected'] == len(employees) and not errors
+        self.stdout.write(
+            f"{label:<9} {len(calls):>6} pointages | {elapsed * 1000:8.1f} ms | {len(calls) / elapsed:8.0f} /s | "
+            f"acceptés {outcomes['accepted']} | refusés {outcomes['rejected']} | erreurs {sum(errors.values())}"
+        )
+        for error, count in errors.items():
+            self.stdout.write(self.style.ERROR(f"  {count} x {error}"))
+        return ok
+    
+    def _verify(self, organization, employees_count):
+        rows = Attendance.objects.filter(organization=organization)
+        per_employee = Counter(rows.values_list('employee_id', flat=True))
+        incomplete = rows.filter(check_out__isnull=True).count() + rows.exclude(hours_worked=Decimal('8.25')).count()
+        # Les cumuls mensuels doivent refléter chaque journée pointée
+        summarized = sum(AttendanceMonthlySummary.objects.filter(
+            organization=organization, hours_worked=Decimal('8.25')
+        ).values_list('days_present', flat=True))
+        ok = (
+            len(per_employee) == employees_count and max(per_employee.values(), default=0) == 1
+            and not incomplete and summarized == employees_count
+        )
+        style = self.style.SUCCESS if ok else self.style.ERROR
+        self.stdout.write(style(
+            f"lignes {sum(per_employee.values())} pour {employees_count} employés | "
+            f"doublons {sum(count - 1 for count in per_employee.values())} | lignes incomplètes {incomplete} | "
+            f"journées cumulées {summarized}"
+        ))
+        return ok
@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import absences
+from api.models import Organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Marque absents les employés actifs sans présence ni congé approuvé sur une période passée "
+        "(jours ouvrés hors jours fériés) ; sans option, la veille"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="Premier jour AAAA-MM-JJ (défaut : la veille)")
+        parser.add_argument('--end', help="Dernier jour AAAA-MM-JJ inclus (défaut : --start)")
+        parser.add_argument('--organization', help="Slug de l'organisation (toutes les organisations actives par défaut)")
+    
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        try:
+            start = datetime.date.fromisoformat(options['start']) if options['start'] else yesterday
+            end = datetime.date.fromisoformat(options['end']) if options['end'] else start
+        except ValueError:
+            raise CommandError("Date invalide (format AAAA-MM-JJ).")
+        if end < start:
+            raise CommandError("--end doit suivre --start.")
+        if end >= timezone.localdate():
+            raise CommandError("Seuls les jours passés peuvent être marqués (la journée en cours n'est pas terminée).")
+        
+        organizations = Organization.objects.filter(is_active=True)
+        if options['organization']:
+            organizations = Organization.objects.filter(slug=options['organization'])
+        
+        for organization in organizations:
+            count = absences.mark(organization, start, end)
+            self.stdout.write(f"{organization.name} : {count} absences marquées")
+        
+        self.stdout.write(self.style.SUCCESS(f"Absences marquées du {start} au {end}."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import rollups
+from api.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les cumuls mensuels de présence (AttendanceMonthlySummary) à partir des présences"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help="Slug de l'organisation (toutes par défaut)")
+        parser.add_argument('--month', help="Mois AAAA-MM (tous par défaut)")
+    
+    def handle(self, *args, **options):
+        try:
+            month = rollups.parse_month(options['month'])
+        except ValueError:
+            raise CommandError("Mois invalide (format AAAA-MM).")
+        
+        organizations = Organization.objects.all()
+        if options['organization']:
+            organizations = organizations.filter(slug=options['organization'])
+        
+        for organization in organizations:
+            count = rollups.rebuild(organization, month)
+            self.stdout.write(f"{organization.name} : {count} cumuls mensuels")
+        
+        self.stdout.write(self.style.SUCCESS("Cumuls de présence reconstruits."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api import hierarchy
+from api.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Reconstruit la table de fermeture de la hiérarchie des employés (Employee.manager)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help="Slug de l'organisation (toutes par défaut)")
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.all()
+        if options['organization']:
+            organizations = organizations.filter(slug=options['organization'])
+
+        for organization in organizations:
+            count = hierarchy.rebuild(organization)
+            self.stdout.write(f"{organization.name} : {count} liens hiérarchiques")
+
+        self.stdout.write(self.style.SUCCESS("Hiérarchie reconstruite."))
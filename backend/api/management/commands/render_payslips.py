@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import payslips
+from api.models import Organization, Payroll
+
+
+class Command(BaseCommand):
+    help = (
+        "Rend les bulletins PDF des fiches de paie traitées ou payées ; "
+        "seules les fiches modifiées depuis le dernier rendu sont rendues (sauf --force)"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help="Année de paie")
+        parser.add_argument('--month', type=int, help="Mois de paie (1-12)")
+        parser.add_argument('--organization', help="Slug de l'organisation (toutes par défaut)")
+        parser.add_argument('--force', action='store_true', help="Rend tous les bulletins, même inchangés")
+    
+    def handle(self, *args, **options):
+        if payslips.canvas is None:
+            raise CommandError("reportlab n'est pas installé.")
+        if options['month'] is not None and not 1 <= options['month'] <= 12:
+            raise CommandError("--month doit être compris entre 1 et 12.")
+        
+        payrolls = Payroll.objects.filter(status__in=payslips.RENDERED_STATUSES)
+        if options['organization']:
+            organization = Organization.objects.filter(slug=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"Organisation inconnue : {options['organization']}")
+            payrolls = payrolls.filter(organization=organization)
+        if options['year']:
+            payrolls = payrolls.filter(year=options['year'])
+        if options['month']:
+            payrolls = payrolls.filter(month=options['month'])
+        
+        payroll_ids = payrolls.order_by('organization_id', 'pk').values_list('pk', flat=True)
+        rendered = total = 0
+        for chunk in payslips.chunks(payroll_ids):
+            rendered += payslips.render_payrolls(chunk, force=options['force'])
+            total += len(chunk)
+            self.stdout.write(f"{total} fiches traitées, {rendered} bulletins rendus")
+        
+        self.stdout.write(self.style.SUCCESS(f"{rendered} bulletins rendus ({total - rendered} inchangés)."))
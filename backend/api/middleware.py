@@ -0,0 +1,43 @@
+"""
+Compression des réponses volumineuses.
+
+Brotli (paquet ``brotli``, optionnel) quand le client l'accepte, gzip sinon via
+``GZipMiddleware``. En dessous de ``RESPONSE_COMPRESSION_MIN_SIZE`` octets, la
+réponse part telle quelle : le gain ne paie pas le temps de compression. Les
+réponses en flux (exports) sont compressées en gzip au fil de l'eau.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    brotli = None
+
+
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+        if (brotli is None or response.streaming or response.has_header('Content-Encoding')
+                or not re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+        
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed_content = brotli.compress(response.content, quality=settings.RESPONSE_BROTLI_QUALITY)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+        
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
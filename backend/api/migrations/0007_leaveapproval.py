@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_pending_approvals(apps, schema_editor):
+    """Matérialise les approbateurs des demandes encore en attente"""
+    LeaveRequest = apps.get_model('api', 'LeaveRequest')
+    LeaveApproval = apps.get_model('api', 'LeaveApproval')
+    max_levels = getattr(settings, 'LEAVE_APPROVAL_LEVELS', 2)
+
+    steps = []
+    pending = LeaveRequest.objects.filter(status='pending').select_related(
+        'employee__manager', 'employee__department__manager'
+    )
+    for leave in pending.iterator():
+        employee = leave.employee
+        chain, seen = [], {employee.pk}
+        manager = employee.manager
+        while manager is not None and len(chain) < max_levels and manager.pk not in seen:
+            chain.append(manager)
+            seen.add(manager.pk)
+            manager = manager.manager
+        department = employee.department
+        if department and department.manager_id and department.manager_id not in seen:
+            chain.append(department.manager)
+
+        for level, approver in enumerate(chain, start=1):
+            steps.append(LeaveApproval(
+                leave_request=leave,
+                approver=approver,
+                level=level,
+                status='pending' if level == 1 else 'waiting'
+            ))
+
+    LeaveApproval.objects.bulk_create(steps, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_event_attendees_event_created_by_event_event_type_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveApproval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField(default=1)),
+                ('status', models.CharField(choices=[('waiting', 'En attente du niveau précédent'), ('pending', 'À traiter'), ('approved', 'Approuvé'), ('rejected', 'Rejeté'), ('skipped', 'Ignoré')], default='waiting', max_length=20)),
+                ('decided_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': "Étape d'approbation",
+                'verbose_name_plural': "Étapes d'approbation",
+                'ordering': ['leave_request', 'level'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['organization', 'status'], name='leave_org_status_idx'),
+        ),
+        migrations.AddField(
+            model_name='leaveapproval',
+            name='approver',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_approvals', to='api.employee'),
+        ),
+        migrations.AddField(
+            model_name='leaveapproval',
+            name='leave_request',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='approvals', to='api.leaverequest'),
+        ),
+        migrations.AddIndex(
+            model_name='leaveapproval',
+            index=models.Index(fields=['approver', 'status'], name='leave_approval_inbox_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='leaveapproval',
+            unique_together={('leave_request', 'approver')},
+        ),
+        migrations.RunPython(backfill_pending_approvals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    Employee = apps.get_model('api', 'Employee')
+    EmployeeHierarchy = apps.get_model('api', 'EmployeeHierarchy')
+
+    parents = dict(Employee.objects.values_list('id', 'manager_id'))
+    rows = []
+    for employee_id in parents:
+        rows.append(EmployeeHierarchy(ancestor_id=employee_id, descendant_id=employee_id, depth=0))
+        seen, depth, current = {employee_id}, 0, parents.get(employee_id)
+        while current is not None and current not in seen:
+            depth += 1
+            rows.append(EmployeeHierarchy(ancestor_id=current, descendant_id=employee_id, depth=depth))
+            seen.add(current)
+            current = parents.get(current)
+
+    EmployeeHierarchy.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_leaveapproval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeHierarchy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='api.employee')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='api.employee')),
+            ],
+            options={
+                'verbose_name': 'Lien hiérarchique',
+                'verbose_name_plural': 'Liens hiérarchiques',
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='emp_hierarchy_ancestor_idx'), models.Index(fields=['descendant', 'depth'], name='emp_hierarchy_descendant_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
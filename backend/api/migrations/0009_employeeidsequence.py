@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_employeehierarchy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeIdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_value', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='employee_id_sequence', to='api.organization')),
+            ],
+            options={
+                'verbose_name': "Séquence d'identifiants employés",
+                'verbose_name_plural': "Séquences d'identifiants employés",
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:53
+
+from django.db import migrations, models
+
+
+def backfill_search_text(apps, schema_editor):
+    from api.search import build_search_text
+    
+    Employee = apps.get_model('api', 'Employee')
+    employees = list(Employee.objects.all())
+    for employee in employees:
+        employee.search_text = build_search_text(employee)
+    Employee.objects.bulk_update(employees, ['search_text'], batch_size=1000)
+
+
+def setup_search_backend(apps, schema_editor):
+    from api.search import setup_search_backend
+    
+    setup_search_backend(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_employeeidsequence'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(setup_search_backend, migrations.RunPython.noop),
+    ]
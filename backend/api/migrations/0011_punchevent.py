@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_employee_search_text'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='PunchEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('direction', models.CharField(choices=[('in', 'Entrée'), ('out', 'Sortie')], max_length=3)),
+                ('device_id', models.CharField(blank=True, max_length=100)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='punch_events', to='api.employee')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='punch_events', to='api.organization')),
+            ],
+            options={
+                'verbose_name': 'Pointage badgeuse',
+                'verbose_name_plural': 'Pointages badgeuse',
+                'ordering': ['employee', 'timestamp'],
+                'unique_together': {('employee', 'timestamp', 'direction')},
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_summaries(apps, schema_editor):
+    Attendance = apps.get_model('api', 'Attendance')
+    AttendanceMonthlySummary = apps.get_model('api', 'AttendanceMonthlySummary')
+    
+    rows = Attendance.objects.annotate(month=TruncMonth('date')).order_by().values(
+        'organization_id', 'employee_id', 'month'
+    ).annotate(
+        total_hours=Sum('hours_worked'),
+        present=Count('id', filter=Q(status='present')),
+        late=Count('id', filter=Q(status='late')),
+        half_day=Count('id', filter=Q(status='half_day')),
+        absent=Count('id', filter=Q(status='absent')),
+    )
+    AttendanceMonthlySummary.objects.bulk_create([
+        AttendanceMonthlySummary(
+            organization_id=row['organization_id'],
+            employee_id=row['employee_id'],
+            month=row['month'],
+            hours_worked=row['total_hours'] or 0,
+            days_present=row['present'],
+            days_late=row['late'],
+            days_half_day=row['half_day'],
+            days_absent=row['absent'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_punchevent'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('hours_worked', models.DecimalField(decimal_places=2, default=0, max_digits=7)),
+                ('days_present', models.PositiveSmallIntegerField(default=0)),
+                ('days_late', models.PositiveSmallIntegerField(default=0)),
+                ('days_half_day', models.PositiveSmallIntegerField(default=0)),
+                ('days_absent', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='api.employee')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='api.organization')),
+            ],
+            options={
+                'verbose_name': 'Cumul mensuel de présence',
+                'verbose_name_plural': 'Cumuls mensuels de présence',
+                'ordering': ['-month', 'employee'],
+                'indexes': [models.Index(fields=['organization', 'month'], name='attendance_summary_org_idx')],
+                'unique_together': {('employee', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,149 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:26
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# DDL figé à l'état de cette migration : ne dépend pas du code courant de l'application (api.partitions)
+TABLE = 'api_attendance'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def _next_month(month):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _is_partitioned(cursor):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+    return cursor.fetchone() is not None
+
+
+def _check_no_references(cursor):
+    # Une clé étrangère vers les présences devrait viser (id, date) : conversion refusée plutôt qu'un DROP en échec
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass(%s)",
+        [TABLE]
+    )
+    references = cursor.fetchall()
+    if references:
+        raise RuntimeError(
+            f"Clés étrangères vers {TABLE} : {', '.join(f'{table}.{name}' for table, name in references)}"
+        )
+
+
+def _rename_sequence(cursor):
+    # La séquence d'identité créée à côté de l'ancienne a reçu un suffixe : on lui rend le nom attendu
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+    sequence = cursor.fetchone()[0]
+    if sequence.split('.')[-1] != f'{TABLE}_id_seq':
+        cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {TABLE}_id_seq")
+
+
+def _reset_sequence(cursor):
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}", [TABLE]
+    )
+
+
+def _create_partition(cursor, month):
+    name = f'{TABLE}_p{month:%Y%m}'
+    start, end = month, _next_month(month)
+    cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')")
+
+
+def partition_attendance(apps, schema_editor):
+    """
+    PostgreSQL uniquement : table des présences partitionnée par mois sur ``date``, plus une partition
+    par défaut ; la clé primaire devient ``(id, date)``. Sans effet sur les autres moteurs.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    old = f'{TABLE}_unpartitioned'
+    with schema_editor.connection.cursor() as cursor:
+        if _is_partitioned(cursor):
+            return
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        _check_no_references(cursor)
+        cursor.execute(f"SELECT MIN(date) FROM {TABLE}")
+        first = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY) PARTITION BY RANGE (date)"
+        )
+        # Noms distincts de ceux de l'ancienne table, supprimée en fin de conversion
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_part_pkey PRIMARY KEY (id, date)")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_part_employee_date_uniq UNIQUE (employee_id, date)")
+        for column, target in (('employee_id', 'api_employee'), ('organization_id', 'api_organization')):
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_part_{column}_fk FOREIGN KEY ({column}) "
+                f"REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED"
+            )
+        cursor.execute(f"CREATE INDEX {TABLE}_part_organization_idx ON {TABLE} (organization_id, date)")
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+        
+        month = (first or timezone.localdate()).replace(day=1)
+        last = timezone.localdate().replace(day=1)
+        for _ in range(getattr(settings, 'ATTENDANCE_PARTITIONS_AHEAD', 3)):
+            last = _next_month(last)
+        while month <= last:
+            _create_partition(cursor, month)
+            month = _next_month(month)
+        
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {old}")
+        cursor.execute(f"DROP TABLE {old}")
+        _rename_sequence(cursor)
+        _reset_sequence(cursor)
+
+
+def unpartition_attendance(apps, schema_editor):
+    """Retour à une table unique, recréée telle que Django la définit à cet état (clé ``id``, contraintes, index)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Attendance = apps.get_model('api', 'Attendance')
+    partitioned = f'{TABLE}_partitioned'
+    columns = ', '.join(schema_editor.quote_name(field.column) for field in Attendance._meta.concrete_fields)
+    with schema_editor.connection.cursor() as cursor:
+        if not _is_partitioned(cursor):
+            return
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {partitioned}")
+        schema_editor.create_model(Attendance)
+        cursor.execute(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {partitioned}")
+        # Supprime aussi les partitions
+        cursor.execute(f"DROP TABLE {partitioned}")
+        _rename_sequence(cursor)
+        _reset_sequence(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_attendancemonthlysummary'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('file', models.FileField(upload_to='attendance_archives/')),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_archives', to='api.organization')),
+            ],
+            options={
+                'verbose_name': 'Archive de présences',
+                'verbose_name_plural': 'Archives de présences',
+                'ordering': ['-year'],
+                'unique_together': {('organization', 'year')},
+            },
+        ),
+        migrations.RunPython(partition_attendance, unpartition_attendance),
+    ]
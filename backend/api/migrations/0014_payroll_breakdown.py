@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_attendancearchive_partitions'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='breakdown',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_payroll_breakdown'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='payslip',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payroll', to='api.document'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='payslip_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_payroll_payslip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='bic',
+            field=models.CharField(blank=True, max_length=11),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='iban',
+            field=models.CharField(blank=True, max_length=34),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='bic',
+            field=models.CharField(blank=True, max_length=11),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='iban',
+            field=models.CharField(blank=True, max_length=34),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_bank_details'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_type',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:12
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_gross_salary(apps, schema_editor):
+    # Même règle que Payroll.gross_amount : base et primes, moins les retenues autres que les cotisations
+    Payroll = apps.get_model('api', 'Payroll')
+    batch = []
+    for payroll in Payroll.objects.only('base_salary', 'bonuses', 'breakdown').iterator(chunk_size=2000):
+        payroll.gross_salary = payroll.base_salary + payroll.bonuses - sum((
+            Decimal(entry['amount']) for entry in payroll.breakdown or ()
+            if entry.get('kind') == 'deduction' and entry.get('code') != 'contributions'
+        ), Decimal('0.00'))
+        batch.append(payroll)
+        if len(batch) >= 2000:
+            Payroll.objects.bulk_update(batch, ['gross_salary'])
+            batch = []
+    Payroll.objects.bulk_update(batch, ['gross_salary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_document_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='gross_salary',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_gross_salary, migrations.RunPython.noop),
+    ]
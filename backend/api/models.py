@@ -1,8 +1,15 @@
+import hashlib
+import mimetypes
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+from .search import SEARCH_FIELDS, build_search_text
+
 
 # ==================== MULTI-TENANCY ====================
 
@@ -41,6 +48,10 @@ class Organization(models.Model):
     siret = models.CharField(max_length=20, blank=True) # SIRET
     website = models.URLField(blank=True)
     
+    # Compte débité par les virements de salaires (api.payments)
+    iban = models.CharField(max_length=34, blank=True)
+    bic = models.CharField(max_length=11, blank=True)
+    
     # Settings
     timezone = models.CharField(max_length=50, default='UTC')
     date_format = models.CharField(max_length=20, default='DD/MM/YYYY')
@@ -187,6 +198,8 @@ class Employee(models.Model):
     # Salaire (optionnel, peut être dans un modèle séparé)
     salary = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     salary_currency = models.CharField(max_length=3, default='EUR')
+    iban = models.CharField(max_length=34, blank=True)  # Compte crédité par le virement de salaire
+    bic = models.CharField(max_length=11, blank=True)
     
     # Documents
     profile_photo = models.ImageField(upload_to='employees/photos/', null=True, blank=True)
@@ -200,6 +213,9 @@ class Employee(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
     is_active = models.BooleanField(default=True)
     
+    # Recherche : nom, e-mail, identifiant et poste normalisés (minuscules, sans accents)
+    search_text = models.TextField(blank=True, default='', editable=False)
+    
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -212,11 +228,76 @@ class Employee(models.Model):
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.employee_id})"
     
+    def clean(self):
+        super().clean()
+        self.validate_manager()
+    
+    def validate_manager(self):
+        """ValidationError si le manager est l'employé lui-même ou l'un de ses subordonnés (table de fermeture)"""
+        if self.manager_id is None or self.pk is None:
+            return
+        if self.manager_id == self.pk or EmployeeHierarchy.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.manager_id
+        ).exists():
+            raise ValidationError({'manager': "Ce manager fait partie des subordonnés de l'employé."})
+    
+    def save(self, *args, **kwargs):
+        # Cycle refusé avant l'écriture : la table de fermeture n'est mise à jour qu'après (signal post_save)
+        if self.manager_id != self.__dict__.get('_loaded_manager_id'):
+            self.validate_manager()
+        # Garder la colonne de recherche synchronisée
+        self.search_text = build_search_text(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(SEARCH_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
 
+class EmployeeIdSequence(models.Model):
+    """Compteur des identifiants employés (EMP-{année}-{numéro}) par organisation"""
+    
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, related_name='employee_id_sequence')
+    last_value = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Séquence d\'identifiants employés'
+        verbose_name_plural = 'Séquences d\'identifiants employés'
+    
+    def __str__(self):
+        return f"{self.organization.name} ({self.last_value})"
+
+
+class EmployeeHierarchy(models.Model):
+    """
+    Table de fermeture (closure table) de la hiérarchie Employee.manager.
+    Une ligne par couple (ancêtre, descendant), y compris (employé, employé) à depth=0.
+    Maintenue par les signaux de api/signals.py, reconstructible via
+    `python manage.py rebuild_employee_hierarchy`.
+    """
+    
+    ancestor = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['ancestor', 'descendant']
+        verbose_name = 'Lien hiérarchique'
+        verbose_name_plural = 'Liens hiérarchiques'
+        indexes = [
+            models.Index(fields=['ancestor', 'depth'], name='emp_hierarchy_ancestor_idx'),
+            models.Index(fields=['descendant', 'depth'], name='emp_hierarchy_descendant_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
+
+
 # ==================== LEAVE MANAGEMENT ====================
 
 class LeaveType(models.Model):
@@ -290,6 +371,9 @@ class LeaveRequest(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Demande de congé'
         verbose_name_plural = 'Demandes de congés'
+        indexes = [
+            models.Index(fields=['organization', 'status'], name='leave_org_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.employee.full_name} - {self.leave_type.name} ({self.start_date} → {self.end_date})"
@@ -301,6 +385,44 @@ class LeaveRequest(models.Model):
         super().save(*args, **kwargs)
 
 
+class LeaveApproval(models.Model):
+    """Étape d'approbation d'une demande de congé (une ligne par approbateur et par niveau)"""
+    
+    STATUS_WAITING = 'waiting'      # Niveau précédent pas encore validé
+    STATUS_PENDING = 'pending'      # Dans la boîte de réception de l'approbateur
+    STATUS_APPROVED = 'approved'
+    STATUS_REJECTED = 'rejected'
+    STATUS_SKIPPED = 'skipped'      # Décision prise ailleurs (autre approbateur, admin)
+    STATUS_CHOICES = [
+        (STATUS_WAITING, 'En attente du niveau précédent'),
+        (STATUS_PENDING, 'À traiter'),
+        (STATUS_APPROVED, 'Approuvé'),
+        (STATUS_REJECTED, 'Rejeté'),
+        (STATUS_SKIPPED, 'Ignoré'),
+    ]
+    
+    leave_request = models.ForeignKey(LeaveRequest, on_delete=models.CASCADE, related_name='approvals')
+    approver = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_approvals')
+    level = models.PositiveSmallIntegerField(default=1)  # 1 = manager direct
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_WAITING)
+    decided_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['leave_request', 'approver']
+        ordering = ['leave_request', 'level']
+        verbose_name = 'Étape d\'approbation'
+        verbose_name_plural = 'Étapes d\'approbation'
+        indexes = [
+            models.Index(fields=['approver', 'status'], name='leave_approval_inbox_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.leave_request_id} - {self.approver.full_name} (niveau {self.level}, {self.status})"
+
+
 # ==================== ATTENDANCE ====================
 
 class Attendance(models.Model):
@@ -342,6 +464,87 @@ class Attendance(models.Model):
         return f"{self.employee.full_name} - {self.date} ({self.status})"
 
 
+class AttendanceMonthlySummary(models.Model):
+    """Cumul mensuel des présences d'un employé, tenu à jour à chaque écriture (api.rollups)"""
+    
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='attendance_summaries')
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_summaries')
+    month = models.DateField()  # Premier jour du mois
+    
+    hours_worked = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    # Nombre de journées par statut
+    days_present = models.PositiveSmallIntegerField(default=0)
+    days_late = models.PositiveSmallIntegerField(default=0)
+    days_half_day = models.PositiveSmallIntegerField(default=0)
+    days_absent = models.PositiveSmallIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['employee', 'month']
+        ordering = ['-month', 'employee']
+        verbose_name = 'Cumul mensuel de présence'
+        verbose_name_plural = 'Cumuls mensuels de présence'
+        indexes = [
+            models.Index(fields=['organization', 'month'], name='attendance_summary_org_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.employee.full_name} - {self.month:%Y-%m}"
+
+
+class AttendanceArchive(models.Model):
+    """Année close de présences d'une organisation, sortie de la table Attendance vers un CSV compressé (api.partitions)"""
+    
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='attendance_archives')
+    year = models.PositiveSmallIntegerField()
+    
+    file = models.FileField(upload_to='attendance_archives/')
+    rows = models.PositiveIntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['organization', 'year']
+        ordering = ['-year']
+        verbose_name = 'Archive de présences'
+        verbose_name_plural = 'Archives de présences'
+    
+    def __str__(self):
+        return f"{self.organization.name} - {self.year}"
+
+
+class PunchEvent(models.Model):
+    """Pointage brut remonté par une badgeuse (source des lignes de présence)"""
+    
+    DIRECTION_IN = 'in'
+    DIRECTION_OUT = 'out'
+    DIRECTION_CHOICES = [
+        (DIRECTION_IN, 'Entrée'),
+        (DIRECTION_OUT, 'Sortie'),
+    ]
+    
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='punch_events')
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='punch_events')
+    
+    timestamp = models.DateTimeField()
+    direction = models.CharField(max_length=3, choices=DIRECTION_CHOICES)
+    device_id = models.CharField(max_length=100, blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        # Un même badge renvoyé deux fois par la borne n'est stocké qu'une fois
+        unique_together = ['employee', 'timestamp', 'direction']
+        ordering = ['employee', 'timestamp']
+        verbose_name = 'Pointage badgeuse'
+        verbose_name_plural = 'Pointages badgeuse'
+    
+    def __str__(self):
+        return f"{self.employee.full_name} - {self.timestamp} ({self.direction})"
+
+
 # ==================== DOCUMENTS ====================
 
 class Document(models.Model):
@@ -360,6 +563,8 @@ class Document(models.Model):
         (CATEGORY_OTHER, 'Autre'),
     ]
     
+    METADATA_FIELDS = ('size', 'sha256', 'content_type')
+    
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='documents')
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='documents')
     
@@ -368,6 +573,11 @@ class Document(models.Model):
     file = models.FileField(upload_to='documents/')
     description = models.TextField(blank=True)
     
+    # Métadonnées du fichier, relevées à l'enregistrement : les listes n'interrogent jamais le stockage
+    size = models.PositiveBigIntegerField(default=0, editable=False)
+    sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    content_type = models.CharField(max_length=100, blank=True, editable=False)
+    
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='uploaded_documents')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
@@ -378,6 +588,31 @@ class Document(models.Model):
     
     def __str__(self):
         return f"{self.title} - {self.employee.full_name}"
+    
+    def fill_file_metadata(self):
+        """Taille, empreinte SHA-256 et type MIME lus sur le fichier (l'envoi en cours, sinon le stockage)"""
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in self.file.chunks():
+            digest.update(chunk)
+            size += len(chunk)
+        self.file.seek(0)
+        self.size = size
+        self.sha256 = digest.hexdigest()
+        self.content_type = (
+            mimetypes.guess_type(self.file.name)[0]
+            or getattr(self.file.file, 'content_type', None)
+            or 'application/octet-stream'
+        )[:100]
+    
+    def save(self, *args, **kwargs):
+        # Nouveau fichier pas encore écrit dans le stockage : métadonnées lues sur l'envoi
+        if self.file and not self.file._committed:
+            self.fill_file_metadata()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.METADATA_FIELDS}
+        super().save(*args, **kwargs)
 
 
 # ==================== PAYROLL (Basique) ====================
@@ -405,12 +640,20 @@ class Payroll(models.Model):
     bonuses = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     deductions = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     net_salary = models.DecimalField(max_digits=10, decimal_places=2)
+    # Brut après primes et retenues d'absence, avant cotisations (cf. ``gross_amount``)
+    gross_salary = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    # Détail du calcul (api.payroll) : [{code, label, kind, basis, amount}, ...]
+    breakdown = models.JSONField(default=list, blank=True)
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_DRAFT)
     payment_date = models.DateField(null=True, blank=True)
     
     notes = models.TextField(blank=True)
     
+    # Bulletin PDF (api.payslips) et empreinte des données rendues
+    payslip = models.OneToOneField('Document', on_delete=models.SET_NULL, null=True, blank=True, related_name='payroll')
+    payslip_hash = models.CharField(max_length=64, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -420,8 +663,26 @@ class Payroll(models.Model):
         verbose_name = 'Fiche de paie'
         verbose_name_plural = 'Fiches de paie'
     
+    GROSS_FIELDS = ('base_salary', 'bonuses', 'breakdown')
+    
     def __str__(self):
         return f"{self.employee.full_name} - {self.month}/{self.year}"
+    
+    @staticmethod
+    def gross_amount(base_salary, bonuses, breakdown):
+        """Salaire de base et primes, moins les retenues du détail autres que les cotisations"""
+        return Decimal(base_salary) + Decimal(bonuses) - sum((
+            Decimal(entry['amount']) for entry in breakdown or ()
+            if entry.get('kind') == 'deduction' and entry.get('code') != 'contributions'
+        ), Decimal('0.00'))
+    
+    def save(self, *args, **kwargs):
+        # Fiches saisies à la main comprises : le brut suit les montants
+        self.gross_salary = self.gross_amount(self.base_salary, self.bonuses, self.breakdown)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.GROSS_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'gross_salary'}
+        super().save(*args, **kwargs)
 
 # ==================== DASHBOARD WIDGETS ====================
 
@@ -0,0 +1,233 @@
+"""
+Stockage des présences dans le temps : partitions mensuelles et archives annuelles.
+
+Sur PostgreSQL, la table ``Attendance`` est partitionnée par mois sur ``date``
+(``PARTITION BY RANGE``) : une requête bornée dans le temps ne lit que les
+partitions concernées, et l'historique ne pèse plus sur les index chauds. La
+migration 0013 convertit la table existante ; ``ensure_partitions`` (commande
+``attendance_partitions``, tâche mensuelle) crée les mois à venir. Une partition
+par défaut reçoit les dates hors plage ; ses lignes rejoignent la partition
+du mois lorsque celle-ci est créée. Les autres moteurs (SQLite...) gardent une
+table unique : tout le reste fonctionne à l'identique.
+
+Une année close peut être archivée (``archive_year``) : ses présences sont
+écrites par organisation dans un CSV compressé (``AttendanceArchive``), toujours
+lisible pour les exports (``archived_rows``), puis retirées de la table — sur
+PostgreSQL, les partitions de l'année sont simplement supprimées. Les cumuls
+mensuels (api.rollups) de l'année archivée sont recalculés à partir des lignes archivées.
+"""
+import csv
+import datetime
+import gzip
+import io
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import Attendance, AttendanceArchive, AttendanceMonthlySummary, Organization
+
+
+TABLE = Attendance._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+ARCHIVE_COLUMNS = [
+    'employee', 'employee_id', 'employee_name', 'date', 'check_in', 'check_out', 'hours_worked', 'status', 'notes',
+]
+
+
+def get_partitions_ahead():
+    """Nombre de mois à venir pour lesquels une partition doit exister"""
+    return getattr(settings, 'ATTENDANCE_PARTITIONS_AHEAD', 3)
+
+
+def _next_month(month):
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+# ==================== PARTITIONS (POSTGRESQL) ====================
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """``[(partition, borne)]`` des partitions existantes (vide hors PostgreSQL)"""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [TABLE]
+        )
+        return cursor.fetchall()
+
+
+def _create_partition(cursor, month):
+    """Crée la partition de ``month`` en y déplaçant les lignes du mois tombées dans la partition par défaut"""
+    name = partition_name(month)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    start, end = month, _next_month(month)
+    cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        [start, end]
+    )
+    # ATTACH crée sur la partition les index de la table mère ; bornes littérales (DDL sans paramètres liés)
+    cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')")
+    return True
+
+
+def ensure_partitions(ahead=None):
+    """Crée les partitions du mois courant et des ``ahead`` mois suivants ; retourne les partitions créées"""
+    if not is_partitioned():
+        return []
+    ahead = get_partitions_ahead() if ahead is None else ahead
+    month = timezone.localdate().replace(day=1)
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _ in range(ahead + 1):
+            if _create_partition(cursor, month):
+                created.append(partition_name(month))
+            month = _next_month(month)
+    return created
+
+
+# ==================== ARCHIVES ====================
+
+def _read_archive(archive):
+    with archive.file.open('rb') as raw, gzip.open(raw, 'rt', encoding='utf-8', newline='') as text:
+        yield from csv.DictReader(text)
+
+
+def archived_rows(archives, employee_id=None):
+    """Lignes (dicts ``ARCHIVE_COLUMNS``, valeurs texte) des archives ``archives``, triées comme à l'écriture"""
+    for archive in archives:
+        for row in _read_archive(archive):
+            if employee_id is None or row['employee'] == str(employee_id):
+                yield row
+
+
+def _live_rows(organization, start, end, employee_ids=None):
+    rows = Attendance.objects.filter(organization=organization, date__range=(start, end))
+    if employee_ids is not None:
+        rows = rows.filter(employee_id__in=employee_ids)
+    rows = rows.order_by('date', 'employee_id').values_list(
+        'employee_id', 'employee__employee_id', 'employee__first_name', 'employee__last_name',
+        'date', 'check_in', 'check_out', 'hours_worked', 'status', 'notes'
+    )
+    for employee, number, first_name, last_name, day, check_in, check_out, hours, status, notes in rows.iterator(chunk_size=5000):
+        yield {
+            'employee': str(employee),
+            'employee_id': number,
+            'employee_name': f"{first_name} {last_name}",
+            'date': day.isoformat(),
+            'check_in': check_in.isoformat() if check_in else '',
+            'check_out': check_out.isoformat() if check_out else '',
+            'hours_worked': str(hours),
+            'status': status,
+            'notes': notes,
+        }
+
+
+def _merge(archived, live):
+    rows = {(row['employee'], row['date']): row for row in archived}
+    # Une ligne recréée depuis l'archivage (saisie a posteriori) remplace l'ancienne
+    rows.update(((row['employee'], row['date']), row) for row in live)
+    return rows
+
+
+def merged_rows(organization, year, archive, employee_ids=None):
+    """Lignes de ``year`` : l'archive complétée des présences saisies depuis (de ``employee_ids`` seulement)"""
+    wanted = {str(pk) for pk in employee_ids} if employee_ids is not None else None
+    archived = (row for row in archived_rows([archive]) if wanted is None or row['employee'] in wanted)
+    live = _live_rows(organization, datetime.date(year, 1, 1), datetime.date(year, 12, 31), employee_ids)
+    return _merge(archived, live).values()
+
+
+def _write_archive(organization, year, start, end):
+    """
+    Écrit (ou complète) l'archive de ``year`` et recalcule ses cumuls mensuels à partir des lignes
+    fusionnées ; retourne le nombre de lignes de l'année encore en table
+    """
+    archive = AttendanceArchive.objects.filter(organization=organization, year=year).first()
+    live = list(_live_rows(organization, start, end))
+    if not live:
+        return 0
+    
+    rows = _merge(archived_rows([archive]) if archive else (), live)
+    
+    with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as buffer:
+        with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as compressed:
+            text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+            writer = csv.DictWriter(text, fieldnames=ARCHIVE_COLUMNS)
+            writer.writeheader()
+            writer.writerows(sorted(rows.values(), key=lambda row: (row['date'], int(row['employee']))))
+            text.flush()
+            text.detach()
+        buffer.seek(0)
+        
+        old_name = archive.file.name if archive else None
+        archive = archive or AttendanceArchive(organization=organization, year=year)
+        archive.rows = len(rows)
+        archive.file.save(f"{organization.slug}-{year}.csv.gz", File(buffer), save=False)
+        with transaction.atomic():
+            archive.save()
+            AttendanceMonthlySummary.objects.filter(organization=organization, month__year=year).delete()
+            AttendanceMonthlySummary.objects.bulk_create(
+                rollups.summaries_from_rows(organization.pk, rows.values()), batch_size=500
+            )
+    if old_name and old_name != archive.file.name:
+        archive.file.storage.delete(old_name)
+    return len(live)
+
+
+def archive_year(year, organization=None):
+    """
+    Archive les présences de l'année close ``year`` (de toutes les organisations, ou de ``organization``)
+    puis les retire de la table ; retourne ``{organisation: lignes archivées}``.
+    """
+    if year >= timezone.localdate().year:
+        raise ValueError("Seule une année close peut être archivée.")
+    start, end = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+    organizations = [organization] if organization is not None else Organization.objects.filter(
+        pk__in=Attendance.objects.filter(date__range=(start, end)).values('organization_id')
+    )
+    
+    archived = {}
+    for current in organizations:
+        count = _write_archive(current, year, start, end)
+        if count:
+            archived[current] = count
+    
+    # Les archives sont écrites : les lignes peuvent partir (SQL direct, sans signaux ni recalcul des cumuls)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if organization is None and is_partitioned():
+            month = start
+            while month <= end:
+                cursor.execute(f"DROP TABLE IF EXISTS {partition_name(month)}")
+                month = _next_month(month)
+            cursor.execute(f"DELETE FROM {TABLE} WHERE date >= %s AND date <= %s", [start, end])
+        elif organization is None:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE date >= %s AND date <= %s", [start, end])
+        else:
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE organization_id = %s AND date >= %s AND date <= %s",
+                [organization.pk, start, end]
+            )
+    return archived
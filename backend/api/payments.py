@@ -0,0 +1,206 @@
+"""
+Fichiers de virement des salaires.
+
+Les fiches de paie traitées d'un mois sont exportées en virement SEPA
+(``pain.001.001.03``) ou en CSV bancaire, écrits au fil de l'eau à partir d'un
+itérateur ``values_list`` : la mémoire reste constante, quel que soit le nombre
+de virements.
+
+Le nombre de virements et le total de contrôle (``NbOfTxs`` / ``CtrlSum``)
+figurent en tête du fichier : une première passe (``prepare``) les calcule et
+vérifie chaque IBAN (clé ISO 13616, modulo 97) et BIC avant toute écriture. La
+seconde passe recompte en écrivant ; si les fiches ont changé entre-temps, le
+flux est interrompu plutôt que de produire un fichier aux totaux faux.
+"""
+import csv
+import re
+import unicodedata
+import uuid
+from decimal import Decimal
+from xml.sax.saxutils import escape, quoteattr
+
+from django.utils import timezone
+
+from .models import Payroll
+
+
+EXPORT_STATUSES = (Payroll.STATUS_PROCESSED, Payroll.STATUS_PAID)
+
+SEPA_NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03'
+SEPA_CURRENCY = 'EUR'
+
+BIC_RE = re.compile(r'^[A-Z]{6}[A-Z0-9]{2}([A-Z0-9]{3})?$')
+# Jeu de caractères latin restreint accepté par toutes les banques SEPA
+SEPA_FORBIDDEN_RE = re.compile(r"[^A-Za-z0-9/\-?:().,'+ ]")
+
+MAX_ERRORS = 50
+
+CSV_COLUMNS = ['Bénéficiaire', 'Matricule', 'IBAN', 'BIC', 'Montant', 'Devise', 'Référence']
+
+
+class PaymentExportError(ValueError):
+    """Export impossible ; ``errors`` détaille les fiches en cause"""
+    
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+# ==================== VALIDATION ====================
+
+def normalize_iban(value):
+    return re.sub(r'\s+', '', value or '').upper()
+
+
+def is_valid_iban(value):
+    """Format et clé de contrôle ISO 13616 (reste 1 modulo 97)"""
+    iban = normalize_iban(value)
+    if not re.fullmatch(r'[A-Z]{2}[0-9]{2}[A-Z0-9]{11,30}', iban):
+        return False
+    digits = ''.join(str(int(char, 36)) for char in iban[4:] + iban[:4])
+    return int(digits) % 97 == 1
+
+
+def is_valid_bic(value):
+    return bool(BIC_RE.match((value or '').strip().upper()))
+
+
+def sepa_text(value, length):
+    """Texte ramené au jeu de caractères SEPA (accents retirés) et tronqué à ``length``"""
+    value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode('ascii')
+    return SEPA_FORBIDDEN_RE.sub(' ', ' '.join(value.split()))[:length].strip()
+
+
+# ==================== DONNÉES ====================
+
+def payments(organization, year, month, status=Payroll.STATUS_PROCESSED):
+    """Virements du mois : fiches au net positif, par matricule"""
+    return Payroll.objects.filter(
+        organization=organization, year=year, month=month, status=status, net_salary__gt=0
+    ).order_by('employee__employee_id')
+
+
+def _rows(queryset):
+    rows = queryset.values_list(
+        'pk', 'employee__employee_id', 'employee__first_name', 'employee__last_name',
+        'employee__iban', 'employee__bic', 'net_salary'
+    )
+    return rows.iterator(chunk_size=2000)
+
+
+def prepare(organization, queryset, file_format):
+    """
+    Première passe : ``(nombre, total)`` des virements ; PaymentExportError si l'organisation
+    ou un bénéficiaire ne peut pas être payé par ce format
+    """
+    errors = []
+    if file_format == 'sepa':
+        if organization.currency != SEPA_CURRENCY:
+            raise PaymentExportError(f"Le virement SEPA n'accepte que l'euro (devise de l'organisation : {organization.currency}).")
+        if not is_valid_iban(organization.iban):
+            errors.append({'organization': organization.pk, 'error': "IBAN de l'organisation absent ou invalide."})
+        if organization.bic and not is_valid_bic(organization.bic):
+            errors.append({'organization': organization.pk, 'error': "BIC de l'organisation invalide."})
+    
+    count, total = 0, Decimal('0.00')
+    for pk, number, first_name, last_name, iban, bic, amount in _rows(queryset):
+        count += 1
+        total += amount
+        if len(errors) >= MAX_ERRORS:
+            continue
+        if not is_valid_iban(iban):
+            errors.append({'payroll': pk, 'employee_id': number, 'error': f"IBAN absent ou invalide ({first_name} {last_name})."})
+        elif bic and not is_valid_bic(bic):
+            errors.append({'payroll': pk, 'employee_id': number, 'error': f"BIC invalide ({first_name} {last_name})."})
+    if errors:
+        raise PaymentExportError("Coordonnées bancaires invalides.", errors)
+    if not count:
+        raise PaymentExportError("Aucune fiche de paie à payer sur cette période.")
+    return count, total
+
+
+def _check_totals(expected, count, total):
+    if (count, total) != expected:
+        raise PaymentExportError(
+            f"Les fiches de paie ont changé pendant l'export ({count} virements / {total} "
+            f"au lieu de {expected[0]} / {expected[1]}) : relancez l'export."
+        )
+
+
+def _reference(organization, year, month):
+    return sepa_text(f"SALAIRE {month:02d}/{year} {organization.name}", 140)
+
+
+# ==================== FORMATS ====================
+
+def sepa_xml(organization, queryset, year, month, expected, execution_date=None):
+    """Virement SEPA ``pain.001.001.03`` (une remise, catégorie ``SALA``), produit morceau par morceau"""
+    count, total = expected
+    message_id = f"PAY{year}{month:02d}-{uuid.uuid4().hex[:20].upper()}"
+    execution_date = execution_date or timezone.localdate()
+    debtor = escape(sepa_text(organization.name, 70))
+    reference = escape(_reference(organization, year, month))
+    
+    initiator = f"<Nm>{debtor}</Nm>"
+    if organization.siret:
+        initiator += (
+            f"<Id><OrgId><Othr><Id>{escape(sepa_text(organization.siret, 35))}</Id>"
+            f"<SchmeNm><Prtry>SIRET</Prtry></SchmeNm></Othr></OrgId></Id>"
+        )
+    debtor_agent = (
+        f"<FinInstnId><BIC>{escape(organization.bic.strip().upper())}</BIC></FinInstnId>" if organization.bic
+        else "<FinInstnId><Othr><Id>NOTPROVIDED</Id></Othr></FinInstnId>"
+    )
+    yield (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Document xmlns="{SEPA_NAMESPACE}" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f'<CstmrCdtTrfInitn>'
+        f'<GrpHdr><MsgId>{message_id}</MsgId>'
+        f'<CreDtTm>{timezone.localtime().replace(microsecond=0, tzinfo=None).isoformat()}</CreDtTm>'
+        f'<NbOfTxs>{count}</NbOfTxs><CtrlSum>{total:.2f}</CtrlSum>'
+        f'<InitgPty>{initiator}</InitgPty></GrpHdr>'
+        f'<PmtInf><PmtInfId>{message_id}</PmtInfId><PmtMtd>TRF</PmtMtd><BtchBookg>true</BtchBookg>'
+        f'<NbOfTxs>{count}</NbOfTxs><CtrlSum>{total:.2f}</CtrlSum>'
+        f'<PmtTpInf><SvcLvl><Cd>SEPA</Cd></SvcLvl><CtgyPurp><Cd>SALA</Cd></CtgyPurp></PmtTpInf>'
+        f'<ReqdExctnDt>{execution_date.isoformat()}</ReqdExctnDt>'
+        f'<Dbtr>{initiator}</Dbtr>'
+        f'<DbtrAcct><Id><IBAN>{normalize_iban(organization.iban)}</IBAN></Id><Ccy>{SEPA_CURRENCY}</Ccy></DbtrAcct>'
+        f'<DbtrAgt>{debtor_agent}</DbtrAgt><ChrgBr>SLEV</ChrgBr>\n'
+    )
+    
+    written, written_total = 0, Decimal('0.00')
+    for pk, number, first_name, last_name, iban, bic, amount in _rows(queryset):
+        written += 1
+        written_total += amount
+        agent = f"<CdtrAgt><FinInstnId><BIC>{escape(bic.strip().upper())}</BIC></FinInstnId></CdtrAgt>" if bic else ""
+        yield (
+            f'<CdtTrfTxInf><PmtId><EndToEndId>{escape(sepa_text(f"PAY-{pk}-{year}{month:02d}", 35))}</EndToEndId></PmtId>'
+            f'<Amt><InstdAmt Ccy={quoteattr(SEPA_CURRENCY)}>{amount:.2f}</InstdAmt></Amt>{agent}'
+            f'<Cdtr><Nm>{escape(sepa_text(f"{first_name} {last_name}", 70))}</Nm></Cdtr>'
+            f'<CdtrAcct><Id><IBAN>{normalize_iban(iban)}</IBAN></Id></CdtrAcct>'
+            f'<RmtInf><Ustrd>{reference}</Ustrd></RmtInf></CdtTrfTxInf>\n'
+        )
+    _check_totals(expected, written, written_total)
+    yield '</PmtInf></CstmrCdtTrfInitn></Document>\n'
+
+
+def bank_csv(organization, queryset, year, month, expected):
+    """CSV bancaire (``;``), une ligne par virement, puis une ligne de contrôle (nombre et total)"""
+    class Echo:
+        def write(self, value):
+            return value
+    
+    writer = csv.writer(Echo(), delimiter=';')
+    reference = _reference(organization, year, month)
+    yield '\ufeff' + writer.writerow(CSV_COLUMNS)
+    
+    written, written_total = 0, Decimal('0.00')
+    for pk, number, first_name, last_name, iban, bic, amount in _rows(queryset):
+        written += 1
+        written_total += amount
+        yield writer.writerow([
+            f"{first_name} {last_name}", number, normalize_iban(iban), (bic or '').strip().upper(),
+            f"{amount:.2f}", organization.currency, reference,
+        ])
+    _check_totals(expected, written, written_total)
+    yield writer.writerow(['TOTAL', written, '', '', f"{written_total:.2f}", organization.currency, ''])
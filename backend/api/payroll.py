@@ -0,0 +1,442 @@
+"""
+Calcul de la paie par règles.
+
+Les données d'entrée d'une organisation pour un mois sont chargées en bloc, en
+une requête par source : salaires (``Employee``), jours de congé sans solde
+approuvés (``LeaveRequest`` dont le type n'est pas payé), absences du cumul
+mensuel (``AttendanceMonthlySummary``) et heures supplémentaires (api.timesheets).
+Chaque employé passe ensuite par la chaîne de règles ``PAYROLL_RULES`` (chemins
+pointés, dans l'ordre) : une règle est une fonction ``(ligne, entrées, options)``
+qui ajoute des montants à la ligne. Chaque montant est tracé dans
+``Payroll.breakdown`` (code, libellé, assiette, montant).
+
+Tout le calcul se fait en ``Decimal``, arrondi au centime à chaque montant
+(``ROUND_HALF_UP``) : un même mois recalculé donne exactement le même résultat.
+Au-delà de ``PAYROLL_PARALLEL_MIN_EMPLOYEES`` employés, les départements sont
+répartis entre processus (les règles n'accèdent pas à la base).
+
+``simulate`` rejoue le calcul en mémoire avec d'autres taux ou des salaires
+augmentés, sans écrire de fiche : la paie d'un mois peut être prévisualisée
+avant sa génération ou une campagne d'augmentation.
+"""
+import calendar
+import datetime
+import multiprocessing
+import os
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import django
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import absences, analytics, timesheets
+from .models import AttendanceMonthlySummary, Department, Employee, LeaveRequest, Organization, Payroll
+
+
+CENT = Decimal('0.01')
+
+KIND_BASE = 'base'
+KIND_BONUS = 'bonus'
+KIND_DEDUCTION = 'deduction'
+
+PayrollOptions = namedtuple('PayrollOptions', [
+    'rules', 'bonus_rate', 'deduction_rate', 'overtime_rate', 'monthly_hours',
+])
+
+PayrollInputs = namedtuple('PayrollInputs', [
+    'employee_id', 'department_id', 'annual_salary', 'working_days', 'days_employed',
+    'unpaid_leave_days', 'absent_days', 'overtime_minutes',
+])
+
+DEFAULT_RULES = [
+    'api.payroll.base_salary',
+    'api.payroll.unpaid_leave',
+    'api.payroll.unjustified_absences',
+    'api.payroll.overtime',
+    'api.payroll.bonus',
+    'api.payroll.contributions',
+]
+
+DEFAULT_RATES = {
+    'bonus_rate': '0.05',
+    'deduction_rate': '0.22',
+    'overtime_rate': '1.25',
+}
+
+# Bornes des taux et de l'augmentation simulée (10 = 1 000 %) : au-delà, c'est une erreur de saisie
+MAX_RATE = Decimal('10')
+MAX_SALARY_INCREASE = Decimal('10')
+
+
+def money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def get_options(**overrides):
+    """Règles et taux par défaut < ``settings.PAYROLL_RULES`` / ``PAYROLL_RATES`` < ``overrides`` ; ValueError si invalide"""
+    values = {
+        **DEFAULT_RATES,
+        **getattr(settings, 'PAYROLL_RATES', {}),
+        'rules': getattr(settings, 'PAYROLL_RULES', DEFAULT_RULES),
+        **overrides,
+    }
+    unknown = set(values) - set(PayrollOptions._fields)
+    if unknown:
+        raise ValueError(f"Options inconnues : {', '.join(sorted(unknown))}")
+    for name in DEFAULT_RATES:
+        try:
+            values[name] = Decimal(str(values[name]))
+        except InvalidOperation:
+            raise ValueError(f"Taux invalide : {name}")
+        if not values[name].is_finite() or values[name] < 0:
+            raise ValueError(f"Taux négatif ou invalide : {name}")
+        if values[name] > MAX_RATE:
+            raise ValueError(f"Taux trop élevé : {name} (maximum {MAX_RATE})")
+    values['rules'] = tuple(values['rules'])
+    for path in values['rules']:
+        import_string(path)
+    if 'monthly_hours' not in values:
+        # Durée mensuelle de référence : seuil hebdomadaire des feuilles de temps sur 52 semaines
+        values['monthly_hours'] = Decimal(str(timesheets.get_rules().weekly_threshold)) * 52 / 12
+    return PayrollOptions(**values)
+
+
+# ==================== LIGNE DE PAIE ====================
+
+class PayrollLine:
+    """Fiche de paie en cours de calcul ; ``breakdown`` garde la trace de chaque montant"""
+    
+    def __init__(self, inputs):
+        self.employee_id = inputs.employee_id
+        self.department_id = inputs.department_id
+        self.base_salary = Decimal('0.00')
+        self.bonuses = Decimal('0.00')
+        self.deductions = Decimal('0.00')
+        self.breakdown = []
+    
+    def add(self, kind, code, label, amount, basis=''):
+        amount = money(amount)
+        if not amount and kind != KIND_BASE:
+            return
+        if kind == KIND_BASE:
+            self.base_salary += amount
+        elif kind == KIND_BONUS:
+            self.bonuses += amount
+        else:
+            self.deductions += amount
+        self.breakdown.append({'code': code, 'label': label, 'kind': kind, 'basis': basis, 'amount': str(amount)})
+    
+    @property
+    def gross(self):
+        """Brut après primes et retenues d'absence, avant cotisations (même règle que ``Payroll.gross_salary``)"""
+        return Payroll.gross_amount(self.base_salary, self.bonuses, self.breakdown)
+    
+    @property
+    def net_salary(self):
+        return self.base_salary + self.bonuses - self.deductions
+
+
+def _monthly_salary(inputs):
+    return money(inputs.annual_salary / 12)
+
+
+def _daily_rate(inputs):
+    return _monthly_salary(inputs) / inputs.working_days if inputs.working_days else Decimal('0')
+
+
+# ==================== RÈGLES ====================
+
+def base_salary(line, inputs, options):
+    """Salaire annuel / 12, au prorata des jours ouvrés sous contrat (embauche ou départ en cours de mois)"""
+    monthly = _monthly_salary(inputs)
+    if inputs.working_days and inputs.days_employed < inputs.working_days:
+        line.add(
+            KIND_BASE, 'base_salary', "Salaire de base (prorata)", monthly * inputs.days_employed / inputs.working_days,
+            basis=f"{monthly} × {inputs.days_employed}/{inputs.working_days} j"
+        )
+    else:
+        line.add(KIND_BASE, 'base_salary', "Salaire de base", monthly, basis=f"{inputs.annual_salary} / 12")
+
+
+def unpaid_leave(line, inputs, options):
+    """Jours ouvrés de congé sans solde approuvé"""
+    rate = _daily_rate(inputs)
+    line.add(
+        KIND_DEDUCTION, 'unpaid_leave', "Congé sans solde", rate * inputs.unpaid_leave_days,
+        basis=f"{inputs.unpaid_leave_days} j × {money(rate)}"
+    )
+
+
+def unjustified_absences(line, inputs, options):
+    """Journées marquées absentes (hors congés approuvés, cf. api.absences)"""
+    rate = _daily_rate(inputs)
+    line.add(
+        KIND_DEDUCTION, 'absences', "Absences non justifiées", rate * inputs.absent_days,
+        basis=f"{inputs.absent_days} j × {money(rate)}"
+    )
+
+
+def overtime(line, inputs, options):
+    """Heures supplémentaires (jour et semaine) majorées de ``overtime_rate``"""
+    if not options.monthly_hours:
+        return
+    hourly = _monthly_salary(inputs) / options.monthly_hours
+    hours = Decimal(inputs.overtime_minutes) / 60
+    line.add(
+        KIND_BONUS, 'overtime', "Heures supplémentaires", hours * hourly * options.overtime_rate,
+        basis=f"{money(hours)} h × {money(hourly)} × {options.overtime_rate}"
+    )
+
+
+def bonus(line, inputs, options):
+    line.add(
+        KIND_BONUS, 'bonus', "Prime", line.base_salary * options.bonus_rate,
+        basis=f"{line.base_salary} × {options.bonus_rate}"
+    )
+
+
+def contributions(line, inputs, options):
+    """Cotisations sur le brut (après primes et retenues d'absence) ; à placer en dernier"""
+    gross = line.gross
+    line.add(
+        KIND_DEDUCTION, 'contributions', "Cotisations", gross * options.deduction_rate,
+        basis=f"{gross} × {options.deduction_rate}"
+    )
+
+
+# ==================== DONNÉES D'ENTRÉE ====================
+
+def period_bounds(year, month):
+    return datetime.date(year, month, 1), datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+
+def load_inputs(organization, year, month, employee_ids=None):
+    """Entrées de tous les employés sous contrat sur le mois, triées par employé (une requête par source)"""
+    start, end = period_bounds(year, month)
+    working_days = absences.working_days(organization, start, end)
+    
+    employees = Employee.objects.filter(organization=organization, is_active=True, hire_date__lte=end).filter(
+        Q(termination_date__isnull=True) | Q(termination_date__gte=start)
+    )
+    if employee_ids is not None:
+        employees = employees.filter(pk__in=employee_ids)
+    employees = list(employees.order_by('pk').values_list(
+        'pk', 'department_id', 'salary', 'hire_date', 'termination_date'
+    ))
+    ids = [row[0] for row in employees]
+    
+    unpaid = defaultdict(int)
+    leaves = LeaveRequest.objects.filter(
+        organization=organization,
+        employee_id__in=ids,
+        status=LeaveRequest.STATUS_APPROVED,
+        leave_type__is_paid=False,
+        start_date__lte=end,
+        end_date__gte=start,
+    ).values_list('employee_id', 'start_date', 'end_date')
+    for employee_id, first, last in leaves:
+        unpaid[employee_id] += sum(1 for day in working_days if first <= day <= last)
+    
+    absent = dict(AttendanceMonthlySummary.objects.filter(
+        organization=organization, month=start, employee_id__in=ids
+    ).values_list('employee_id', 'days_absent'))
+    sheets = timesheets.compute(organization, start, end, employee_ids=ids) if ids else {}
+    
+    inputs = []
+    for employee_id, department_id, salary, hire_date, termination_date in employees:
+        employed = [
+            day for day in working_days
+            if day >= hire_date and (termination_date is None or day <= termination_date)
+        ]
+        inputs.append(PayrollInputs(
+            employee_id=employee_id,
+            department_id=department_id,
+            annual_salary=salary or Decimal('0'),
+            working_days=len(working_days),
+            days_employed=len(employed),
+            unpaid_leave_days=unpaid[employee_id],
+            absent_days=absent.get(employee_id, 0),
+            overtime_minutes=sheets.get(employee_id, {}).get('overtime_minutes', 0),
+        ))
+    return inputs
+
+
+# ==================== CALCUL ====================
+
+def compute_lines(inputs, options):
+    """Applique les règles à chaque entrée (sans accès à la base : exécutable dans un autre processus)"""
+    rules = [import_string(path) for path in options.rules]
+    lines = []
+    for item in inputs:
+        line = PayrollLine(item)
+        for rule in rules:
+            rule(line, item, options)
+        lines.append(line)
+    return lines
+
+
+def _workers():
+    return getattr(settings, 'PAYROLL_WORKERS', 0) or os.cpu_count() or 1
+
+
+def compute(organization, year, month, options=None, employee_ids=None):
+    """Lignes de paie ``[PayrollLine]`` du mois, triées par employé"""
+    inputs = load_inputs(organization, year, month, employee_ids)
+    return compute_inputs(inputs, options or get_options())
+
+
+def compute_inputs(inputs, options):
+    """Lignes de paie des entrées ``inputs``, réparties entre processus au-delà du seuil"""
+    workers = _workers()
+    if len(inputs) < getattr(settings, 'PAYROLL_PARALLEL_MIN_EMPLOYEES', 50000) or workers < 2:
+        return compute_lines(inputs, options)
+    
+    by_department = defaultdict(list)
+    for item in inputs:
+        by_department[item.department_id].append(item)
+    # spawn : pas de connexion à la base héritée ; le démarrage (~0,5 s par processus) réserve ce chemin aux très grosses paies
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(by_department)),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    ) as executor:
+        chunks = executor.map(compute_lines, by_department.values(), [options] * len(by_department))
+        lines = [line for chunk in chunks for line in chunk]
+    return sorted(lines, key=lambda line: line.employee_id)
+
+
+def generate(organization, year, month, recompute=False, options=None):
+    """
+    Crée les fiches de paie (brouillons) du mois ; les fiches existantes sont ignorées, ou recalculées
+    si ``recompute`` et encore en brouillon. Retourne ``{created, updated, skipped}``.
+    """
+    lines = compute(organization, year, month, options)
+    with transaction.atomic():
+        # Deux générations simultanées du même mois se succèdent : la seconde voit les fiches de la première
+        Organization.objects.select_for_update().filter(pk=organization.pk).exists()
+        return _save_lines(organization, year, month, lines, recompute)
+
+
+def _save_lines(organization, year, month, lines, recompute):
+    existing = {
+        payroll.employee_id: payroll
+        for payroll in Payroll.objects.filter(organization=organization, year=year, month=month)
+    }
+    
+    created, updated = [], []
+    for line in lines:
+        payroll = existing.get(line.employee_id)
+        if payroll is None:
+            payroll = Payroll(organization=organization, employee_id=line.employee_id, year=year, month=month)
+            created.append(payroll)
+        elif recompute and payroll.status == Payroll.STATUS_DRAFT:
+            updated.append(payroll)
+        else:
+            continue
+        payroll.base_salary = line.base_salary
+        payroll.bonuses = line.bonuses
+        payroll.deductions = line.deductions
+        payroll.net_salary = line.net_salary
+        payroll.gross_salary = line.gross
+        payroll.breakdown = line.breakdown
+    
+    now = timezone.now()
+    for payroll in updated:
+        payroll.updated_at = now
+    Payroll.objects.bulk_create(created, batch_size=500)
+    Payroll.objects.bulk_update(
+        updated, ['base_salary', 'bonuses', 'deductions', 'net_salary', 'gross_salary', 'breakdown', 'updated_at'],
+        batch_size=500
+    )
+    if created or updated:
+        analytics.invalidate_payroll_summary(organization.pk, year, month)
+    return {'created': len(created), 'updated': len(updated), 'skipped': len(lines) - len(created) - len(updated)}
+
+
+# ==================== SIMULATION ====================
+
+SIMULATION_AMOUNTS = ['base_salary', 'bonuses', 'deductions', 'gross', 'net_salary']
+
+
+def _empty_totals():
+    return {'employees': 0, **{amount: Decimal('0.00') for amount in SIMULATION_AMOUNTS}}
+
+
+def _add_line(totals, line):
+    totals['employees'] += 1
+    totals['base_salary'] += line.base_salary
+    totals['bonuses'] += line.bonuses
+    totals['deductions'] += line.deductions
+    totals['gross'] += line.gross
+    totals['net_salary'] += line.net_salary
+
+
+def _comparison(entry):
+    """Totaux ``baseline`` / ``simulated`` et leur écart, montants en chaînes au centime"""
+    difference = {amount: entry['simulated'][amount] - entry['baseline'][amount] for amount in SIMULATION_AMOUNTS}
+    return {
+        'baseline': analytics.amounts_text(entry['baseline']),
+        'simulated': analytics.amounts_text(entry['simulated']),
+        'difference': analytics.amounts_text(difference),
+    }
+
+
+def simulate(organization, year, month, salary_increase=None, **overrides):
+    """
+    Paie du mois calculée en mémoire, sans écriture : une première fois avec les réglages en vigueur
+    (``baseline``), une seconde avec les taux ``overrides`` (cf. ``get_options``) et les salaires annuels
+    augmentés de ``salary_increase`` (``0.03`` = +3 %). Retourne les totaux et le détail par département ;
+    ValueError si un paramètre est invalide.
+    """
+    baseline_options = get_options()
+    options = get_options(**overrides) if overrides else baseline_options
+    if salary_increase is not None:
+        try:
+            salary_increase = Decimal(str(salary_increase))
+        except InvalidOperation:
+            raise ValueError("Augmentation invalide.")
+        if not salary_increase.is_finite() or salary_increase <= -1:
+            raise ValueError("L'augmentation doit être supérieure à -100 %.")
+        if salary_increase > MAX_SALARY_INCREASE:
+            raise ValueError(f"L'augmentation ne peut pas dépasser {MAX_SALARY_INCREASE * 100:.0f} %.")
+    
+    inputs = load_inputs(organization, year, month)
+    simulated_inputs = inputs
+    try:
+        if salary_increase:
+            simulated_inputs = [
+                item._replace(annual_salary=money(item.annual_salary * (1 + salary_increase))) for item in inputs
+            ]
+        baseline = compute_inputs(inputs, baseline_options)
+        simulated = compute_inputs(simulated_inputs, options)
+    except InvalidOperation:
+        raise ValueError("Montants simulés hors limites.")
+    
+    totals = {'baseline': _empty_totals(), 'simulated': _empty_totals()}
+    departments = defaultdict(lambda: {'baseline': _empty_totals(), 'simulated': _empty_totals()})
+    for key, lines in (('baseline', baseline), ('simulated', simulated)):
+        for line in lines:
+            _add_line(totals[key], line)
+            _add_line(departments[line.department_id][key], line)
+    
+    names = dict(Department.objects.filter(pk__in=[pk for pk in departments if pk is not None]).values_list('id', 'name'))
+    return {
+        'year': year,
+        'month': month,
+        'salary_increase': str(salary_increase) if salary_increase is not None else None,
+        'rates': {name: str(getattr(options, name)) for name in DEFAULT_RATES},
+        'totals': _comparison(totals),
+        'departments': sorted((
+            {
+                'id': department_id,
+                'name': names.get(department_id, "Sans département"),
+                **_comparison(entry),
+            }
+            for department_id, entry in departments.items()
+        ), key=lambda entry: (entry['id'] is None, entry['name'])),
+    }
@@ -0,0 +1,239 @@
+"""
+Bulletins de paie PDF.
+
+Une fois la fiche de paie traitée (``processed`` ou ``paid``), son bulletin est
+rendu en tâche de fond (reportlab) et enregistré comme ``Document`` de catégorie
+``payslip`` de l'employé, rattaché à la fiche (``Payroll.payslip``). Les lots
+(un mois entier) sont découpés en tranches rendues en parallèle par les
+workers Celery.
+
+Le gabarit d'une organisation (logo, cachet, en-tête) est préparé une fois par
+processus et réutilisé pour tous ses bulletins. Chaque rendu mémorise
+l'empreinte de ses données (``Payroll.payslip_hash``) : seules les fiches
+modifiées depuis (montants, détail, employé, organisation ou gabarit) sont
+rendues à nouveau. Le PDF est reproductible (``invariant``) : mêmes données,
+mêmes octets.
+"""
+import hashlib
+import io
+import json
+import logging
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from .models import Document, Payroll
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    canvas = None
+
+logger = logging.getLogger(__name__)
+
+
+# Incrémenter à chaque changement de mise en page : tous les bulletins seront rendus à nouveau
+TEMPLATE_VERSION = 1
+
+CHUNK_SIZE = 200
+
+RENDERED_STATUSES = (Payroll.STATUS_PROCESSED, Payroll.STATUS_PAID)
+
+MONTHS = [
+    'Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin',
+    'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre',
+]
+
+
+# ==================== GABARIT ====================
+
+class PayslipTemplate:
+    """En-tête et images d'une organisation, chargés une fois pour tous ses bulletins"""
+    
+    def __init__(self, organization):
+        self.name = organization.name
+        self.address = ', '.join(line.strip() for line in organization.address.splitlines() if line.strip())
+        self.siret = organization.siret
+        self.currency = organization.currency
+        self.logo = self._image(organization.logo)
+        self.stamp = self._image(organization.digital_stamp)
+    
+    @staticmethod
+    def _image(field):
+        if not field:
+            return None
+        try:
+            with field.open('rb') as image:
+                return ImageReader(io.BytesIO(image.read()))
+        except (OSError, ValueError):
+            logger.warning("Image illisible pour le bulletin : %s", field.name)
+            return None
+
+
+_templates = {}
+
+
+def get_template(organization):
+    """Gabarit en cache par processus, invalidé dès que l'organisation ou ses images changent"""
+    key = (organization.pk, organization.updated_at, organization.logo.name, organization.digital_stamp.name)
+    template = _templates.get(organization.pk)
+    if template is None or template[0] != key:
+        template = _templates[organization.pk] = (key, PayslipTemplate(organization))
+    return template[1]
+
+
+def fingerprint(payroll):
+    """Empreinte des données affichées sur le bulletin"""
+    organization, employee = payroll.organization, payroll.employee
+    data = [
+        TEMPLATE_VERSION,
+        payroll.year, payroll.month, payroll.status, str(payroll.payment_date),
+        str(payroll.base_salary), str(payroll.bonuses), str(payroll.deductions), str(payroll.net_salary),
+        payroll.breakdown,
+        employee.employee_id, employee.first_name, employee.last_name, employee.position,
+        organization.name, organization.address, organization.siret, organization.currency,
+        organization.logo.name, organization.digital_stamp.name,
+    ]
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# ==================== RENDU ====================
+
+def _amount(value, currency):
+    return f"{value:,.2f} {currency}".replace(',', ' ')
+
+
+def render(payroll, template):
+    """PDF (octets) du bulletin de ``payroll``"""
+    employee = payroll.employee
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    pdf.setTitle(f"Bulletin de paie {payroll.month:02d}/{payroll.year} - {employee.full_name}")
+    width, height = A4
+    left, right = 20 * mm, width - 20 * mm
+    y = height - 20 * mm
+    
+    if template.logo is not None:
+        pdf.drawImage(template.logo, left, y - 18 * mm, width=35 * mm, height=18 * mm,
+                      preserveAspectRatio=True, anchor='sw', mask='auto')
+    pdf.setFont('Helvetica-Bold', 14)
+    pdf.drawRightString(right, y - 6 * mm, template.name)
+    pdf.setFont('Helvetica', 9)
+    if template.address:
+        pdf.drawRightString(right, y - 11 * mm, template.address)
+    if template.siret:
+        pdf.drawRightString(right, y - 15 * mm, f"SIRET {template.siret}")
+    
+    y -= 32 * mm
+    pdf.setFont('Helvetica-Bold', 16)
+    pdf.drawString(left, y, f"Bulletin de paie — {MONTHS[payroll.month - 1]} {payroll.year}")
+    y -= 10 * mm
+    pdf.setFont('Helvetica', 10)
+    for line in (
+        f"{employee.full_name} ({employee.employee_id})",
+        employee.position,
+        f"Paiement le {payroll.payment_date:%d/%m/%Y}" if payroll.payment_date else "",
+    ):
+        if line:
+            pdf.drawString(left, y, line)
+            y -= 5 * mm
+    
+    y -= 6 * mm
+    pdf.setFont('Helvetica-Bold', 10)
+    pdf.drawString(left, y, "Élément")
+    pdf.drawString(left + 70 * mm, y, "Base")
+    pdf.drawRightString(right, y, "Montant")
+    y -= 2 * mm
+    pdf.setStrokeColor(colors.grey)
+    pdf.line(left, y, right, y)
+    y -= 5 * mm
+    pdf.setFont('Helvetica', 10)
+    for entry in payroll.breakdown or []:
+        sign = '-' if entry['kind'] == 'deduction' else ''
+        pdf.drawString(left, y, entry['label'])
+        pdf.drawString(left + 70 * mm, y, entry.get('basis', ''))
+        pdf.drawRightString(right, y, sign + _amount(float(entry['amount']), template.currency))
+        y -= 6 * mm
+    
+    y -= 2 * mm
+    pdf.line(left, y, right, y)
+    y -= 6 * mm
+    for label, value in (
+        ("Salaire de base", payroll.base_salary),
+        ("Primes", payroll.bonuses),
+        ("Retenues", -payroll.deductions),
+    ):
+        pdf.drawString(left, y, label)
+        pdf.drawRightString(right, y, _amount(value, template.currency))
+        y -= 6 * mm
+    pdf.setFont('Helvetica-Bold', 12)
+    pdf.drawString(left, y - 2 * mm, "Net à payer")
+    pdf.drawRightString(right, y - 2 * mm, _amount(payroll.net_salary, template.currency))
+    
+    if template.stamp is not None:
+        pdf.drawImage(template.stamp, right - 40 * mm, 25 * mm, width=40 * mm, height=25 * mm,
+                      preserveAspectRatio=True, anchor='se', mask='auto')
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _store(payroll, content, digest):
+    title = f"Bulletin de paie {payroll.month:02d}/{payroll.year}"
+    filename = f"payslip-{payroll.employee.employee_id}-{payroll.year}-{payroll.month:02d}.pdf"
+    document = payroll.payslip
+    old_name = document.file.name if document else None
+    if document is None:
+        document = Document(
+            organization=payroll.organization,
+            employee=payroll.employee,
+            category=Document.CATEGORY_PAYSLIP,
+        )
+    document.title = title
+    document.file.save(filename, ContentFile(content), save=False)
+    document.size = len(content)
+    document.sha256 = hashlib.sha256(content).hexdigest()
+    document.content_type = 'application/pdf'
+    try:
+        with transaction.atomic():
+            document.save()
+            Payroll.objects.filter(pk=payroll.pk).update(payslip=document, payslip_hash=digest)
+    except Exception:
+        # Le fichier est déjà dans le stockage : il ne doit pas y rester orphelin
+        if document.file.name != old_name:
+            document.file.storage.delete(document.file.name)
+        raise
+    if old_name and old_name != document.file.name:
+        document.file.storage.delete(old_name)
+
+
+# ==================== LOTS ====================
+
+def render_payrolls(payroll_ids, force=False):
+    """Rend les bulletins de ``payroll_ids`` dont l'empreinte a changé ; retourne le nombre de PDF écrits"""
+    payrolls = Payroll.objects.filter(
+        pk__in=payroll_ids, status__in=RENDERED_STATUSES
+    ).select_related('organization', 'employee', 'payslip').order_by('organization_id', 'pk')
+    rendered = 0
+    for payroll in payrolls:
+        digest = fingerprint(payroll)
+        if not force and payroll.payslip_id and payroll.payslip_hash == digest:
+            continue
+        try:
+            _store(payroll, render(payroll, get_template(payroll.organization)), digest)
+        except Exception:
+            # Une fiche en erreur ne bloque pas le reste de la tranche
+            logger.exception("Rendu du bulletin impossible pour la fiche %s", payroll.pk)
+            continue
+        rendered += 1
+    return rendered
+
+
+def chunks(payroll_ids, size=None):
+    size = size or CHUNK_SIZE
+    payroll_ids = list(payroll_ids)
+    return [payroll_ids[index:index + size] for index in range(0, len(payroll_ids), size)]
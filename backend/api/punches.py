@@ -0,0 +1,387 @@
+"""
+Pointage (arrivée / départ) en une seule requête.
+
+L'arrivée est un ``INSERT ... ON CONFLICT (employee_id, date) DO UPDATE``
+conditionnel : la ligne du jour est créée, ou complétée si elle n'a pas encore
+d'heure d'arrivée (journée marquée absente par exemple). Le départ est un
+``UPDATE`` de la dernière journée ouverte, avec calcul des heures en base à
+partir de la date et de l'heure d'arrivée : un départ après minuit clôt bien la
+journée de la veille. Les deux renvoient la ligne écrite (``RETURNING``), sans
+relecture, et deux pointages simultanés ne peuvent ni dupliquer la ligne ni
+s'écraser : le second ne trouve plus de ligne à modifier.
+
+Les moteurs sans ``RETURNING`` ni ``ON CONFLICT`` (MySQL...) passent par une
+transaction ``select_for_update``.
+
+Les badgeuses envoient leurs pointages par lots (``ingest_events``) : chaque
+événement est stocké tel quel dans ``PunchEvent`` (un doublon est ignoré),
+puis les journées touchées sont recalculées à partir de tous les pointages
+bruts de la période, quel que soit leur ordre d'arrivée, et écrites en un
+seul upsert. Ces écritures SQL ne passent pas par les signaux : les cumuls
+mensuels (api.rollups) sont mis à jour explicitement.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import Attendance, Employee, PunchEvent
+
+
+class PunchError(ValueError):
+    """Pointage refusé (déjà pointé, pas d'arrivée à clôturer...)"""
+
+
+def get_max_shift():
+    """Durée maximale d'une journée : au-delà, une arrivée non clôturée n'est plus reprise au départ"""
+    return datetime.timedelta(hours=getattr(settings, 'ATTENDANCE_MAX_SHIFT_HOURS', 16))
+
+
+def supports_upsert():
+    """Base capable d'``INSERT ... ON CONFLICT ... RETURNING`` (PostgreSQL, SQLite récent)"""
+    features = connection.features
+    return (
+        connection.vendor in ('postgresql', 'sqlite')
+        and features.can_return_columns_from_insert
+        and features.supports_update_conflicts_with_target
+    )
+
+
+def prep_value(field_name, value):
+    """Valeur Python convertie pour la colonne ``field_name`` de ``Attendance``, en paramètre SQL brut"""
+    return Attendance._meta.get_field(field_name).get_db_prep_value(value, connection)
+
+
+def _hours_sql(table):
+    """Heures écoulées entre ``date + check_in`` et l'instant ``%s`` (heure locale, sans fuseau)"""
+    if connection.vendor == 'postgresql':
+        return (
+            f"ROUND(CAST(EXTRACT(EPOCH FROM (CAST(%s AS timestamp) - ({table}.date + {table}.check_in))) / 3600 "
+            f"AS numeric), 2)"
+        )
+    return f"ROUND((julianday(%s) - julianday({table}.date || ' ' || {table}.check_in)) * 24, 2)"
+
+
+def _hours_between(start, end):
+    return (Decimal((end - start).total_seconds()) / 3600).quantize(Decimal('0.01'))
+
+
+# ==================== ARRIVÉE ====================
+
+def check_in(employee, at=None):
+    """Enregistre l'arrivée de ``employee`` et retourne la ligne ``Attendance`` du jour"""
+    now = timezone.localtime(at)
+    if not supports_upsert():
+        return _check_in_locked(employee, now)
+    
+    table = Attendance._meta.db_table
+    columns = ', '.join(field.column for field in Attendance._meta.concrete_fields)
+    # Sur conflit, RETURNING ne renvoie la ligne que si le WHERE du DO UPDATE l'a modifiée
+    sql = (
+        f"INSERT INTO {table} (organization_id, employee_id, date, check_in, status, hours_worked, notes, "
+        f"created_at, updated_at) VALUES (%s, %s, %s, %s, %s, %s, '', %s, %s) "
+        f"ON CONFLICT (employee_id, date) DO UPDATE SET "
+        f"check_in = excluded.check_in, updated_at = excluded.updated_at, "
+        f"status = CASE WHEN {table}.status = %s THEN excluded.status ELSE {table}.status END "
+        f"WHERE {table}.check_in IS NULL "
+        f"RETURNING {columns}"
+    )
+    params = [
+        employee.organization_id,
+        employee.pk,
+        prep_value('date', now.date()),
+        prep_value('check_in', now.time().replace(tzinfo=None)),
+        Attendance.STATUS_PRESENT,
+        prep_value('hours_worked', Decimal('0')),
+        prep_value('created_at', now),
+        prep_value('updated_at', now),
+        Attendance.STATUS_ABSENT,
+    ]
+    attendance = next(iter(Attendance.objects.raw(sql, params)), None)
+    if attendance is None:
+        raise PunchError("Déjà pointé aujourd'hui")
+    # Écriture SQL directe : pas de signal, le cumul du mois est mis à jour ici
+    rollups.refresh({(employee.pk, attendance.date)})
+    attendance.employee = employee
+    return attendance
+
+
+def _check_in_locked(employee, now):
+    try:
+        with transaction.atomic():
+            attendance, created = Attendance.objects.select_for_update().get_or_create(
+                employee=employee,
+                date=now.date(),
+                defaults={
+                    'organization_id': employee.organization_id,
+                    'check_in': now.time().replace(tzinfo=None),
+                    'status': Attendance.STATUS_PRESENT,
+                }
+            )
+            if not created:
+                if attendance.check_in:
+                    raise PunchError("Déjà pointé aujourd'hui")
+                attendance.check_in = now.time().replace(tzinfo=None)
+                if attendance.status == Attendance.STATUS_ABSENT:
+                    attendance.status = Attendance.STATUS_PRESENT
+                attendance.save(update_fields=['check_in', 'status', 'updated_at'])
+    except IntegrityError:
+        # Arrivée concurrente : la ligne du jour vient d'être créée
+        raise PunchError("Déjà pointé aujourd'hui")
+    attendance.employee = employee
+    return attendance
+
+
+# ==================== DÉPART ====================
+
+def _open_shift_window(now):
+    """``(date, heure)`` d'arrivée la plus ancienne encore clôturable à ``now``"""
+    cutoff = now - get_max_shift()
+    return cutoff.date(), cutoff.time().replace(tzinfo=None)
+
+
+def _check_out_error(employee, now):
+    """Message d'erreur d'un départ refusé (lecture sur le seul chemin d'échec)"""
+    cutoff_date, _ = _open_shift_window(now)
+    closed = Attendance.objects.filter(
+        employee=employee, date__gte=cutoff_date, date__lte=now.date(), check_out__isnull=False
+    ).exists()
+    if closed:
+        return PunchError("Déjà pointé au départ aujourd'hui")
+    return PunchError("Vous devez d'abord pointer à l'arrivée")
+
+
+def check_out(employee, at=None):
+    """Enregistre le départ de ``employee`` sur sa dernière journée ouverte et en calcule les heures"""
+    now = timezone.localtime(at)
+    if not supports_upsert():
+        return _check_out_locked(employee, now)
+    
+    table = Attendance._meta.db_table
+    columns = ', '.join(field.column for field in Attendance._meta.concrete_fields)
+    cutoff_date, cutoff_time = _open_shift_window(now)
+    # check_out IS NULL est revérifié sur la ligne elle-même : un départ concurrent ne passe qu'une fois
+    sql = (
+        f"UPDATE {table} SET check_out = %s, hours_worked = {_hours_sql(table)}, updated_at = %s "
+        f"WHERE check_out IS NULL AND id = ("
+        f"SELECT id FROM {table} WHERE employee_id = %s AND check_in IS NOT NULL AND check_out IS NULL "
+        f"AND date <= %s AND (date > %s OR (date = %s AND check_in >= %s)) "
+        f"ORDER BY date DESC LIMIT 1) "
+        f"RETURNING {columns}"
+    )
+    params = [
+        prep_value('check_out', now.time().replace(tzinfo=None)),
+        now.replace(tzinfo=None).isoformat(sep=' '),
+        prep_value('updated_at', now),
+        employee.pk,
+        prep_value('date', now.date()),
+        prep_value('date', cutoff_date),
+        prep_value('date', cutoff_date),
+        prep_value('check_in', cutoff_time),
+    ]
+    attendance = next(iter(Attendance.objects.raw(sql, params)), None)
+    if attendance is None:
+        raise _check_out_error(employee, now)
+    rollups.refresh({(employee.pk, attendance.date)})
+    attendance.employee = employee
+    return attendance
+
+
+def _check_out_locked(employee, now):
+    cutoff_date, cutoff_time = _open_shift_window(now)
+    with transaction.atomic():
+        attendance = Attendance.objects.select_for_update().filter(
+            employee=employee, check_in__isnull=False, check_out__isnull=True,
+            date__lte=now.date(), date__gte=cutoff_date
+        ).order_by('-date').first()
+        if attendance is None or (attendance.date == cutoff_date and attendance.check_in < cutoff_time):
+            raise _check_out_error(employee, now)
+        
+        attendance.check_out = now.time().replace(tzinfo=None)
+        started = timezone.make_aware(datetime.datetime.combine(attendance.date, attendance.check_in))
+        attendance.hours_worked = _hours_between(started, now)
+        attendance.save(update_fields=['check_out', 'hours_worked', 'updated_at'])
+    attendance.employee = employee
+    return attendance
+
+
+# ==================== BADGEUSES ====================
+
+MAX_BATCH_SIZE = 5000
+
+EVENT_CREATED = 'created'
+EVENT_DUPLICATE = 'duplicate'
+EVENT_REJECTED = 'rejected'
+
+
+def _shift_bounds(attendance):
+    """``(arrivée, départ)`` d'une ligne de présence en datetimes locaux (départ après minuit compris)"""
+    check_in = check_out = None
+    if attendance.check_in is not None:
+        check_in = timezone.make_aware(datetime.datetime.combine(attendance.date, attendance.check_in))
+    if attendance.check_out is not None:
+        check_out = timezone.make_aware(datetime.datetime.combine(attendance.date, attendance.check_out))
+        if check_in is not None and check_out < check_in:
+            check_out += datetime.timedelta(days=1)
+    return check_in, check_out
+
+
+def _group_shifts(rows, max_shift):
+    """
+    Regroupe par journée les pointages triés ``[(timestamp, direction), ...]`` d'un employé : une
+    sortie revient à la journée de la dernière entrée si elle la suit de moins de ``max_shift``.
+    Retourne ``({date: [première entrée, dernière sortie]}, [journée de chaque pointage])``.
+    """
+    shifts, days = {}, []
+    current = None
+    for timestamp, direction in rows:
+        local = timezone.localtime(timestamp)
+        if direction == PunchEvent.DIRECTION_IN:
+            day = local.date()
+            shift = shifts.setdefault(day, [None, None])
+            shift[0] = local if shift[0] is None else min(shift[0], local)
+            current = day, shift[0]
+        else:
+            day = current[0] if current and local - current[1] <= max_shift else local.date()
+            shift = shifts.setdefault(day, [None, None])
+            shift[1] = local if shift[1] is None else max(shift[1], local)
+        days.append(day)
+    return shifts, days
+
+
+def fold_events(organization, events):
+    """Recalcule les présences des journées touchées par ``events`` (PunchEvent) ; retourne le nombre de lignes écrites"""
+    if not events:
+        return 0
+    max_shift = get_max_shift()
+    employee_ids = {event.employee_id for event in events}
+    # Journées à recalculer : celles des pointages proches des nouveaux, qui ont pu changer de journée
+    inner = (
+        min(event.timestamp for event in events) - max_shift,
+        max(event.timestamp for event in events) + max_shift,
+    )
+    # Contexte de regroupement : l'entrée d'une sortie de la fenêtre peut la précéder de ``max_shift``
+    window = (inner[0] - max_shift, inner[1] + max_shift)
+    
+    rows_by_employee = defaultdict(list)
+    raw = PunchEvent.objects.filter(
+        employee_id__in=employee_ids, timestamp__range=window
+    ).order_by('employee_id', 'timestamp').values_list('employee_id', 'timestamp', 'direction')
+    for employee_id, timestamp, direction in raw:
+        rows_by_employee[employee_id].append((timestamp, direction))
+    
+    shifts, assigned, touched = {}, {}, set()
+    for employee_id, rows in rows_by_employee.items():
+        employee_shifts, days = _group_shifts(rows, max_shift)
+        shifts.update(((employee_id, day), bounds) for day, bounds in employee_shifts.items())
+        for (timestamp, direction), day in zip(rows, days):
+            assigned[employee_id, timestamp, direction] = day
+            if inner[0] <= timestamp <= inner[1]:
+                # Journée actuelle du pointage, et sa date locale : celle où il a pu être rangé seul
+                touched.add((employee_id, day))
+                touched.add((employee_id, timezone.localtime(timestamp).date()))
+    
+    existing = {
+        (attendance.employee_id, attendance.date): attendance
+        for attendance in Attendance.objects.filter(
+            employee_id__in={employee_id for employee_id, _ in touched},
+            date__range=(min(day for _, day in touched), max(day for _, day in touched))
+        )
+    }
+    attendances, emptied = [], []
+    for employee_id, day in touched:
+        first_in, last_out = shifts.get((employee_id, day), (None, None))
+        attendance = existing.get((employee_id, day))
+        if attendance is None and first_in is None and last_out is None:
+            continue
+        attendance = attendance or Attendance(organization_id=organization.pk, employee_id=employee_id, date=day)
+        # Une arrivée ou un départ saisi via l'application reste pris en compte ; une borne venue d'un
+        # pointage désormais rattaché à une autre journée est retirée
+        check_in, check_out = _shift_bounds(attendance)
+        if check_in and assigned.get((employee_id, check_in, PunchEvent.DIRECTION_IN), day) != day:
+            check_in = None
+        if check_out and assigned.get((employee_id, check_out, PunchEvent.DIRECTION_OUT), day) != day:
+            check_out = None
+        check_in = min(filter(None, (check_in, first_in)), default=None)
+        check_out = max(filter(None, (check_out, last_out)), default=None)
+        if check_in is None and check_out is None:
+            # Journée qui ne tenait qu'à des pointages partis ailleurs
+            if attendance.pk and attendance.status != Attendance.STATUS_ABSENT:
+                emptied.append(attendance.pk)
+            continue
+        
+        attendance.check_in = timezone.localtime(check_in).time().replace(tzinfo=None) if check_in else None
+        attendance.check_out = timezone.localtime(check_out).time().replace(tzinfo=None) if check_out else None
+        attendance.hours_worked = (
+            _hours_between(check_in, check_out) if check_in and check_out and check_out > check_in else Decimal('0')
+        )
+        if attendance.status == Attendance.STATUS_ABSENT:
+            attendance.status = Attendance.STATUS_PRESENT
+        attendances.append(attendance)
+    
+    if emptied:
+        Attendance.objects.filter(pk__in=emptied).delete()
+    Attendance.objects.bulk_create(
+        attendances,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['employee', 'date'],
+        update_fields=['check_in', 'check_out', 'status', 'hours_worked', 'updated_at'],
+    )
+    rollups.refresh(touched)
+    return len(attendances) + len(emptied)
+
+
+def ingest_events(organization, events):
+    """
+    Enregistre un lot d'événements validés ``[(index, {employee_id, timestamp, direction, device_id}), ...]``
+    (``employee_id`` = matricule) et met à jour les présences.
+    Retourne ``({index: (statut, erreurs)}, nombre de journées écrites)``.
+    """
+    numbers = {event['employee_id'] for _, event in events}
+    employee_ids = dict(
+        Employee.objects.filter(organization=organization, employee_id__in=numbers).values_list('employee_id', 'id')
+    )
+    
+    results, candidates = {}, {}
+    for index, event in events:
+        employee_id = employee_ids.get(event['employee_id'])
+        if employee_id is None:
+            results[index] = EVENT_REJECTED, {'employee_id': f"Matricule inconnu : {event['employee_id']}."}
+            continue
+        key = (employee_id, event['timestamp'], event['direction'])
+        if key in candidates:
+            results[index] = EVENT_DUPLICATE, None
+            continue
+        candidates[key] = index, PunchEvent(
+            organization=organization,
+            employee_id=employee_id,
+            timestamp=event['timestamp'],
+            direction=event['direction'],
+            device_id=event.get('device_id', ''),
+        )
+    if not candidates:
+        return results, 0
+    
+    with transaction.atomic():
+        # Deux lots concurrents pour les mêmes employés se succèdent au lieu de recalculer la même journée
+        list(Employee.objects.select_for_update().filter(pk__in={key[0] for key in candidates}).order_by('pk').values_list('pk'))
+        stored = set(PunchEvent.objects.filter(
+            employee_id__in={key[0] for key in candidates},
+            timestamp__range=(min(key[1] for key in candidates), max(key[1] for key in candidates))
+        ).values_list('employee_id', 'timestamp', 'direction'))
+        
+        new_events = []
+        for key, (index, event) in candidates.items():
+            if key in stored:
+                results[index] = EVENT_DUPLICATE, None
+            else:
+                results[index] = EVENT_CREATED, None
+                new_events.append(event)
+        PunchEvent.objects.bulk_create(new_events, batch_size=1000, ignore_conflicts=True)
+        days = fold_events(organization, new_events)
+    return results, days
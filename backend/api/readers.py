@@ -0,0 +1,231 @@
+"""
+Lecture rapide des listes volumineuses (présences, congés).
+
+Un ``ValuesReader`` produit les mêmes lignes que le serializer DRF associé mais
+directement depuis ``queryset.values()`` : ni instance de modèle, ni
+``get_attribute``, ni SerializerMethodField par ligne. Les convertisseurs sont
+compilés une fois par jeu de champs à partir des champs du serializer lui-même,
+d'où une sortie JSON identique octet pour octet (vérifiée par la commande
+``benchmark_list_serializers``).
+
+Un champ que le lecteur ne sait pas traduire (fichier, relation multiple,
+propriété sans ``read_<champ>``) renvoie la vue sur le serializer classique.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .fieldsets import serializer_field_names
+from .models import Employee
+from .serializers import AttendanceSerializer, LeaveRequestListSerializer
+
+
+# Champs dont la représentation DRF est la valeur brute lue en base
+_RAW_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.RelatedField)
+
+# Contexte d'un appel à rows() : le fuseau courant est résolu une fois, pas à chaque date
+ReadContext = namedtuple('ReadContext', ['request', 'timezone'])
+
+
+def reads(*keys):
+    """Déclare les clés ``values()`` lues par une méthode ``read_<champ>``"""
+    def decorator(method):
+        method.keys = keys
+        return method
+    return decorator
+
+
+def _is_iso(field, default):
+    output_format = getattr(field, 'format', default)
+    return isinstance(output_format, str) and output_format.lower() == ISO_8601
+
+
+def _converter(field):
+    """``fonction(valeur, contexte)`` équivalente à ``field.to_representation`` pour une valeur non nulle"""
+    field_type = type(field)
+    if field_type is serializers.DateField and _is_iso(field, api_settings.DATE_FORMAT):
+        return lambda value, context: value.isoformat()
+    if field_type is serializers.TimeField and _is_iso(field, api_settings.TIME_FORMAT):
+        return lambda value, context: value.isoformat()
+    if (field_type is serializers.DateTimeField and not hasattr(field, 'timezone')
+            and _is_iso(field, api_settings.DATETIME_FORMAT)):
+        to_representation = field.to_representation
+        
+        def convert(value, context):
+            if context.timezone is None or timezone.is_naive(value):
+                return to_representation(value)
+            value = value.astimezone(context.timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+    to_representation = field.to_representation
+    return lambda value, context: to_representation(value)
+
+
+def _is_column(model, path):
+    """``path`` désigne-t-il une colonne (éventuellement via des clés étrangères) ?"""
+    parts = path.split('__')
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return False
+        if field.many_to_many or not field.concrete:
+            return False
+        if index < len(parts) - 1:
+            if not field.is_relation:
+                return False
+            model = field.related_model
+    return True
+
+
+class ValuesReader:
+    """Construit les lignes d'un serializer de liste à partir de dictionnaires ``values()``"""
+    serializer_class = None
+    
+    def __init__(self, field_names):
+        serializer = self.serializer_class()
+        self.model = self.serializer_class.Meta.model
+        self.keys = []
+        self.mappers = []
+        self.supported = True
+        for name in field_names:
+            compiled = self._compile(name, serializer.fields[name])
+            if compiled is None:
+                self.supported = False
+                return
+            keys, mapper = compiled
+            self.keys.extend(key for key in keys if key not in self.keys)
+            self.mappers.append((name, mapper))
+    
+    @classmethod
+    @lru_cache(maxsize=None)
+    def for_fields(cls, field_names):
+        reader = cls(field_names)
+        return reader if reader.supported else None
+    
+    def _compile(self, name, field, prefix=''):
+        """``(clés, fonction(row, contexte))`` pour un champ, ou None s'il n'est pas traduisible"""
+        custom = getattr(self, f'read_{name}', None) if not prefix else None
+        if custom is not None:
+            return custom.keys, custom
+        
+        if isinstance(field, serializers.ListSerializer) or field.source == '*':
+            return None
+        path = prefix + '__'.join(field.source_attrs)
+        
+        if isinstance(field, serializers.BaseSerializer):
+            return self._compile_nested(field, path)
+        if isinstance(field, (serializers.FileField, serializers.ManyRelatedField)):
+            return None
+        if not _is_column(self.model, path):
+            return None
+        
+        if isinstance(field, _RAW_FIELDS):
+            def mapper(row, context, key=path):
+                return row[key]
+        else:
+            def mapper(row, context, key=path, convert=_converter(field)):
+                value = row[key]
+                return None if value is None else convert(value, context)
+        return (path,), mapper
+    
+    def _compile_nested(self, serializer, path):
+        prefix = path + '__'
+        pk_key = prefix + serializer.Meta.model._meta.pk.name
+        keys, mappers = [pk_key], []
+        for name, field in serializer.fields.items():
+            compiled = self._compile(name, field, prefix)
+            if compiled is None:
+                return None
+            keys.extend(compiled[0])
+            mappers.append((name, compiled[1]))
+        
+        def mapper(row, context):
+            if row[pk_key] is None:
+                return None
+            return {name: field_mapper(row, context) for name, field_mapper in mappers}
+        return keys, mapper
+    
+    def rows(self, values, request=None):
+        context = ReadContext(request, timezone.get_current_timezone() if settings.USE_TZ else None)
+        mappers = self.mappers
+        return [{name: mapper(row, context) for name, mapper in mappers} for row in values]
+
+
+def _photo_url(photo, request, storage=Employee._meta.get_field('profile_photo').storage):
+    if not photo:
+        return None
+    url = storage.url(photo)
+    return request.build_absolute_uri(url) if request else url
+
+
+# ==================== LECTEURS ====================
+
+class LeaveRequestListReader(ValuesReader):
+    serializer_class = LeaveRequestListSerializer
+    
+    @reads('employee__id', 'employee__first_name', 'employee__last_name', 'employee__employee_id', 'employee__profile_photo')
+    def read_employee_detail(self, row, context):
+        return {
+            'id': row['employee__id'],
+            'full_name': f"{row['employee__first_name']} {row['employee__last_name']}",
+            'employee_id': row['employee__employee_id'],
+            'profile_photo': _photo_url(row['employee__profile_photo'], context.request)
+        }
+    
+    @reads('approved_by__id', 'approved_by__first_name', 'approved_by__last_name')
+    def read_approved_by_detail(self, row, context):
+        if row['approved_by__id'] is None:
+            return None
+        return {
+            'id': row['approved_by__id'],
+            'full_name': f"{row['approved_by__first_name']} {row['approved_by__last_name']}"
+        }
+
+
+class AttendanceReader(ValuesReader):
+    serializer_class = AttendanceSerializer
+    
+    @reads('employee__id', 'employee__first_name', 'employee__last_name', 'employee__employee_id')
+    def read_employee_detail(self, row, context):
+        return {
+            'id': row['employee__id'],
+            'full_name': f"{row['employee__first_name']} {row['employee__last_name']}",
+            'employee_id': row['employee__employee_id']
+        }
+
+
+# ==================== VIEWSETS ====================
+
+class FastListMixin:
+    """
+    ViewSet : la liste passe par ``list_reader_class`` quand le serializer de la
+    liste et les champs demandés (``?fields``, ``?expand``) le permettent.
+    """
+    list_reader_class = None
+    
+    def get_list_reader(self):
+        reader_class = self.list_reader_class
+        serializer_class = self.get_serializer_class()
+        if reader_class is None or serializer_class is not reader_class.serializer_class:
+            return None
+        fields = self.get_sparse_fields(serializer_class)
+        return reader_class.for_fields(fields if fields is not None else serializer_field_names(serializer_class))
+    
+    def list(self, request, *args, **kwargs):
+        reader = self.get_list_reader()
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        values = queryset.prefetch_related(None).values(*reader.keys)
+        page = self.paginate_queryset(values)
+        if page is not None:
+            return self.get_paginated_response(reader.rows(page, request))
+        return Response(reader.rows(values, request))
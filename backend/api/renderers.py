@@ -0,0 +1,84 @@
+"""
+Rendu et lecture JSON de l'API via orjson, avec repli sur le module ``json``.
+
+orjson encode nativement ``date``, ``time``, ``datetime`` et ``UUID`` (et les
+sous-classes de ``dict``/``list`` : ReturnDict, ReturnList) en C ; les autres
+types (``Decimal``, chaînes paresseuses, QuerySet…) passent par l'encodeur DRF.
+La sortie reste celle de ``JSONRenderer`` : séparateurs compacts, UTF-8 non
+échappé, ``Z`` pour UTC, ``Decimal`` en nombre, U+2028/U+2029 échappés (seule différence : NaN et
+l'infini deviennent ``null`` au lieu de lever une erreur).
+
+Sans orjson, ou pour ce qu'orjson refuse (entiers de plus de 64 bits,
+sortie indentée, ``UNICODE_JSON``/``STRICT_JSON`` désactivés), on retombe sur
+les classes DRF.
+"""
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+
+# Séparateurs de lignes JavaScript : valides en JSON mais pas dans un <script>
+_JS_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj, _encoder=encoders.JSONEncoder()):
+    """Types inconnus d'orjson : même traduction que l'encodeur DRF"""
+    return _encoder.default(obj)
+
+
+def dumps(data):
+    """Sérialise ``data`` en octets comme ``JSONRenderer`` ; None si orjson ne sait pas le faire"""
+    if orjson is None:
+        return None
+    try:
+        content = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        return None
+    for separator, escaped in _JS_SEPARATORS:
+        if separator in content:
+            content = content.replace(separator, escaped)
+    return content
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """``JSONRenderer`` accéléré par orjson"""
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Sortie indentée (API navigable, Accept: ...; indent=4) ou réglages non standard : rendu DRF
+        content = None
+        if (self.encoder_class is encoders.JSONEncoder and self.compact and self.strict
+                and not self.ensure_ascii and self.get_indent(accepted_media_type, renderer_context or {}) is None):
+            content = dumps(data)
+        if content is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return content
+
+
+class FastJSONParser(parsers.JSONParser):
+    """``JSONParser`` accéléré par orjson"""
+    renderer_class = FastJSONRenderer
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        content = stream.read()
+        try:
+            if encoding.lower().replace('-', '') != 'utf8':
+                content = content.decode(encoding)
+            return orjson.loads(content)
+        except (UnicodeDecodeError, LookupError, orjson.JSONDecodeError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
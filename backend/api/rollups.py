@@ -0,0 +1,190 @@
+"""
+Cumuls mensuels des présences (AttendanceMonthlySummary).
+
+Une cellule (employé, mois) est recalculée dès qu'une présence du mois est
+écrite : création, modification ou suppression via l'ORM (signaux), pointage
+(api.punches) ou lot de badgeuse. Le recalcul agrège les 31 lignes au plus du
+mois sur l'index (employee, date) : il ne dérive pas, quel que soit l'ordre des
+écritures. Un rapport mensuel d'organisation devient une lecture de l'index
+(organization, month) ; ``rebuild`` reconstruit le tout.
+
+Les présences d'une année archivée (api.partitions) ne sont plus en table :
+les cellules de ces années sont recalculées à partir de l'archive complétée
+des lignes saisies depuis l'archivage.
+"""
+import calendar
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Attendance, AttendanceArchive, AttendanceMonthlySummary, Employee
+
+
+# Champs d'une présence dont la modification change les cumuls
+TRACKED_FIELDS = ('employee_id', 'date', 'status', 'hours_worked')
+
+SUMMARY_FIELDS = ('hours_worked', 'days_present', 'days_late', 'days_half_day', 'days_absent')
+
+AGGREGATES = {
+    'total_hours': Sum('hours_worked'),
+    'present': Count('id', filter=Q(status=Attendance.STATUS_PRESENT)),
+    'late': Count('id', filter=Q(status=Attendance.STATUS_LATE)),
+    'half_day': Count('id', filter=Q(status=Attendance.STATUS_HALF_DAY)),
+    'absent': Count('id', filter=Q(status=Attendance.STATUS_ABSENT)),
+}
+
+STATUS_FIELDS = {
+    Attendance.STATUS_PRESENT: 'days_present',
+    Attendance.STATUS_LATE: 'days_late',
+    Attendance.STATUS_HALF_DAY: 'days_half_day',
+    Attendance.STATUS_ABSENT: 'days_absent',
+}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _summaries(attendances):
+    """Cumuls (non enregistrés) des présences ``attendances`` groupées par employé et mois"""
+    rows = attendances.annotate(month=TruncMonth('date')).order_by().values(
+        'organization_id', 'employee_id', 'month'
+    ).annotate(**AGGREGATES)
+    for row in rows.iterator(chunk_size=2000):
+        yield AttendanceMonthlySummary(
+            organization_id=row['organization_id'],
+            employee_id=row['employee_id'],
+            month=row['month'],
+            hours_worked=row['total_hours'] or 0,
+            days_present=row['present'],
+            days_late=row['late'],
+            days_half_day=row['half_day'],
+            days_absent=row['absent'],
+        )
+
+
+def summaries_from_rows(organization_id, rows):
+    """Cumuls (non enregistrés) de lignes d'archive (dicts texte, cf. ``partitions.ARCHIVE_COLUMNS``)"""
+    summaries = {}
+    for row in rows:
+        employee_id, month = int(row['employee']), month_start(datetime.date.fromisoformat(row['date']))
+        summary = summaries.get((employee_id, month))
+        if summary is None:
+            summary = summaries[(employee_id, month)] = AttendanceMonthlySummary(
+                organization_id=organization_id, employee_id=employee_id, month=month, hours_worked=Decimal('0')
+            )
+        if row['hours_worked'] not in ('', 'None'):
+            summary.hours_worked += Decimal(row['hours_worked'])
+        field = STATUS_FIELDS.get(row['status'])
+        if field:
+            setattr(summary, field, getattr(summary, field) + 1)
+    return list(summaries.values())
+
+
+def _upsert(summaries):
+    AttendanceMonthlySummary.objects.bulk_create(
+        summaries,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['employee', 'month'],
+        update_fields=[*SUMMARY_FIELDS, 'updated_at'],
+    )
+
+
+def _save(cells, summaries):
+    summaries = [summary for summary in summaries if (summary.employee_id, summary.month) in cells]
+    if summaries:
+        _upsert(summaries)
+    # Mois vidés de leurs présences (suppression, changement de date ou d'employé)
+    emptied = cells - {(summary.employee_id, summary.month) for summary in summaries}
+    if emptied:
+        condition = Q()
+        for employee_id, month in emptied:
+            condition |= Q(employee_id=employee_id, month=month)
+        AttendanceMonthlySummary.objects.filter(condition).delete()
+
+
+def _archived_cells(cells):
+    """``{archive: cellules}`` des cellules d'années archivées (seules les années closes peuvent l'être)"""
+    current_year = timezone.localdate().year
+    closed = {(employee_id, month) for employee_id, month in cells if month.year < current_year}
+    if not closed:
+        return {}
+    organizations = dict(Employee.objects.filter(
+        pk__in={employee_id for employee_id, _ in closed}
+    ).values_list('pk', 'organization_id'))
+    archives = {
+        (archive.organization_id, archive.year): archive
+        for archive in AttendanceArchive.objects.filter(
+            organization_id__in=set(organizations.values()), year__in={month.year for _, month in closed}
+        )
+    }
+    archived = {}
+    for employee_id, month in closed:
+        archive = archives.get((organizations.get(employee_id), month.year))
+        if archive is not None:
+            archived.setdefault(archive, set()).add((employee_id, month))
+    return archived
+
+
+def refresh(cells):
+    """Recalcule les cellules ``{(employee_id, jour du mois), ...}`` : une lecture, une écriture"""
+    cells = {(employee_id, month_start(day)) for employee_id, day in cells}
+    if not cells:
+        return
+    
+    archived = _archived_cells(cells)
+    if archived:
+        from . import partitions
+        
+        for archive, archive_cells in archived.items():
+            rows = partitions.merged_rows(archive.organization_id, archive.year, archive, {pk for pk, _ in archive_cells})
+            _save(archive_cells, summaries_from_rows(archive.organization_id, rows))
+            cells -= archive_cells
+        if not cells:
+            return
+    
+    months = [month for _, month in cells]
+    attendances = Attendance.objects.filter(
+        employee_id__in={employee_id for employee_id, _ in cells},
+        date__range=(min(months), month_end(max(months)))
+    )
+    _save(cells, _summaries(attendances))
+
+
+def rebuild(organization=None, month=None):
+    """Reconstruit les cumuls (d'une organisation, d'un mois) ; retourne le nombre de cellules"""
+    attendances = Attendance.objects.all()
+    summaries = AttendanceMonthlySummary.objects.all()
+    if organization is not None:
+        attendances = attendances.filter(organization=organization)
+        summaries = summaries.filter(organization=organization)
+    if month is not None:
+        attendances = attendances.filter(date__range=(month_start(month), month_end(month)))
+        summaries = summaries.filter(month=month_start(month))
+    
+    # Les cumuls des années archivées (api.partitions) n'ont plus de présences en table : ils sont gardés
+    for organization_id, year in AttendanceArchive.objects.values_list('organization_id', 'year'):
+        summaries = summaries.exclude(organization_id=organization_id, month__year=year)
+        attendances = attendances.exclude(organization_id=organization_id, date__year=year)
+    
+    with transaction.atomic():
+        summaries.delete()
+        rows = list(_summaries(attendances))
+        AttendanceMonthlySummary.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def parse_month(value, default=None):
+    """``AAAA-MM`` → premier jour du mois ; ``default`` si vide, ValueError si invalide"""
+    if not value:
+        return default
+    return datetime.datetime.strptime(value, '%Y-%m').date()
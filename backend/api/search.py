@@ -0,0 +1,242 @@
+"""
+Recherche dans l'annuaire des employés.
+
+Chaque employé porte une colonne ``search_text`` (nom, prénom, e-mail,
+identifiant, poste) en minuscules et sans accents, recalculée à chaque
+sauvegarde. Elle est indexée selon le moteur de base de données :
+
+- PostgreSQL : colonne générée ``search_vector`` (tsvector) + index GIN, et
+  index trigramme (pg_trgm) pour les recherches partielles ;
+- SQLite : table virtuelle FTS5 synchronisée par triggers ;
+- autres : filtre ``LIKE`` sur la seule colonne normalisée.
+
+Les résultats sont triés par pertinence (annotation ``search_rank``).
+Le sélecteur d'employés (``lookup_employees``) s'appuie sur la même recherche
+et met en cache une projection compacte par organisation et préfixe.
+"""
+import re
+import unicodedata
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'employee_id', 'position')
+
+EMPLOYEE_TABLE = 'api_employee'
+FTS_TABLE = 'api_employee_fts'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Minuscules, sans accents (« Hélène » → « helene »), espaces compactés"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def build_search_text(employee):
+    return normalize(' '.join(str(getattr(employee, field) or '') for field in SEARCH_FIELDS))
+
+
+def tokenize(term):
+    return _TOKEN_RE.findall(normalize(term))
+
+
+# ==================== MISE EN PLACE DES INDEX ====================
+
+def _fts5_available(cursor):
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)")
+        cursor.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def setup_search_backend(conn=None):
+    """Crée (de façon idempotente) les structures d'indexation propres au moteur"""
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"ALTER TABLE {EMPLOYEE_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('simple', coalesce(search_text, ''))) STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS employee_search_vector_idx ON {EMPLOYEE_TABLE} USING gin (search_vector)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS employee_search_trgm_idx ON {EMPLOYEE_TABLE} "
+                f"USING gin (search_text gin_trgm_ops)"
+            )
+        elif conn.vendor == 'sqlite' and _fts5_available(cursor):
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"search_text, content='{EMPLOYEE_TABLE}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            # Les reconstructions de table de SQLite suppriment les triggers : on les recrée à chaque migrate
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {EMPLOYEE_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {EMPLOYEE_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {EMPLOYEE_TABLE} BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+                f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    conn._employee_fts_ready = None
+
+
+def setup_search_backend_after_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    setup_search_backend(connections[using])
+
+
+def _sqlite_fts_ready():
+    if getattr(connection, '_employee_fts_ready', None) is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            connection._employee_fts_ready = cursor.fetchone() is not None
+    return connection._employee_fts_ready
+
+
+# ==================== RECHERCHE ====================
+
+def _search_postgresql(queryset, tokens, needle):
+    tsquery = ' & '.join(f"{token}:*" for token in tokens)
+    table = EMPLOYEE_TABLE
+    condition = RawSQL(
+        f"({table}.search_vector @@ to_tsquery('simple', %s) OR {table}.search_text LIKE %s)",
+        [tsquery, f"%{needle}%"],
+        output_field=BooleanField()
+    )
+    rank = RawSQL(
+        f"ts_rank({table}.search_vector, to_tsquery('simple', %s)) + similarity({table}.search_text, %s)",
+        [tsquery, needle],
+        output_field=FloatField()
+    )
+    return queryset.filter(condition).annotate(search_rank=rank)
+
+
+def _search_sqlite_fts(queryset, tokens):
+    match = ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+    condition = RawSQL(
+        f"{EMPLOYEE_TABLE}.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)",
+        [match],
+        output_field=BooleanField()
+    )
+    # rank FTS5 (bm25) est négatif : plus petit = plus pertinent
+    rank = RawSQL(
+        f"(SELECT -rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {EMPLOYEE_TABLE}.id)",
+        [match],
+        output_field=FloatField()
+    )
+    return queryset.filter(condition).annotate(search_rank=rank)
+
+
+def search_employees(queryset, term):
+    """Filtre et annote ``queryset`` (Employee) avec ``search_rank``"""
+    tokens = tokenize(term)
+    if not tokens:
+        return queryset
+    
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(queryset, tokens, ' '.join(tokens))
+    if connection.vendor == 'sqlite' and _sqlite_fts_ready():
+        return _search_sqlite_fts(queryset, tokens)
+    
+    for token in tokens:
+        queryset = queryset.filter(search_text__contains=token)
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class EmployeeSearchFilter(filters.SearchFilter):
+    """Remplace le OR de ``icontains`` de SearchFilter par la recherche indexée"""
+    
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        if not term.strip():
+            return queryset
+        return search_employees(queryset, term)
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    """Sans ?ordering explicite, une recherche est triée par pertinence"""
+    
+    def get_default_ordering(self, view):
+        ordering = super().get_default_ordering(view) or []
+        if tokenize(view.request.query_params.get(filters.SearchFilter.search_param, '')):
+            return ['-search_rank', *ordering]
+        return ordering
+
+
+# ==================== SÉLECTEUR (TYPEAHEAD) ====================
+
+LOOKUP_LIMIT = 20
+LOOKUP_CACHE_TIMEOUT = 300
+LOOKUP_CACHE_KEY = 'employee_lookup:{organization_id}:{version}:{prefix}'
+LOOKUP_VERSION_KEY = 'employee_lookup:version:{organization_id}'
+
+# Champs dont la modification invalide les résultats en cache
+LOOKUP_FIELDS = SEARCH_FIELDS + ('profile_photo', 'is_active')
+
+
+def _lookup_version(organization_id):
+    return cache.get_or_set(LOOKUP_VERSION_KEY.format(organization_id=organization_id), 1, None)
+
+
+def invalidate_lookup(organization_id):
+    """Les préfixes en cache sont innombrables : on change de version plutôt que de les supprimer"""
+    key = LOOKUP_VERSION_KEY.format(organization_id=organization_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def lookup_employees(organization_id, term):
+    """
+    Au plus ``LOOKUP_LIMIT`` employés actifs correspondant au préfixe ``term`` :
+    ``[{id, full_name, employee_id, photo_thumb}, ...]``
+    """
+    from .models import Employee  # models importe ce module
+    
+    prefix = ' '.join(tokenize(term))
+    key = LOOKUP_CACHE_KEY.format(
+        organization_id=organization_id,
+        version=_lookup_version(organization_id),
+        prefix=prefix
+    )
+    results = cache.get(key)
+    if results is None:
+        queryset = search_employees(
+            Employee.objects.filter(organization_id=organization_id, is_active=True),
+            prefix
+        )
+        ordering = ['-search_rank', 'last_name', 'first_name'] if prefix else ['last_name', 'first_name']
+        rows = queryset.order_by(*ordering).values_list(
+            'id', 'first_name', 'last_name', 'employee_id', 'profile_photo'
+        )[:LOOKUP_LIMIT]
+        results = [
+            {
+                'id': employee_id,
+                'full_name': f"{first_name} {last_name}",
+                'employee_id': number,
+                'photo_thumb': default_storage.url(photo) if photo else None,
+            }
+            for employee_id, first_name, last_name, number, photo in rows
+        ]
+        cache.set(key, results, LOOKUP_CACHE_TIMEOUT)
+    return results
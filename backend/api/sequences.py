@@ -0,0 +1,80 @@
+"""
+Allocation des identifiants employés (EMP-{année}-{numéro:04d}).
+
+Le numéro provient d'un compteur par organisation (EmployeeIdSequence),
+verrouillé avec ``select_for_update`` : pas de COUNT(*) à chaque embauche, pas
+de doublon entre embauches concurrentes ni après une suppression. Les imports
+en masse réservent un bloc de numéros en une seule écriture.
+"""
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Employee, EmployeeIdSequence
+
+
+def get_id_format():
+    return getattr(settings, 'EMPLOYEE_ID_FORMAT', 'EMP-{year}-{number:04d}')
+
+
+_SUFFIX_RE = re.compile(r'(\d+)$')
+
+
+def _seed_value(organization):
+    """Plus grand numéro déjà attribué dans l'organisation (une seule fois, à la création du compteur)"""
+    highest = 0
+    ids = Employee.objects.filter(organization=organization).values_list('employee_id', flat=True)
+    for employee_id in ids.iterator():
+        match = _SUFFIX_RE.search(employee_id or '')
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest
+
+
+def _locked_sequence(organization):
+    sequence = EmployeeIdSequence.objects.select_for_update().filter(organization=organization).first()
+    if sequence is not None:
+        return sequence
+    try:
+        with transaction.atomic():
+            EmployeeIdSequence.objects.create(organization=organization, last_value=_seed_value(organization))
+    except IntegrityError:
+        # Créé en parallèle par une autre transaction
+        pass
+    return EmployeeIdSequence.objects.select_for_update().get(organization=organization)
+
+
+@transaction.atomic
+def reserve_numbers(organization, count=1):
+    """Réserve ``count`` numéros consécutifs et retourne le ``range`` correspondant"""
+    sequence = _locked_sequence(organization)
+    start = sequence.last_value + 1
+    sequence.last_value += count
+    sequence.save(update_fields=['last_value', 'updated_at'])
+    return range(start, start + count)
+
+
+@transaction.atomic
+def allocate_employee_ids(organization, count=1, year=None):
+    """
+    Retourne ``count`` identifiants libres. Les identifiants étant uniques
+    toutes organisations confondues, ceux déjà pris ailleurs sont sautés.
+    """
+    year = year or timezone.now().year
+    id_format = get_id_format()
+    allocated = []
+    while len(allocated) < count:
+        missing = count - len(allocated)
+        candidates = [
+            id_format.format(year=year, number=number, org=organization.slug)
+            for number in reserve_numbers(organization, missing)
+        ]
+        taken = set(Employee.objects.filter(employee_id__in=candidates).values_list('employee_id', flat=True))
+        allocated += [candidate for candidate in candidates if candidate not in taken]
+    return allocated
+
+
+def allocate_employee_id(organization, year=None):
+    return allocate_employee_ids(organization, 1, year=year)[0]
@@ -3,10 +3,12 @@ from django.contrib.auth.models import User
 from .models import (
     Organization, OrganizationMember,
     Department, Employee,
-    LeaveType, LeaveRequest,
-    Attendance, Document, Payroll,
+    LeaveType, LeaveRequest, LeaveApproval,
+    Attendance, AttendanceMonthlySummary, PunchEvent, Document, Payroll,
     Project, Event, Notification
 )
+from . import hierarchy, payments
+from .fieldsets import SparseFieldsSerializerMixin
 
 
 # ==================== USER & AUTH ====================
@@ -58,9 +60,25 @@ class UserProfileSerializer(serializers.ModelSerializer):
         } for m in memberships]
 
 
+class BankDetailsSerializerMixin:
+    """IBAN (clé de contrôle) et BIC des virements de salaires, enregistrés normalisés"""
+    
+    def validate_iban(self, value):
+        iban = payments.normalize_iban(value)
+        if iban and not payments.is_valid_iban(iban):
+            raise serializers.ValidationError("IBAN invalide.")
+        return iban
+    
+    def validate_bic(self, value):
+        bic = value.strip().upper()
+        if bic and not payments.is_valid_bic(bic):
+            raise serializers.ValidationError("BIC invalide.")
+        return bic
+
+
 # ==================== ORGANIZATION ====================
 
-class OrganizationSerializer(serializers.ModelSerializer):
+class OrganizationSerializer(BankDetailsSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     employee_count = serializers.SerializerMethodField()
     
     class Meta:
@@ -68,17 +86,18 @@ class OrganizationSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'slug', 'description', 'logo', 'digital_stamp',
             'primary_color', 'plan', 'max_employees', 'employee_count',
-            'email', 'phone', 'address', 'website', 'siret',
+            'email', 'phone', 'address', 'website', 'siret', 'iban', 'bic',
             'timezone', 'date_format', 'currency',
             'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'employee_count']
+        field_dependencies = {'employee_count': []}
     
     def get_employee_count(self, obj):
         return obj.employees.filter(is_active=True).count()
 
 
-class OrganizationMemberSerializer(serializers.ModelSerializer):
+class OrganizationMemberSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     user_detail = UserSerializer(source='user', read_only=True)
     organization_detail = OrganizationSerializer(source='organization', read_only=True)
     
@@ -90,11 +109,12 @@ class OrganizationMemberSerializer(serializers.ModelSerializer):
             'is_active', 'joined_at'
         ]
         read_only_fields = ['id', 'joined_at']
+        expandable_fields = {'user': 'user_detail', 'organization': 'organization_detail'}
 
 
 # ==================== DEPARTMENT ====================
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     manager_detail = serializers.SerializerMethodField()
     employee_count = serializers.SerializerMethodField()
     parent_detail = serializers.SerializerMethodField()
@@ -107,6 +127,11 @@ class DepartmentSerializer(serializers.ModelSerializer):
             'employee_count', 'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        field_dependencies = {
+            'manager_detail': ['manager__first_name', 'manager__last_name', 'manager__employee_id'],
+            'employee_count': [],
+            'parent_detail': ['parent__name'],
+        }
     
     def get_manager_detail(self, obj):
         if obj.manager:
@@ -127,11 +152,18 @@ class DepartmentSerializer(serializers.ModelSerializer):
                 'name': obj.parent.name
             }
         return None
+    
+    def validate_parent(self, value):
+        if value and self.instance:
+            subtree = {pk for pk, _ in hierarchy.department_descendants(self.instance)}
+            if value.pk in subtree:
+                raise serializers.ValidationError("Un département ne peut pas être rattaché à l'un de ses sous-départements.")
+        return value
 
 
 # ==================== EMPLOYEE ====================
 
-class EmployeeListSerializer(serializers.ModelSerializer):
+class EmployeeListSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Serializer léger pour les listes"""
     department_detail = serializers.SerializerMethodField()
     manager_detail = serializers.SerializerMethodField()
@@ -145,14 +177,19 @@ class EmployeeListSerializer(serializers.ModelSerializer):
             'department', 'department_detail', 'manager', 'manager_detail',
             'hire_date', 'status', 'profile_photo', 'role'
         ]
+        field_dependencies = {
+            'full_name': ['first_name', 'last_name'],
+            'department_detail': ['department__name'],
+            'manager_detail': ['manager__first_name', 'manager__last_name'],
+            'role': ['organization_id', 'user__organization_memberships'],
+        }
     
     def get_role(self, obj):
         if obj.user:
-            membership = obj.user.organization_memberships.filter(
-                organization=obj.organization,
-                is_active=True
-            ).first()
-            return membership.role if membership else 'employee'
+            # .all() : profite du prefetch planifié par la vue (cf. api/fieldsets.py)
+            for membership in obj.user.organization_memberships.all():
+                if membership.organization_id == obj.organization_id and membership.is_active:
+                    return membership.role
         return 'employee'
     
     def get_department_detail(self, obj):
@@ -172,7 +209,7 @@ class EmployeeListSerializer(serializers.ModelSerializer):
         return None
 
 
-class EmployeeDetailSerializer(serializers.ModelSerializer):
+class EmployeeDetailSerializer(BankDetailsSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Serializer complet pour les détails"""
     department_detail = DepartmentSerializer(source='department', read_only=True)
     manager_detail = EmployeeListSerializer(source='manager', read_only=True)
@@ -191,29 +228,43 @@ class EmployeeDetailSerializer(serializers.ModelSerializer):
             'position', 'employment_type', 'hire_date', 'termination_date',
             'department', 'department_detail', 'manager', 'manager_detail',
             'subordinates_count',
-            'salary', 'salary_currency',
+            'salary', 'salary_currency', 'iban', 'bic',
             'profile_photo', 'resume',
             'annual_leave_days', 'sick_leave_days',
             'status', 'role', 'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'employee_id', 'full_name', 'created_at', 'updated_at']
+        expandable_fields = {
+            'department': 'department_detail',
+            'manager': 'manager_detail',
+            'user': 'user_detail',
+        }
+        field_dependencies = {
+            'full_name': ['first_name', 'last_name'],
+            'subordinates_count': [],
+            'role': ['organization_id', 'user__organization_memberships'],
+        }
 
     def get_role(self, obj):
         if obj.user:
-            membership = obj.user.organization_memberships.filter(
-                organization=obj.organization,
-                is_active=True
-            ).first()
-            return membership.role if membership else 'employee'
+            # .all() : profite du prefetch planifié par la vue (cf. api/fieldsets.py)
+            for membership in obj.user.organization_memberships.all():
+                if membership.organization_id == obj.organization_id and membership.is_active:
+                    return membership.role
         return 'employee'
     
     def get_subordinates_count(self, obj):
         return obj.subordinates.filter(is_active=True).count()
+    
+    def validate_manager(self, value):
+        if value and self.instance and hierarchy.is_in_subtree(self.instance.pk, value.pk):
+            raise serializers.ValidationError("Ce manager fait partie des subordonnés de l'employé.")
+        return value
 
 
 # ==================== LEAVE ====================
 
-class LeaveTypeSerializer(serializers.ModelSerializer):
+class LeaveTypeSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = LeaveType
         fields = [
@@ -224,7 +275,7 @@ class LeaveTypeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class LeaveRequestListSerializer(serializers.ModelSerializer):
+class LeaveRequestListSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Serializer pour les listes de congés"""
     employee_detail = serializers.SerializerMethodField()
     leave_type_detail = LeaveTypeSerializer(source='leave_type', read_only=True)
@@ -240,6 +291,11 @@ class LeaveRequestListSerializer(serializers.ModelSerializer):
             'rejection_reason', 'created_at'
         ]
         read_only_fields = ['id', 'total_days', 'created_at']
+        expandable_fields = {'leave_type': 'leave_type_detail'}
+        field_dependencies = {
+            'employee_detail': ['employee__first_name', 'employee__last_name', 'employee__employee_id', 'employee__profile_photo'],
+            'approved_by_detail': ['approved_by__first_name', 'approved_by__last_name'],
+        }
         extra_kwargs = {
             'employee': {'required': False},
             'organization': {'required': False}
@@ -262,11 +318,22 @@ class LeaveRequestListSerializer(serializers.ModelSerializer):
         return None
 
 
-class LeaveRequestDetailSerializer(serializers.ModelSerializer):
+class LeaveApprovalSerializer(serializers.ModelSerializer):
+    approver_name = serializers.CharField(source='approver.full_name', read_only=True)
+    
+    class Meta:
+        model = LeaveApproval
+        fields = ['id', 'approver', 'approver_name', 'level', 'status', 'decided_at']
+        read_only_fields = fields
+        field_dependencies = {'approver_name': ['approver__first_name', 'approver__last_name']}
+
+
+class LeaveRequestDetailSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Serializer complet pour les détails"""
     employee_detail = EmployeeListSerializer(source='employee', read_only=True)
     leave_type_detail = LeaveTypeSerializer(source='leave_type', read_only=True)
     approved_by_detail = serializers.SerializerMethodField()
+    approvals = LeaveApprovalSerializer(many=True, read_only=True)
     
     class Meta:
         model = LeaveRequest
@@ -276,10 +343,18 @@ class LeaveRequestDetailSerializer(serializers.ModelSerializer):
             'start_date', 'end_date', 'total_days',
             'reason', 'attachment',
             'status', 'approved_by', 'approved_by_detail',
-            'approved_at', 'rejection_reason',
+            'approved_at', 'rejection_reason', 'approvals',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'total_days', 'created_at', 'updated_at']
+        expandable_fields = {
+            'employee': 'employee_detail',
+            'leave_type': 'leave_type_detail',
+            'approvals': 'approvals',
+        }
+        field_dependencies = {
+            'approved_by_detail': ['approved_by__first_name', 'approved_by__last_name'],
+        }
         extra_kwargs = {
             'employee': {'required': False},
             'organization': {'required': False}
@@ -305,7 +380,7 @@ class LeaveRequestDetailSerializer(serializers.ModelSerializer):
 
 # ==================== ATTENDANCE ====================
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     employee_detail = serializers.SerializerMethodField()
     
     class Meta:
@@ -317,6 +392,9 @@ class AttendanceSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        field_dependencies = {
+            'employee_detail': ['employee__first_name', 'employee__last_name', 'employee__employee_id'],
+        }
     
     def get_employee_detail(self, obj):
         return {
@@ -326,37 +404,64 @@ class AttendanceSerializer(serializers.ModelSerializer):
         }
 
 
+class AttendanceMonthlySummarySerializer(serializers.ModelSerializer):
+    employee_detail = serializers.SerializerMethodField()
+    month = serializers.DateField(format='%Y-%m')
+    
+    class Meta:
+        model = AttendanceMonthlySummary
+        fields = [
+            'employee', 'employee_detail', 'month', 'hours_worked',
+            'days_present', 'days_late', 'days_half_day', 'days_absent'
+        ]
+    
+    def get_employee_detail(self, obj):
+        return {
+            'id': obj.employee.id,
+            'full_name': obj.employee.full_name,
+            'employee_id': obj.employee.employee_id
+        }
+
+
+class PunchEventInputSerializer(serializers.Serializer):
+    """Pointage reçu d'une badgeuse (``employee_id`` = matricule)"""
+    employee_id = serializers.CharField(max_length=50)
+    timestamp = serializers.DateTimeField()
+    direction = serializers.ChoiceField(choices=PunchEvent.DIRECTION_CHOICES)
+    device_id = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+
+
 # ==================== DOCUMENT ====================
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     employee_detail = serializers.SerializerMethodField()
     uploaded_by_detail = UserSerializer(source='uploaded_by', read_only=True)
-    file_size = serializers.SerializerMethodField()
+    # Colonne relevée à l'enregistrement (Document.size) : aucun appel au stockage
+    file_size = serializers.IntegerField(source='size', read_only=True)
     
     class Meta:
         model = Document
         fields = [
             'id', 'organization', 'employee', 'employee_detail',
-            'title', 'category', 'file', 'file_size', 'description',
+            'title', 'category', 'file', 'file_size', 'content_type', 'sha256', 'description',
             'uploaded_by', 'uploaded_by_detail', 'uploaded_at'
         ]
-        read_only_fields = ['id', 'uploaded_at']
+        read_only_fields = ['id', 'content_type', 'sha256', 'uploaded_at']
+        expandable_fields = {'uploaded_by': 'uploaded_by_detail'}
+        field_dependencies = {
+            'employee_detail': ['employee__first_name', 'employee__last_name'],
+        }
     
     def get_employee_detail(self, obj):
         return {
             'id': obj.employee.id,
             'full_name': obj.employee.full_name
         }
-    
-    def get_file_size(self, obj):
-        if obj.file:
-            return obj.file.size
-        return 0
 
 
 # ==================== PAYROLL ====================
 
-class PayrollSerializer(serializers.ModelSerializer):
+class PayrollSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     employee_detail = EmployeeListSerializer(source='employee', read_only=True)
     
     class Meta:
@@ -364,16 +469,17 @@ class PayrollSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'organization', 'employee', 'employee_detail',
             'month', 'year',
-            'base_salary', 'bonuses', 'deductions', 'net_salary',
-            'status', 'payment_date', 'notes',
+            'base_salary', 'bonuses', 'deductions', 'gross_salary', 'net_salary', 'breakdown',
+            'status', 'payment_date', 'notes', 'payslip',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'breakdown', 'payslip', 'created_at', 'updated_at']
+        expandable_fields = {'employee': 'employee_detail'}
 
 
 # ==================== WIDGETS ====================
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     attendee_details = serializers.SerializerMethodField()
     
@@ -386,6 +492,11 @@ class EventSerializer(serializers.ModelSerializer):
             'attendees', 'attendee_details', 'created_at'
         ]
         read_only_fields = ['id', 'created_by', 'created_at']
+        expandable_fields = {'attendees': 'attendee_details'}
+        field_dependencies = {
+            'created_by_name': ['created_by__first_name', 'created_by__last_name'],
+            'attendee_details': ['attendees'],
+        }
 
     def get_attendee_details(self, obj):
         return [
@@ -398,7 +509,7 @@ class EventSerializer(serializers.ModelSerializer):
         ]
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     sender_name = serializers.CharField(source='sender.get_full_name', read_only=True)
     
     class Meta:
@@ -408,8 +519,11 @@ class NotificationSerializer(serializers.ModelSerializer):
             'title', 'message', 'link', 'is_read', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        field_dependencies = {
+            'sender_name': ['sender__first_name', 'sender__last_name'],
+        }
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Project
         fields = [
@@ -1,21 +1,92 @@
-from django.db.models.signals import post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import LeaveRequest, Payroll, Document, Notification, Employee
+from .models import LeaveRequest, LeaveApproval, Payroll, Document, Notification, Employee, Department, Attendance
+from . import analytics, approvals, hierarchy, payslips, rollups, search
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+
+def _field_state(instance, fields):
+    # __dict__ pour ne pas déclencher de requête sur les champs différés (.only/.defer)
+    return tuple(str(instance.__dict__.get(field, _UNSET)) for field in fields)
+
+@receiver(post_init, sender=Employee)
+def employee_remember_manager(sender, instance, **kwargs):
+    instance._loaded_manager_id = instance.__dict__.get('manager_id', _UNSET)
+    instance._loaded_org_chart_state = _field_state(instance, hierarchy.ORG_CHART_FIELDS)
+    instance._loaded_lookup_state = _field_state(instance, search.LOOKUP_FIELDS)
+
+@receiver(post_save, sender=Employee)
+def employee_hierarchy_update(sender, instance, created, **kwargs):
+    if created or instance._loaded_manager_id != instance.manager_id:
+        hierarchy.move_subtree(instance.pk, instance.manager_id)
+    instance._loaded_manager_id = instance.manager_id
+    
+    state = _field_state(instance, hierarchy.ORG_CHART_FIELDS)
+    if created or state != instance._loaded_org_chart_state:
+        hierarchy.invalidate_org_chart(instance.organization_id)
+    instance._loaded_org_chart_state = state
+    
+    lookup_state = _field_state(instance, search.LOOKUP_FIELDS)
+    if created or lookup_state != instance._loaded_lookup_state:
+        search.invalidate_lookup(instance.organization_id)
+    instance._loaded_lookup_state = lookup_state
+
+@receiver(pre_delete, sender=Employee)
+def employee_hierarchy_detach(sender, instance, **kwargs):
+    # Les subordonnés passent à manager=NULL (SET_NULL, sans signal) : on détache leurs sous-arbres
+    for subordinate_id in instance.subordinates.values_list('id', flat=True):
+        hierarchy.detach_subtree(subordinate_id)
+    hierarchy.invalidate_org_chart(instance.organization_id)
+    search.invalidate_lookup(instance.organization_id)
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def department_tree_invalidate(sender, instance, **kwargs):
+    hierarchy.invalidate_department_tree(instance.organization_id)
+
+@receiver(post_init, sender=Attendance)
+def attendance_remember_rollup(sender, instance, **kwargs):
+    instance._loaded_rollup_cell = (instance.__dict__.get('employee_id'), instance.__dict__.get('date'))
+    instance._loaded_rollup_state = _field_state(instance, rollups.TRACKED_FIELDS)
+
+@receiver(post_save, sender=Attendance)
+def attendance_rollup_update(sender, instance, created, **kwargs):
+    state = _field_state(instance, rollups.TRACKED_FIELDS)
+    if created or state != instance._loaded_rollup_state:
+        cells = {(instance.employee_id, instance.date)}
+        if not created and None not in instance._loaded_rollup_cell:
+            # Changement de date ou d'employé : l'ancienne cellule est aussi recalculée
+            cells.add(instance._loaded_rollup_cell)
+        rollups.refresh(cells)
+    instance._loaded_rollup_cell = (instance.employee_id, instance.date)
+    instance._loaded_rollup_state = state
+
+@receiver(post_delete, sender=Attendance)
+def attendance_rollup_delete(sender, instance, origin=None, **kwargs):
+    # Cascade depuis un employé ou une organisation : leurs cumuls sont supprimés avec eux
+    if isinstance(origin, Attendance) or getattr(origin, 'model', None) is Attendance:
+        rollups.refresh({(instance.employee_id, instance.date)})
 
 @receiver(post_save, sender=LeaveRequest)
 def leave_request_notification(sender, instance, created, **kwargs):
     if created:
-        # Notification pour le manager
-        manager = instance.employee.manager
-        if manager and manager.user:
-            Notification.objects.create(
-                recipient=manager.user,
-                sender=instance.employee.user,
-                type=Notification.TYPE_LEAVE,
-                title="Nouvelle demande de congé",
-                message=f"{instance.employee.full_name} a soumis une demande de congé ({instance.leave_type.name}).",
-                link="/leaves"
-            )
+        # Matérialiser le circuit d'approbation puis notifier le premier niveau
+        steps = approvals.assign_approvers(instance)
+        for step in steps:
+            if step.status == LeaveApproval.STATUS_PENDING and step.approver.user:
+                Notification.objects.create(
+                    recipient=step.approver.user,
+                    sender=instance.employee.user,
+                    type=Notification.TYPE_LEAVE,
+                    title="Nouvelle demande de congé",
+                    message=f"{instance.employee.full_name} a soumis une demande de congé ({instance.leave_type.name}).",
+                    link="/leaves"
+                )
     else:
         # Notification pour l'employé (approbation/rejet)
         if instance.status in [LeaveRequest.STATUS_APPROVED, LeaveRequest.STATUS_REJECTED]:
@@ -29,6 +100,14 @@ def leave_request_notification(sender, instance, created, **kwargs):
                 link="/leaves"
             )
 
+@receiver(pre_delete, sender=LeaveRequest)
+def leave_request_inbox_cleanup(sender, instance, **kwargs):
+    # Les étapes partent en cascade : on invalide les compteurs des approbateurs concernés
+    approver_ids = instance.approvals.filter(
+        status=LeaveApproval.STATUS_PENDING
+    ).values_list('approver_id', flat=True)
+    approvals.invalidate_pending_count(*approver_ids)
+
 @receiver(post_save, sender=Payroll)
 def payroll_notification(sender, instance, created, **kwargs):
     if created:
@@ -40,9 +119,31 @@ def payroll_notification(sender, instance, created, **kwargs):
             link="/payroll"
         )
 
+@receiver(post_save, sender=Payroll)
+@receiver(post_delete, sender=Payroll)
+def payroll_summary_invalidate(sender, instance, **kwargs):
+    analytics.invalidate_payroll_summary(instance.organization_id, instance.year, instance.month)
+
+@receiver(post_save, sender=Payroll)
+def payroll_render_payslip(sender, instance, **kwargs):
+    # Fiche traitée ou modifiée une à une (le traitement d'un mois passe par PayrollViewSet.process) ;
+    # sans effet si les données affichées n'ont pas changé (empreinte)
+    if instance.status not in payslips.RENDERED_STATUSES:
+        return
+    from .tasks import render_payslips
+    
+    def queue_render():
+        try:
+            render_payslips.delay([instance.pk])
+        except Exception:
+            logger.exception("Impossible de planifier le rendu du bulletin %s", instance.pk)
+    
+    transaction.on_commit(queue_render)
+
 @receiver(post_save, sender=Document)
 def document_notification(sender, instance, created, **kwargs):
-    if created and instance.employee:
+    # Employé sans compte utilisateur : personne à notifier
+    if created and instance.employee and instance.employee.user_id:
         Notification.objects.create(
             recipient=instance.employee.user,
             type=Notification.TYPE_DOCUMENT,
@@ -0,0 +1,78 @@
+import datetime
+import logging
+
+from celery import group, shared_task
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import send_mass_mail
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from . import absences, partitions, payslips
+from .imports import invite_frontend_url
+from .models import Organization, Payroll
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def send_employee_invites(user_ids):
+    """Envoie le lien d'activation (choix du mot de passe) aux comptes importés"""
+    messages = []
+    for user in User.objects.filter(id__in=user_ids).select_related('employee_profile__organization'):
+        if user.has_usable_password() or not user.email:
+            continue
+        uid = urlsafe_base64_encode(force_bytes(user.pk))
+        token = default_token_generator.make_token(user)
+        organization = user.employee_profile.organization.name if hasattr(user, 'employee_profile') else 'HRMS'
+        messages.append((
+            f"Bienvenue chez {organization}",
+            f"Bonjour {user.first_name},\n\n"
+            f"Votre compte a été créé. Choisissez votre mot de passe ici :\n{invite_frontend_url(uid, token)}\n",
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email],
+        ))
+    sent = send_mass_mail(messages, fail_silently=True)
+    logger.info("Invitations envoyées : %s/%s", sent, len(messages))
+    return sent
+
+
+@shared_task
+def mark_absences(day=None):
+    """Marque absents, pour chaque organisation active, les employés sans présence ``day`` (AAAA-MM-JJ, veille par défaut)"""
+    day = datetime.date.fromisoformat(day) if day else timezone.localdate() - datetime.timedelta(days=1)
+    created = 0
+    for organization in Organization.objects.filter(is_active=True):
+        created += absences.mark(organization, day)
+    logger.info("Absences marquées le %s : %s", day, created)
+    return created
+
+
+@shared_task
+def create_attendance_partitions():
+    """Crée les partitions mensuelles à venir de la table des présences (sans effet hors PostgreSQL)"""
+    created = partitions.ensure_partitions()
+    if created:
+        logger.info("Partitions de présences créées : %s", ", ".join(created))
+    return created
+
+
+@shared_task
+def render_payslips(payroll_ids, force=False):
+    """Rend les bulletins PDF d'une tranche de fiches de paie (seules les fiches modifiées sont rendues)"""
+    rendered = payslips.render_payrolls(payroll_ids, force=force)
+    logger.info("Bulletins de paie rendus : %s/%s", rendered, len(payroll_ids))
+    return rendered
+
+
+@shared_task
+def render_period_payslips(organization_id, year, month, force=False):
+    """Répartit les bulletins d'un mois entre workers, par tranches de ``payslips.CHUNK_SIZE``"""
+    payroll_ids = Payroll.objects.filter(
+        organization_id=organization_id, year=year, month=month, status__in=payslips.RENDERED_STATUSES
+    ).order_by('pk').values_list('pk', flat=True)
+    chunks = payslips.chunks(payroll_ids)
+    group(render_payslips.s(chunk, force) for chunk in chunks).apply_async()
+    return len(chunks)
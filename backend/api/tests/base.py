@@ -0,0 +1,42 @@
+import datetime
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from api.models import Employee, Organization, OrganizationMember
+
+
+class OrganizationTestCase(TestCase):
+    """Une organisation, et des employés créés à la demande ; fichiers écrits dans un dossier temporaire"""
+    
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.organization = Organization.objects.create(name='Acme', slug='acme', email='rh@acme.test')
+        self._employees = 0
+    
+    def make_employee(self, role='employee', with_user=True, **fields):
+        self._employees += 1
+        number = self._employees
+        user = None
+        if with_user:
+            user = User.objects.create_user(username=f'user{number}', email=f'user{number}@acme.test', password='x')
+            OrganizationMember.objects.create(organization=self.organization, user=user, role=role)
+        values = {
+            'organization': self.organization,
+            'user': user,
+            'employee_id': f'E{number}',
+            'first_name': f'Prénom{number}',
+            'last_name': 'Test',
+            'email': f'employee{number}@acme.test',
+            'position': 'Dev',
+            'hire_date': datetime.date(2020, 1, 1),
+            'salary': 36000,
+            **fields,
+        }
+        return Employee.objects.create(**values)
@@ -0,0 +1,95 @@
+import datetime
+
+from rest_framework.test import APIClient
+
+from api import approvals
+from api.models import LeaveApproval, LeaveRequest, LeaveType
+
+from .base import OrganizationTestCase
+
+
+class DecisionTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_employee(role='manager')
+        self.employee = self.make_employee(manager=self.manager)
+        leave_type = LeaveType.objects.create(organization=self.organization, name='Congé payé', code='PAID')
+        self.leave_request = LeaveRequest.objects.create(
+            organization=self.organization, employee=self.employee, leave_type=leave_type,
+            start_date=datetime.date(2024, 3, 4), end_date=datetime.date(2024, 3, 8),
+        )
+    
+    def test_approve_after_concurrent_reject_is_refused(self):
+        stale = LeaveRequest.objects.get(pk=self.leave_request.pk)
+        approvals.reject(self.leave_request, self.manager, reason='Effectif')
+        
+        with self.assertRaises(approvals.DecisionError):
+            approvals.approve(stale, None, override=True)
+        self.leave_request.refresh_from_db()
+        self.assertEqual(self.leave_request.status, LeaveRequest.STATUS_REJECTED)
+    
+    def test_reject_after_concurrent_approve_is_refused(self):
+        stale = LeaveRequest.objects.get(pk=self.leave_request.pk)
+        approvals.approve(self.leave_request, None, override=True)
+        
+        with self.assertRaises(approvals.DecisionError):
+            approvals.reject(stale, self.manager)
+        self.leave_request.refresh_from_db()
+        self.assertEqual(self.leave_request.status, LeaveRequest.STATUS_APPROVED)
+        self.assertFalse(self.leave_request.approvals.filter(status=LeaveApproval.STATUS_PENDING).exists())
+    
+    def test_second_approve_by_same_level_is_refused(self):
+        director = self.make_employee(role='manager')
+        self.manager.manager = director
+        self.manager.save()
+        leave_request = LeaveRequest.objects.create(
+            organization=self.organization, employee=self.employee, leave_type=self.leave_request.leave_type,
+            start_date=datetime.date(2024, 4, 1), end_date=datetime.date(2024, 4, 3),
+        )
+        self.assertEqual(list(leave_request.approvals.order_by('level').values_list('approver', 'level')), [
+            (self.manager.pk, 1), (director.pk, 2),
+        ])
+        
+        self.assertFalse(approvals.approve(leave_request, self.manager))
+        with self.assertRaises(approvals.DecisionError):
+            approvals.approve(leave_request, self.manager)
+        with self.assertRaises(approvals.DecisionError):
+            approvals.reject(leave_request, self.manager)
+        
+        leave_request.refresh_from_db()
+        self.assertEqual(leave_request.status, LeaveRequest.STATUS_PENDING)
+        self.assertEqual(leave_request.approvals.get(level=2).status, LeaveApproval.STATUS_PENDING)
+        self.assertTrue(approvals.approve(leave_request, director))
+
+
+class DecisionResponseTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_employee(role='admin').user)
+        leave_type = LeaveType.objects.create(organization=self.organization, name='Congé payé', code='PAID')
+        self.leave_request = LeaveRequest.objects.create(
+            organization=self.organization, employee=self.make_employee(), leave_type=leave_type,
+            start_date=datetime.date(2024, 3, 4), end_date=datetime.date(2024, 3, 8),
+        )
+    
+    def test_approve_returns_nested_relations(self):
+        response = self.client.post(f'/api/leaves/{self.leave_request.pk}/approve/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], LeaveRequest.STATUS_APPROVED)
+        self.assertEqual(response.data['employee_detail']['id'], self.leave_request.employee_id)
+        self.assertEqual(response.data['leave_type_detail']['code'], 'PAID')
+        self.assertIn('approvals', response.data)
+    
+    def test_explicit_expand_is_honoured(self):
+        response = self.client.post(f'/api/leaves/{self.leave_request.pk}/reject/?expand=leave_type', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('leave_type_detail', response.data)
+        self.assertNotIn('employee_detail', response.data)
+    
+    def test_retrieve_keeps_expand_opt_in(self):
+        response = self.client.get(f'/api/leaves/{self.leave_request.pk}/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('employee_detail', response.data)
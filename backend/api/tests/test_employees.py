@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from api import hierarchy
+from api.models import Department, Employee, EmployeeHierarchy
+
+from .base import OrganizationTestCase
+
+
+class ReportsToTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.manager = self.make_employee(role='admin')
+        self.report = self.make_employee(manager=self.manager)
+        self.make_employee()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager.user)
+    
+    def list(self, **params):
+        return self.client.get('/api/employees/', params, secure=True)
+    
+    def test_direct_reports(self):
+        response = self.list(reports_to=self.manager.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([employee['id'] for employee in response.data['results']], [self.report.pk])
+    
+    def test_invalid_identifier_is_rejected(self):
+        response = self.list(reports_to='abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reports_to', response.data)
+    
+    def test_invalid_department_subtree_is_rejected(self):
+        for url in ('/api/employees/', '/api/departments/'):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'department_subtree': 'abc'}, secure=True)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('department_subtree', response.data)
+    
+    def test_department_subtree(self):
+        parent = Department.objects.create(organization=self.organization, name='Produit')
+        child = Department.objects.create(organization=self.organization, name='Design', parent=parent)
+        Employee.objects.filter(pk=self.report.pk).update(department=child)
+        response = self.list(department_subtree=parent.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([employee['id'] for employee in response.data['results']], [self.report.pk])
+
+    
+    
+    def test_create_links_existing_user_regardless_of_email_case(self):
+        user = User.objects.create_user(username='jdupont', email='Jeanne.Dupont@Acme.test', password='x')
+        response = self.client.post('/api/employees/', {
+            'organization': self.organization.pk, 'first_name': 'Jeanne', 'last_name': 'Dupont',
+            'email': 'jeanne.dupont@acme.test', 'position': 'Dev', 'hire_date': '2024-01-02', 'salary': '36000',
+        }, format='json', secure=True)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Employee.objects.get(pk=response.data['id']).user, user)
+        self.assertFalse(User.objects.filter(email__iexact='jeanne.dupont@acme.test').exclude(pk=user.pk).exists())
+
+
+class ManagerCycleTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.director = self.make_employee()
+        self.manager = self.make_employee(manager=self.director)
+        self.report = self.make_employee(manager=self.manager)
+    
+    def test_cycle_is_refused_before_write(self):
+        self.director.manager = self.report
+        with self.assertRaises(ValidationError) as context:
+            self.director.save()
+        self.assertIn('manager', context.exception.message_dict)
+        self.assertIsNone(Employee.objects.get(pk=self.director.pk).manager_id)
+        self.assertTrue(EmployeeHierarchy.objects.filter(ancestor=self.director, descendant=self.report, depth=2).exists())
+    
+    def test_self_manager_is_refused(self):
+        self.manager.manager = self.manager
+        with self.assertRaises(ValidationError):
+            self.manager.full_clean()
+        with self.assertRaises(ValidationError):
+            self.manager.save()
+    
+    def test_valid_move(self):
+        self.report.manager = self.director
+        self.report.save()
+        self.assertTrue(EmployeeHierarchy.objects.filter(ancestor=self.director, descendant=self.report, depth=1).exists())
+
+
+class OrgChartTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = self.make_employee(role='admin')
+        Employee.objects.filter(pk=self.admin.pk).update(profile_photo='profile_photos/admin.jpg')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin.user)
+    
+    def photo(self):
+        response = self.client.get(f'/api/organizations/{self.organization.pk}/org-chart/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.data[0]['profile_photo']
+    
+    def test_photo_url_is_signed_when_served(self):
+        # URL signée différente à chaque appel : le cache ne doit garder que le chemin
+        with mock.patch.object(hierarchy.default_storage, 'url', side_effect=['https://s3/admin.jpg?sig=1', 'https://s3/admin.jpg?sig=2']):
+            self.assertEqual(self.photo(), 'https://s3/admin.jpg?sig=1')
+            self.assertEqual(self.photo(), 'https://s3/admin.jpg?sig=2')
+        self.assertEqual(hierarchy.get_org_chart(self.organization.pk)[0]['profile_photo'], 'profile_photos/admin.jpg')
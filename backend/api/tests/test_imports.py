@@ -0,0 +1,30 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from api.imports import EmployeeImporter
+from api.models import Employee
+
+from .base import OrganizationTestCase
+
+
+HEADER = 'first_name,last_name,email,position,hire_date,manager_email\n'
+
+
+class EmailCaseTests(OrganizationTestCase):
+
+    def run_import(self, *lines):
+        uploaded = SimpleUploadedFile('employes.csv', (HEADER + ''.join(lines)).encode())
+        return EmployeeImporter(self.organization).run(uploaded)
+    
+    def test_existing_email_with_other_case_is_rejected(self):
+        self.make_employee(email='Alice.Martin@acme.test')
+        report = self.run_import('Alice,Martin,alice.martin@ACME.test,Dev,2024-01-15,\n')
+        
+        self.assertEqual(report['created'], 0)
+        self.assertEqual(report['errors'][0]['errors'], {'email': "Un employé avec cet e-mail existe déjà."})
+    
+    def test_manager_email_with_other_case_is_linked(self):
+        manager = self.make_employee(email='Chef@acme.test')
+        report = self.run_import('Bob,Durand,bob@acme.test,Dev,2024-01-15,chef@ACME.test\n')
+        
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(Employee.objects.get(email='bob@acme.test').manager_id, manager.pk)
@@ -0,0 +1,53 @@
+import datetime
+
+from api import partitions
+from api.models import Attendance, AttendanceArchive, AttendanceMonthlySummary
+
+from .base import OrganizationTestCase
+
+
+class ArchiveYearTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.employee = self.make_employee()
+        for day in range(1, 6):
+            Attendance.objects.create(
+                organization=self.organization, employee=self.employee,
+                date=datetime.date(2024, 3, day), status=Attendance.STATUS_PRESENT, hours_worked=8,
+            )
+    
+    def summary(self):
+        return AttendanceMonthlySummary.objects.get(employee=self.employee, month=datetime.date(2024, 3, 1))
+    
+    def test_archive_keeps_summaries(self):
+        partitions.archive_year(2024)
+        self.assertFalse(Attendance.objects.filter(date__year=2024).exists())
+        self.assertEqual(self.summary().days_present, 5)
+        self.assertEqual(self.summary().hours_worked, 40)
+    
+    def test_backdated_entry_merges_with_archive(self):
+        partitions.archive_year(2024)
+        Attendance.objects.create(
+            organization=self.organization, employee=self.employee,
+            date=datetime.date(2024, 3, 8), status=Attendance.STATUS_LATE, hours_worked=7,
+        )
+        summary = self.summary()
+        self.assertEqual((summary.days_present, summary.days_late, summary.hours_worked), (5, 1, 47))
+        
+        partitions.archive_year(2024)
+        self.assertEqual(AttendanceArchive.objects.get(organization=self.organization, year=2024).rows, 6)
+        summary = self.summary()
+        self.assertEqual((summary.days_present, summary.days_late, summary.hours_worked), (5, 1, 47))
+    
+    def test_backdated_entry_replaces_archived_day(self):
+        partitions.archive_year(2024)
+        attendance = Attendance.objects.create(
+            organization=self.organization, employee=self.employee,
+            date=datetime.date(2024, 3, 1), status=Attendance.STATUS_ABSENT, hours_worked=0,
+        )
+        summary = self.summary()
+        self.assertEqual((summary.days_present, summary.days_absent, summary.hours_worked), (4, 1, 32))
+        
+        attendance.delete()
+        self.assertEqual(self.summary().days_present, 5)
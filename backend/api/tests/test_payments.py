@@ -0,0 +1,116 @@
+import csv
+import io
+from decimal import Decimal
+from xml.etree import ElementTree
+
+from rest_framework.test import APIClient
+
+from api import payments, payroll
+from api.models import Payroll
+
+from .base import OrganizationTestCase
+
+
+NS = {'sepa': payments.SEPA_NAMESPACE}
+
+VALID_IBANS = ['FR76 3000 6000 0112 3456 7890 189', 'DE89370400440532013000', 'gb82west12345698765432']
+
+
+class ValidationTests(OrganizationTestCase):
+
+    def test_iban(self):
+        for iban in VALID_IBANS:
+            with self.subTest(iban=iban):
+                self.assertTrue(payments.is_valid_iban(iban))
+        # Clé de contrôle fausse, trop court, caractères interdits, absent
+        for iban in ['FR7630006000011234567890188', 'FR76300060', 'FR76-3000-6000-0112-3456-7890-189', '', None]:
+            with self.subTest(iban=iban):
+                self.assertFalse(payments.is_valid_iban(iban))
+    
+    def test_bic(self):
+        for bic in ['BNPAFRPPXXX', 'DEUTDEFF', ' deutdeff ']:
+            with self.subTest(bic=bic):
+                self.assertTrue(payments.is_valid_bic(bic))
+        for bic in ['BNPAFRPP1', '1NPAFRPP', 'BNPAFR', '', None]:
+            with self.subTest(bic=bic):
+                self.assertFalse(payments.is_valid_bic(bic))
+
+
+class BankFileTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.organization.iban = 'FR7630006000011234567890189'
+        self.organization.bic = 'BNPAFRPPXXX'
+        self.organization.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_employee(role='admin', iban=VALID_IBANS[1], bic='DEUTDEFF').user)
+        self.make_employee(iban=VALID_IBANS[2], salary=48000)
+        self.make_employee(iban=VALID_IBANS[0], bic='BNPAFRPPXXX', salary=30000)
+    
+    def process(self):
+        payroll.generate(self.organization, 2024, 3)
+        Payroll.objects.update(status=Payroll.STATUS_PROCESSED)
+        return Payroll.objects.filter(net_salary__gt=0)
+    
+    def download(self, **params):
+        return self.client.get('/api/payrolls/bank-file/', {'year': 2024, 'month': 3, **params}, secure=True)
+    
+    def test_sepa_totals_match_transfers(self):
+        payrolls = self.process()
+        response = self.download(type='sepa', execution_date='2024-03-28')
+        self.assertEqual(response.status_code, 200)
+        root = ElementTree.fromstring(b''.join(response.streaming_content))
+        
+        transfers = root.findall('.//sepa:CdtTrfTxInf', NS)
+        amounts = [Decimal(node.text) for node in root.findall('.//sepa:CdtTrfTxInf/sepa:Amt/sepa:InstdAmt', NS)]
+        total = sum((item.net_salary for item in payrolls), Decimal('0.00'))
+        self.assertEqual(len(transfers), payrolls.count())
+        self.assertEqual(sum(amounts), total)
+        for path in ('sepa:CstmrCdtTrfInitn/sepa:GrpHdr', 'sepa:CstmrCdtTrfInitn/sepa:PmtInf'):
+            with self.subTest(block=path):
+                self.assertEqual(root.find(f'{path}/sepa:NbOfTxs', NS).text, str(len(transfers)))
+                self.assertEqual(root.find(f'{path}/sepa:CtrlSum', NS).text, f'{total:.2f}')
+        self.assertEqual(root.find('.//sepa:ReqdExctnDt', NS).text, '2024-03-28')
+        self.assertEqual(response['X-Payment-Count'], str(len(transfers)))
+        self.assertEqual(response['X-Payment-Control-Sum'], f'{total:.2f}')
+    
+    def test_csv_total_line(self):
+        payrolls = self.process()
+        response = self.download(type='csv')
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8').lstrip('\ufeff')
+        rows = list(csv.reader(io.StringIO(content), delimiter=';'))
+        
+        self.assertEqual(rows[0], payments.CSV_COLUMNS)
+        transfers, trailer = rows[1:-1], rows[-1]
+        total = sum((item.net_salary for item in payrolls), Decimal('0.00'))
+        self.assertEqual(len(transfers), payrolls.count())
+        self.assertEqual(sum(Decimal(row[4]) for row in transfers), total)
+        self.assertEqual(trailer, ['TOTAL', str(len(transfers)), '', '', f'{total:.2f}', 'EUR', ''])
+    
+    def test_invalid_beneficiary_is_reported(self):
+        employee = self.make_employee(iban='FR7630006000011234567890188')
+        self.process()
+        response = self.download(type='sepa')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['employee_id'] for error in response.data['details']], [employee.employee_id])
+    
+    def test_sepa_requires_euro(self):
+        self.organization.currency = 'USD'
+        self.organization.save()
+        self.process()
+        response = self.download(type='sepa')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('euro', response.data['error'])
+        self.assertEqual(self.download(type='csv').status_code, 200)
+    
+    def test_changed_totals_abort_the_file(self):
+        payrolls = self.process()
+        queryset = payments.payments(self.organization, 2024, 3)
+        count, total = payments.prepare(self.organization, queryset, 'csv')
+        self.assertEqual((count, total), (payrolls.count(), sum((item.net_salary for item in payrolls), Decimal('0.00'))))
+        
+        Payroll.objects.filter(pk=payrolls.first().pk).update(net_salary=1)
+        with self.assertRaises(payments.PaymentExportError):
+            list(payments.bank_csv(self.organization, queryset, 2024, 3, (count, total)))
@@ -0,0 +1,122 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from rest_framework.test import APIClient
+
+from api import payroll
+from api.models import Attendance, Payroll
+
+from .base import OrganizationTestCase
+
+
+class GenerateTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_employee()
+        self.make_employee(with_user=False)
+    
+    def test_second_generation_skips_existing(self):
+        self.assertEqual(payroll.generate(self.organization, 2024, 3), {'created': 2, 'updated': 0, 'skipped': 0})
+        self.assertEqual(payroll.generate(self.organization, 2024, 3), {'created': 0, 'updated': 0, 'skipped': 2})
+        self.assertEqual(Payroll.objects.count(), 2)
+    
+    def test_generation_finished_during_compute_is_not_duplicated(self):
+        compute = payroll.compute
+        
+        def concurrent_compute(*args, **kwargs):
+            lines = compute(*args, **kwargs)
+            # Une autre génération du même mois se termine pendant ce calcul
+            with mock.patch.object(payroll, 'compute', compute):
+                payroll.generate(self.organization, 2024, 3)
+            return lines
+        
+        with mock.patch.object(payroll, 'compute', concurrent_compute):
+            result = payroll.generate(self.organization, 2024, 3)
+        self.assertEqual(result, {'created': 0, 'updated': 0, 'skipped': 2})
+        self.assertEqual(Payroll.objects.count(), 2)
+
+
+class SimulateTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_employee(role='admin').user)
+    
+    def simulate(self, **data):
+        return self.client.post('/api/payrolls/simulate/', {'year': 2024, 'month': 3, **data}, format='json', secure=True)
+    
+    def test_simulation(self):
+        response = self.simulate(bonus_rate='0.10', salary_increase='0.03')
+        self.assertEqual(response.status_code, 200)
+        totals = response.json()['totals']
+        self.assertEqual(totals['baseline']['employees'], 1)
+        self.assertEqual(totals['baseline']['base_salary'], '3000.00')
+        self.assertEqual(totals['simulated']['base_salary'], '3090.00')
+        self.assertEqual(totals['difference']['base_salary'], '90.00')
+        self.assertEqual(response.json()['rates']['bonus_rate'], '0.10')
+    
+    def test_gross_matches_engine_with_absences(self):
+        employee = self.make_employee()
+        Attendance.objects.create(
+            organization=self.organization, employee=employee, date=datetime.date(2024, 3, 5), status=Attendance.STATUS_ABSENT
+        )
+        lines = payroll.compute(self.organization, 2024, 3)
+        gross = sum((line.gross for line in lines), Decimal('0.00'))
+        self.assertLess(gross, sum((line.base_salary + line.bonuses for line in lines), Decimal('0.00')))
+        
+        totals = self.simulate().json()['totals']
+        self.assertEqual(totals['baseline']['gross'], str(gross))
+        self.assertEqual(totals['simulated']['gross'], str(gross))
+    
+    def test_out_of_range_values_are_rejected(self):
+        for data in ({'bonus_rate': '1e30'}, {'overtime_rate': '11'}, {'salary_increase': '1e30'}):
+            with self.subTest(data=data):
+                response = self.simulate(**data)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+
+class SummaryTests(OrganizationTestCase):
+
+    def test_amounts_are_strings(self):
+        self.make_employee()
+        client = APIClient()
+        client.force_authenticate(self.make_employee(role='admin').user)
+        payroll.generate(self.organization, 2024, 3)
+        
+        response = client.get('/api/payrolls/summary/', {'year': 2024, 'pivot': 'department'}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual(summary['totals']['current']['base_salary'], '6000.00')
+        self.assertEqual(summary['totals']['previous']['base_salary'], '0.00')
+        self.assertEqual(summary['totals']['current']['payslips'], 2)
+        self.assertEqual(summary['by_month'][0]['current']['base_salary'], '6000.00')
+        self.assertEqual(summary['pivot']['lines'][0]['values'][2], summary['pivot']['lines'][0]['total'])
+    
+    def test_gross_matches_payslips(self):
+        employee = self.make_employee()
+        client = APIClient()
+        client.force_authenticate(self.make_employee(role='admin').user)
+        Attendance.objects.create(
+            organization=self.organization, employee=employee, date=datetime.date(2024, 3, 5), status=Attendance.STATUS_ABSENT
+        )
+        lines = {line.employee_id: line for line in payroll.compute(self.organization, 2024, 3)}
+        payroll.generate(self.organization, 2024, 3)
+        payrolls = Payroll.objects.all()
+        for item in payrolls:
+            self.assertEqual(item.gross_salary, lines[item.employee_id].gross)
+        absent = payrolls.get(employee=employee)
+        self.assertLess(absent.gross_salary, absent.base_salary + absent.bonuses)
+        
+        response = client.get('/api/payrolls/summary/', {'year': 2024, 'month': 3}, secure=True)
+        gross = sum((item.gross_salary for item in payrolls), Decimal('0.00'))
+        self.assertEqual(response.json()['totals']['current']['gross'], str(gross))
+        
+        # Fiche modifiée à la main : le brut suit
+        absent.bonuses += 100
+        absent.save(update_fields=['bonuses'])
+        absent.refresh_from_db()
+        self.assertEqual(absent.gross_salary, lines[employee.pk].gross + 100)
@@ -0,0 +1,87 @@
+import os
+from unittest import mock
+
+from django.conf import settings
+from rest_framework.test import APIClient
+
+from api import payroll, payslips, tasks
+from api.models import Document, Notification, Payroll
+
+from .base import OrganizationTestCase
+
+
+class RenderPayslipsTests(OrganizationTestCase):
+
+    def generate(self):
+        payroll.generate(self.organization, 2024, 3)
+        Payroll.objects.update(status=Payroll.STATUS_PROCESSED)
+        return list(Payroll.objects.values_list('pk', flat=True))
+    
+    def stored_files(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'documents')
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    
+    def test_employee_without_user(self):
+        employee = self.make_employee(with_user=False)
+        ids = self.generate()
+        
+        self.assertEqual(payslips.render_payrolls(ids), 1)
+        document = Payroll.objects.get(employee=employee).payslip
+        self.assertEqual(document.category, Document.CATEGORY_PAYSLIP)
+        self.assertEqual(document.content_type, 'application/pdf')
+        self.assertFalse(Notification.objects.exists())
+        # Données inchangées : pas de nouveau rendu
+        self.assertEqual(payslips.render_payrolls(ids), 0)
+    
+    def test_employee_with_user_is_notified(self):
+        employee = self.make_employee()
+        self.assertEqual(payslips.render_payrolls(self.generate()), 1)
+        self.assertTrue(Notification.objects.filter(recipient=employee.user, type=Notification.TYPE_DOCUMENT).exists())
+    
+    def test_failed_store_removes_file_and_continues(self):
+        self.make_employee()
+        self.make_employee()
+        ids = self.generate()
+        
+        save = Document.save
+        calls = []
+        
+        def failing_save(document, *args, **kwargs):
+            calls.append(document)
+            if len(calls) == 1:
+                raise RuntimeError("stockage indisponible")
+            return save(document, *args, **kwargs)
+        
+        with mock.patch.object(Document, 'save', failing_save):
+            self.assertEqual(payslips.render_payrolls(ids), 1)
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertEqual(self.stored_files(), [os.path.basename(Document.objects.get().file.name)])
+
+
+class ProcessPeriodTests(OrganizationTestCase):
+
+    def test_process_queues_period_rendering(self):
+        admin = self.make_employee(role='admin')
+        self.make_employee()
+        payroll.generate(self.organization, 2024, 3)
+        client = APIClient()
+        client.force_authenticate(admin.user)
+        
+        with mock.patch('api.views.render_period_payslips.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/payrolls/process/', {'year': 2024, 'month': 3}, format='json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['processed'], 2)
+        delay.assert_called_once_with(self.organization.pk, 2024, 3)
+        self.assertFalse(Payroll.objects.filter(status=Payroll.STATUS_DRAFT).exists())
+    
+    def test_period_task_renders_in_chunks(self):
+        for _ in range(3):
+            self.make_employee(with_user=False)
+        payroll.generate(self.organization, 2024, 3)
+        Payroll.objects.update(status=Payroll.STATUS_PROCESSED)
+        
+        with mock.patch.object(payslips, 'CHUNK_SIZE', 2), mock.patch('api.tasks.group') as group:
+            self.assertEqual(tasks.render_period_payslips(self.organization.pk, 2024, 3), 2)
+        signatures = list(group.call_args.args[0])
+        self.assertEqual([len(signature.args[0]) for signature in signatures], [2, 1])
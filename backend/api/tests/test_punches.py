@@ -0,0 +1,59 @@
+import datetime
+
+from django.utils import timezone
+
+from api import punches
+from api.models import Attendance, PunchEvent
+
+from .base import OrganizationTestCase
+
+
+def at(day, hour, minute=0):
+    return timezone.make_aware(datetime.datetime(2024, 3, day, hour, minute))
+
+
+class IngestEventsTests(OrganizationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.employee = self.make_employee()
+    
+    def ingest(self, *events):
+        return punches.ingest_events(self.organization, [
+            (index, {'employee_id': self.employee.employee_id, 'timestamp': timestamp, 'direction': direction})
+            for index, (timestamp, direction) in enumerate(events)
+        ])
+    
+    def attendances(self):
+        return {
+            attendance.date.day: (attendance.check_in, attendance.check_out, attendance.hours_worked)
+            for attendance in Attendance.objects.filter(employee=self.employee)
+        }
+    
+    def test_overnight_shift(self):
+        self.ingest((at(7, 22), PunchEvent.DIRECTION_IN), (at(8, 6), PunchEvent.DIRECTION_OUT))
+        self.assertEqual(self.attendances(), {7: (datetime.time(22), datetime.time(6), 8)})
+    
+    def test_overnight_out_before_in(self):
+        self.ingest((at(8, 6), PunchEvent.DIRECTION_OUT))
+        self.assertEqual(self.attendances(), {8: (None, datetime.time(6), 0)})
+        
+        self.ingest((at(7, 22), PunchEvent.DIRECTION_IN))
+        # La sortie rejoint la journée de l'entrée ; la journée du lendemain, vidée, disparaît
+        self.assertEqual(self.attendances(), {7: (datetime.time(22), datetime.time(6), 8)})
+    
+    def test_out_before_in_keeps_next_day_shift(self):
+        self.ingest((at(8, 6), PunchEvent.DIRECTION_OUT), (at(8, 9), PunchEvent.DIRECTION_IN), (at(8, 17), PunchEvent.DIRECTION_OUT))
+        self.ingest((at(7, 22), PunchEvent.DIRECTION_IN))
+        self.assertEqual(self.attendances(), {
+            7: (datetime.time(22), datetime.time(6), 8),
+            8: (datetime.time(9), datetime.time(17), 8),
+        })
+    
+    def test_app_check_in_is_kept(self):
+        Attendance.objects.create(
+            organization=self.organization, employee=self.employee, date=datetime.date(2024, 3, 8),
+            check_in=datetime.time(8, 30),
+        )
+        self.ingest((at(8, 17), PunchEvent.DIRECTION_OUT))
+        self.assertEqual(self.attendances(), {8: (datetime.time(8, 30), datetime.time(17), 8.5)})
@@ -0,0 +1,193 @@
+"""
+Feuilles de temps : heures travaillées, heures supplémentaires (jour et
+semaine), retards et heures de nuit par employé, pour une organisation et une
+période.
+
+Une seule projection en colonnes ``(employee_id, date, check_in, check_out)``
+est lue par appel ; tous les calculs se font ensuite sur des tableaux numpy
+(aucune boucle Python par présence au-delà de la conversion initiale). Les
+durées sont exprimées en minutes.
+
+Règles (``TIMESHEET_RULES`` dans les settings, surchargeables par appel) :
+
+- ``daily_threshold`` : heures par jour au-delà desquelles commencent les
+  heures supplémentaires journalières ;
+- ``weekly_threshold`` : heures par semaine (lundi → dimanche, hors heures
+  supplémentaires journalières) au-delà desquelles commencent les heures
+  supplémentaires hebdomadaires. Une semaine à cheval sur deux périodes est
+  rattachée à celle qui contient son dimanche ;
+- ``rounding`` / ``rounding_mode`` : arrondi du temps de chaque journée (en
+  minutes, 0 = aucun ; ``nearest``, ``down`` ou ``up``) ;
+- ``work_start`` / ``late_grace`` : heure d'embauche et tolérance de retard
+  (une arrivée plus de ``daily_threshold`` heures après l'embauche n'est pas
+  un retard) ;
+- ``night_start`` / ``night_end`` : plage des heures de nuit.
+"""
+import datetime
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from .models import Attendance
+
+
+TimesheetRules = namedtuple('TimesheetRules', [
+    'daily_threshold', 'weekly_threshold', 'rounding', 'rounding_mode',
+    'work_start', 'late_grace', 'night_start', 'night_end',
+])
+
+DEFAULT_RULES = {
+    'daily_threshold': 8,
+    'weekly_threshold': 35,
+    'rounding': 0,
+    'rounding_mode': 'nearest',
+    'work_start': '09:00',
+    'late_grace': 5,
+    'night_start': '21:00',
+    'night_end': '06:00',
+}
+
+ROUNDING_MODES = {'nearest': np.round, 'down': np.floor, 'up': np.ceil}
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def get_rules(**overrides):
+    """Règles par défaut < ``settings.TIMESHEET_RULES`` < ``overrides`` ; ValueError si une règle est invalide"""
+    values = {**DEFAULT_RULES, **getattr(settings, 'TIMESHEET_RULES', {}), **overrides}
+    unknown = set(values) - set(TimesheetRules._fields)
+    if unknown:
+        raise ValueError(f"Règles inconnues : {', '.join(sorted(unknown))}")
+    if values['rounding_mode'] not in ROUNDING_MODES:
+        raise ValueError(f"Mode d'arrondi inconnu : {values['rounding_mode']}")
+    for name in ('work_start', 'night_start', 'night_end'):
+        datetime.datetime.strptime(values[name], '%H:%M')
+    for name in ('daily_threshold', 'weekly_threshold', 'rounding', 'late_grace'):
+        values[name] = float(values[name])
+        if values[name] < 0:
+            raise ValueError(f"Valeur négative : {name}")
+    return TimesheetRules(**values)
+
+
+def _clock_minutes(value):
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _time_minutes(value):
+    return value.hour * 60 + value.minute + value.second / 60
+
+
+def _columns(rows):
+    """Projection ``values_list`` → tableaux (employé, jour ordinal, arrivée, départ en minutes)"""
+    employee_ids, days, check_ins, check_outs = zip(*rows) if rows else ((), (), (), ())
+    count = len(employee_ids)
+    return (
+        np.fromiter(employee_ids, dtype=np.int64, count=count),
+        np.fromiter(map(datetime.date.toordinal, days), dtype=np.int64, count=count),
+        np.fromiter(map(_time_minutes, check_ins), dtype=np.float64, count=count),
+        np.fromiter(map(_time_minutes, check_outs), dtype=np.float64, count=count),
+    )
+
+
+def _night_minutes(start, end, rules):
+    """Chevauchement de ``[start, end]`` (minutes depuis minuit du jour) avec les plages de nuit de J-1 à J+1"""
+    night_start, night_end = _clock_minutes(rules.night_start), _clock_minutes(rules.night_end)
+    if night_end <= night_start:
+        night_end += MINUTES_PER_DAY
+    total = np.zeros_like(start)
+    for offset in (-MINUTES_PER_DAY, 0, MINUTES_PER_DAY):
+        total += np.clip(np.minimum(end, night_end + offset) - np.maximum(start, night_start + offset), 0, None)
+    return total
+
+
+def compute(organization, start, end, rules=None, employee_ids=None):
+    """
+    Feuilles de temps de ``organization`` du ``start`` au ``end`` inclus :
+    ``{employee_id: {days_worked, worked_minutes, ..., weeks: [...]}}``.
+    Seules les journées complètes (arrivée et départ) sont comptées.
+    """
+    rules = rules or get_rules()
+    # Semaines entières autour de la période, pour le seuil hebdomadaire
+    window_start = start - datetime.timedelta(days=start.weekday())
+    window_end = end + datetime.timedelta(days=6 - end.weekday())
+    attendances = Attendance.objects.filter(
+        organization=organization,
+        date__range=(window_start, window_end),
+        check_in__isnull=False,
+        check_out__isnull=False,
+    )
+    if employee_ids is not None:
+        attendances = attendances.filter(employee_id__in=employee_ids)
+    rows = list(attendances.order_by().values_list('employee_id', 'date', 'check_in', 'check_out'))
+    return _compute(*_columns(rows), start.toordinal(), end.toordinal(), rules)
+
+
+def _compute(employee, day, check_in, check_out, first_day, last_day, rules):
+    if not len(employee):
+        return {}
+    
+    # Un départ antérieur à l'arrivée est un départ le lendemain
+    check_out = np.where(check_out < check_in, check_out + MINUTES_PER_DAY, check_out)
+    worked = check_out - check_in
+    if rules.rounding:
+        worked = ROUNDING_MODES[rules.rounding_mode](worked / rules.rounding) * rules.rounding
+    daily_overtime = np.clip(worked - rules.daily_threshold * 60, 0, None)
+    # Une arrivée au-delà de la journée normale (équipe de nuit...) n'est pas un retard
+    late = check_in - _clock_minutes(rules.work_start)
+    late = np.where((late > rules.late_grace) & (late < rules.daily_threshold * 60), late, 0)
+    night = _night_minutes(check_in, check_out, rules)
+    
+    employees, employee_index = np.unique(employee, return_inverse=True)
+    in_period = ((day >= first_day) & (day <= last_day)).astype(np.float64)
+    
+    def per_employee(values):
+        return np.bincount(employee_index, weights=values * in_period, minlength=len(employees))
+    
+    # Semaines du lundi au dimanche : l'ordinal 1 (1er janvier de l'an 1) est un lundi
+    weeks, week_index = np.unique((day - 1) // 7, return_inverse=True)
+    cells = employee_index * len(weeks) + week_index
+    shape = (len(employees), len(weeks))
+    
+    def per_week(values):
+        return np.bincount(cells, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+    
+    week_worked = per_week(worked)
+    week_daily_overtime = per_week(daily_overtime)
+    week_overtime = np.clip(week_worked - week_daily_overtime - rules.weekly_threshold * 60, 0, None)
+    sundays = weeks * 7 + 7
+    week_counted = (sundays >= first_day) & (sundays <= last_day)
+    week_shown = (sundays - 6 <= last_day) & (sundays >= first_day)
+    
+    totals = {
+        'days_worked': per_employee(np.ones_like(worked)),
+        'worked_minutes': per_employee(worked),
+        'daily_overtime_minutes': per_employee(daily_overtime),
+        'weekly_overtime_minutes': (week_overtime * week_counted).sum(axis=1),
+        'late_minutes': per_employee(late),
+        'late_days': per_employee((late > 0).astype(np.float64)),
+        'night_minutes': per_employee(night),
+    }
+    totals['overtime_minutes'] = totals['daily_overtime_minutes'] + totals['weekly_overtime_minutes']
+    totals = {name: np.rint(values).astype(np.int64) for name, values in totals.items()}
+    
+    results = {}
+    for index, employee_id in enumerate(employees.tolist()):
+        # Employé présent seulement dans les jours de bord de semaine hors période
+        if not totals['days_worked'][index] and not totals['overtime_minutes'][index]:
+            continue
+        weekly = [
+            {
+                'week': '{0}-W{1:02d}'.format(*datetime.date.fromordinal(int(sunday)).isocalendar()[:2]),
+                'worked_minutes': int(round(week_worked[index, position])),
+                'overtime_minutes': int(round(week_daily_overtime[index, position] + week_overtime[index, position])),
+            }
+            for position, sunday in enumerate(sundays)
+            if week_shown[position] and week_worked[index, position]
+        ]
+        results[employee_id] = dict(
+            {name: int(values[index]) for name, values in totals.items()},
+            weeks=weekly,
+        )
+    return results
@@ -7,7 +7,8 @@ from .views import (
     DepartmentViewSet, EmployeeViewSet,
     LeaveTypeViewSet, LeaveRequestViewSet,
     AttendanceViewSet, DocumentViewSet, PayrollViewSet,
-    ProjectViewSet, EventViewSet, MeViewSet, NotificationViewSet
+    ProjectViewSet, EventViewSet, MeViewSet, NotificationViewSet,
+    accept_invite
 )
 from .health import health_check
 
@@ -45,6 +46,7 @@ urlpatterns = [
     # Auth endpoints
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/invite/accept/', accept_invite, name='accept_invite'),
     
     # Health check
     path('health/', health_check, name='health_check'),
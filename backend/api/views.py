@@ -1,19 +1,28 @@
 from rest_framework import viewsets, filters, status, serializers
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Count
 from django.db import transaction
 from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
 import datetime
+import logging
 
 from .models import (
     Organization, OrganizationMember,
     Department, Employee,
-    LeaveType, LeaveRequest,
-    Attendance, Document, Payroll,
+    LeaveType, LeaveRequest, LeaveApproval,
+    Attendance, AttendanceMonthlySummary, AttendanceArchive, Document, Payroll,
     Project, Event, Notification
 )
 from .serializers import (
@@ -21,7 +30,8 @@ from .serializers import (
     DepartmentSerializer,
     EmployeeListSerializer, EmployeeDetailSerializer,
     LeaveTypeSerializer, LeaveRequestListSerializer, LeaveRequestDetailSerializer,
-    AttendanceSerializer, DocumentSerializer, PayrollSerializer,
+    AttendanceSerializer, AttendanceMonthlySummarySerializer, PunchEventInputSerializer,
+    DocumentSerializer, PayrollSerializer,
     ProjectSerializer, EventSerializer, UserProfileSerializer,
     NotificationSerializer
 )
@@ -29,6 +39,14 @@ from .permissions import (
     IsOrganizationMember, IsOrganizationAdmin,
     IsManagerOrAdmin, IsOwnerOrReadOnly
 )
+from . import analytics, approvals, hierarchy, imports, partitions, payments, payroll, punches, rollups, sequences, timesheets
+from .fieldsets import SparseFieldsViewMixin
+from .readers import AttendanceReader, FastListMixin, LeaveRequestListReader
+from .search import EmployeeSearchFilter, RankedOrderingFilter, lookup_employees
+from .tasks import render_period_payslips, send_employee_invites
+
+logger = logging.getLogger(__name__)
+
 
 class MeViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
@@ -108,6 +126,32 @@ class MeViewSet(viewsets.ViewSet):
         return Response(serializer.data)
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def accept_invite(request):
+    """Activation d'un compte importé : choix du mot de passe via le lien d'invitation"""
+    uid = request.data.get('uid')
+    token = request.data.get('token')
+    new_password = request.data.get('new_password')
+    
+    try:
+        user = User.objects.get(pk=force_str(urlsafe_base64_decode(uid)))
+    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+        user = None
+    
+    if user is None or user.has_usable_password() or not default_token_generator.check_token(user, token):
+        return Response({"detail": "Lien d'invitation invalide ou expiré."}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        validate_password(new_password, user)
+    except DjangoValidationError as exc:
+        return Response({"new_password": exc.messages}, status=status.HTTP_400_BAD_REQUEST)
+    
+    user.set_password(new_password)
+    user.save(update_fields=['password'])
+    return Response({"detail": "Mot de passe défini, vous pouvez vous connecter."})
+
+
 # ==================== MIXINS ====================
 
 class OrganizationFilterMixin:
@@ -127,11 +171,46 @@ class OrganizationFilterMixin:
         ).values_list('organization_id', flat=True)
         
         return queryset.filter(organization_id__in=user_orgs)
+    
+    def _parse_department_subtree(self):
+        """?department_subtree=<id> en liste (None sinon) ; 400 si l'identifiant n'est pas numérique"""
+        subtree = self.request.query_params.get('department_subtree')
+        if not subtree or self.action != 'list':
+            return None
+        if not subtree.isdigit():
+            raise serializers.ValidationError({"department_subtree": "Identifiant de département attendu."})
+        return int(subtree)
+    
+    def get_organization(self, roles=None):
+        """
+        Organisation visée par la requête (``organization`` du corps ou des paramètres, sinon la
+        première de l'utilisateur) ; ``roles`` restreint aux membres ayant l'un de ces rôles
+        """
+        user = self.request.user
+        org_id = self.request.data.get('organization') or self.request.query_params.get('organization')
+        if org_id and not str(org_id).isdigit():
+            raise serializers.ValidationError({"organization": "Identifiant invalide."})
+        
+        if user.is_superuser:
+            organization = Organization.objects.filter(pk=org_id).first() if org_id else None
+        else:
+            memberships = user.organization_memberships.filter(is_active=True).select_related('organization')
+            if roles is not None:
+                memberships = memberships.filter(role__in=roles)
+            if org_id:
+                memberships = memberships.filter(organization_id=org_id)
+            member = memberships.order_by('joined_at').first()
+            if member is None and org_id:
+                raise PermissionDenied("Vous n'avez pas accès à cette organisation.")
+            organization = member.organization if member else None
+        if organization is None:
+            raise serializers.ValidationError({"organization": "Aucune organisation."})
+        return organization
 
 
 # ==================== ORGANIZATION ====================
 
-class OrganizationViewSet(viewsets.ModelViewSet):
+class OrganizationViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les organisations
     """
@@ -168,6 +247,24 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         
         return Response(stats)
     
+    @action(detail=True, methods=['get'], url_path='org-chart')
+    def org_chart(self, request, pk=None):
+        """Organigramme (?root=<employee_id> pour un sous-arbre, ?depth=N pour limiter la profondeur)"""
+        org = self.get_object()
+        tree = hierarchy.get_org_chart(org.id)
+        
+        root = request.query_params.get('root')
+        if root:
+            node = hierarchy.find_node(tree, int(root)) if root.isdigit() else None
+            if node is None:
+                return Response({'error': 'Employé introuvable dans l\'organigramme'}, status=status.HTTP_404_NOT_FOUND)
+            tree = [node]
+        
+        depth = request.query_params.get('depth')
+        max_depth = int(depth) if depth and depth.isdigit() else None
+        
+        return Response(hierarchy.render_org_chart(tree, max_depth, url_builder=request.build_absolute_uri))
+    
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsManagerOrAdmin])
     def activity_chart(self, request, pk=None):
         """Statistiques d'activité (Présences sur les 7 derniers jours)"""
@@ -198,7 +295,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         })
 
 
-class OrganizationMemberViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class OrganizationMemberViewSet(SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les membres d'organisation
     """
@@ -212,7 +309,7 @@ class OrganizationMemberViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
 
 # ==================== DEPARTMENT ====================
 
-class DepartmentViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class DepartmentViewSet(SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les départements
     """
@@ -225,18 +322,64 @@ class DepartmentViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        
+        # ?department_subtree=<id> : le département et tous ses sous-départements
+        subtree = self._parse_department_subtree()
+        if subtree is not None:
+            queryset = hierarchy.filter_department_subtree(queryset, subtree, field='id')
+        
+        return queryset
+    
     @action(detail=True, methods=['get'])
     def employees(self, request, pk=None):
-        """Liste des employés du département"""
+        """Liste des employés du département (?include_subtree=true pour les sous-départements)"""
         department = self.get_object()
-        employees = department.employees.filter(is_active=True)
+        if request.query_params.get('include_subtree') in ('1', 'true'):
+            employees = hierarchy.filter_department_subtree(
+                Employee.objects.select_related('department', 'manager', 'user'),
+                department.pk
+            ).filter(is_active=True)
+        else:
+            employees = department.employees.filter(is_active=True)
         serializer = EmployeeListSerializer(employees, many=True)
         return Response(serializer.data)
+    
+    def _department_links(self, rows):
+        depths = dict(rows)
+        departments = Department.objects.filter(id__in=depths).values('id', 'name', 'code', 'parent_id', 'manager_id')
+        return sorted(
+            [
+                {
+                    'id': d['id'],
+                    'name': d['name'],
+                    'code': d['code'],
+                    'parent': d['parent_id'],
+                    'manager': d['manager_id'],
+                    'depth': depths[d['id']]
+                }
+                for d in departments
+            ],
+            key=lambda d: (d['depth'], d['name'])
+        )
+    
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, pk=None):
+        """Départements parents, du parent direct jusqu'à la racine"""
+        department = self.get_object()
+        return Response(self._department_links(hierarchy.department_ancestors(department)))
+    
+    @action(detail=True, methods=['get'])
+    def descendants(self, request, pk=None):
+        """Tous les sous-départements (depth = distance au département)"""
+        department = self.get_object()
+        return Response(self._department_links(hierarchy.department_descendants(department, include_self=False)))
 
 
 # ==================== EMPLOYEE ====================
 
-class EmployeeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class EmployeeViewSet(SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les employés
     """
@@ -244,9 +387,9 @@ class EmployeeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
         'organization', 'department', 'manager', 'user'
     ).all()
     permission_classes = [IsAuthenticated, IsOrganizationMember, IsManagerOrAdmin]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, EmployeeSearchFilter, RankedOrderingFilter]
     filterset_fields = ['organization', 'department', 'status', 'employment_type', 'is_active']
-    search_fields = ['first_name', 'last_name', 'email', 'employee_id', 'position']
+    search_fields = ['first_name', 'last_name', 'email', 'employee_id', 'position']  # cf. api/search.py
     ordering_fields = ['last_name', 'first_name', 'hire_date', 'created_at']
     ordering = ['last_name', 'first_name']
     
@@ -255,6 +398,36 @@ class EmployeeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
             return EmployeeListSerializer
         return EmployeeDetailSerializer
     
+    @staticmethod
+    def _parse_depth(value, default=1):
+        """?depth=all → None (tous niveaux), ?depth=N → N"""
+        if value in (None, ''):
+            return default
+        if value == 'all':
+            return None
+        try:
+            return max(int(value), 1)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({"depth": "Valeur attendue : un entier ou 'all'."})
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        
+        # ?reports_to=<id>&depth=all : subordonnés via la table de fermeture
+        reports_to = self.request.query_params.get('reports_to')
+        if reports_to and self.action == 'list':
+            if not reports_to.isdigit():
+                raise serializers.ValidationError({"reports_to": "Identifiant d'employé attendu."})
+            depth = self._parse_depth(self.request.query_params.get('depth'))
+            queryset = hierarchy.descendants_of(queryset, int(reports_to), max_depth=depth)
+        
+        # ?department_subtree=<id> : employés du département et de ses sous-départements
+        subtree = self._parse_department_subtree()
+        if subtree is not None:
+            queryset = hierarchy.filter_department_subtree(queryset, subtree)
+        
+        return queryset
+    
     def perform_create(self, serializer):
         """
         Automate User, ID and OrganizationMember creation when an Employee is added
@@ -266,14 +439,11 @@ class EmployeeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
                 raise serializers.ValidationError({"organization": "L'organisation est requise."})
                 
             org = Organization.objects.get(id=org_id)
-            count = Employee.objects.filter(organization=org).count() + 1
-            year = timezone.now().year
-            auto_id = f"EMP-{year}-{count:04d}"
             
-            # 2. Save the employee profile (using auto_id if needed)
+            # 2. Save the employee profile (allocating an ID from the org sequence if needed)
             data = serializer.validated_data
             if not data.get('employee_id'):
-                data['employee_id'] = auto_id
+                data['employee_id'] = sequences.allocate_employee_id(org)
                 
             employee = serializer.save(employee_id=data['employee_id'])
             
@@ -281,7 +451,7 @@ class EmployeeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
             user_email = employee.email
             username = user_email.split('@')[0]
             
-            user = User.objects.filter(email=user_email).first()
+            user = User.objects.filter(email__iexact=user_email).first()
             
             if not user:
                 # 3. Create a new Django User
@@ -319,14 +489,98 @@ class EmployeeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
                     user=employee.user
                 ).update(role=role)
     
+    @action(
+        detail=False, methods=['post'], url_path='import',
+        parser_classes=[MultiPartParser, FormParser],
+        permission_classes=[IsAuthenticated, IsOrganizationAdmin]
+    )
+    def bulk_import(self, request):
+        """Import en masse d'employés (CSV/XLSX) avec rapport d'erreurs par ligne"""
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response({"detail": "Aucun fichier fourni."}, status=status.HTTP_400_BAD_REQUEST)
+        
+        org_id = request.data.get('organization')
+        organization = Organization.objects.filter(id=org_id).first() if org_id else None
+        if organization is None:
+            raise serializers.ValidationError({"organization": "L'organisation est requise."})
+        if not request.user.is_superuser and not request.user.organization_memberships.filter(
+            organization=organization, is_active=True, role__in=['admin', 'owner']
+        ).exists():
+            raise PermissionDenied("Vous n'êtes pas administrateur de cette organisation.")
+        
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        importer = imports.EmployeeImporter(organization, dry_run=dry_run)
+        try:
+            report = importer.run(uploaded_file)
+        except imports.ImportFileError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        send_invites = str(request.data.get('send_invites', 'true')).lower() in ('1', 'true')
+        if send_invites and importer.created_user_ids:
+            user_ids = importer.created_user_ids
+            
+            def queue_invites():
+                try:
+                    send_employee_invites.delay(user_ids)
+                except Exception:
+                    # L'import est validé : un broker indisponible ne doit pas le faire échouer
+                    logger.exception("Impossible de planifier l'envoi des invitations")
+            
+            transaction.on_commit(queue_invites)
+        
+        return Response(report, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        """Sélecteur d'employés : ?q=<préfixe>, 20 résultats au plus (id, nom, matricule, photo)"""
+        memberships = request.user.organization_memberships.filter(is_active=True)
+        org_id = request.query_params.get('organization')
+        if org_id:
+            if not org_id.isdigit():
+                raise serializers.ValidationError({"organization": "Identifiant invalide."})
+            if not request.user.is_superuser and not memberships.filter(organization_id=org_id).exists():
+                raise PermissionDenied("Vous n'êtes pas membre de cette organisation.")
+        else:
+            org_id = memberships.values_list('organization_id', flat=True).first()
+            if org_id is None:
+                return Response([])
+        
+        results = lookup_employees(int(org_id), request.query_params.get('q', ''))
+        return Response([
+            dict(item, photo_thumb=request.build_absolute_uri(item['photo_thumb']) if item['photo_thumb'] else None)
+            for item in results
+        ])
+    
     @action(detail=True, methods=['get'])
     def subordinates(self, request, pk=None):
-        """Liste des subordonnés"""
+        """Liste des subordonnés (directs par défaut, ?depth=N ou ?depth=all)"""
         employee = self.get_object()
-        subordinates = employee.subordinates.filter(is_active=True)
+        depth = self._parse_depth(request.query_params.get('depth'))
+        subordinates = hierarchy.descendants_of(
+            Employee.objects.select_related('department', 'manager', 'user'),
+            employee.pk,
+            max_depth=depth
+        ).filter(is_active=True)
         serializer = EmployeeListSerializer(subordinates, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, pk=None):
+        """Chaîne managériale, du manager direct jusqu'au sommet"""
+        employee = self.get_object()
+        return Response([
+            {
+                'id': link.ancestor.id,
+                'full_name': link.ancestor.full_name,
+                'employee_id': link.ancestor.employee_id,
+                'position': link.ancestor.position,
+                'department': link.ancestor.department.name if link.ancestor.department else None,
+                'depth': link.depth
+            }
+            for link in hierarchy.ancestors_of(employee.pk)
+        ])
+    
     @action(detail=True, methods=['get'])
     def leave_balance(self, request, pk=None):
         """Solde de congés de l'employé"""
@@ -352,7 +606,7 @@ class EmployeeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
 
 # ==================== LEAVE ====================
 
-class LeaveTypeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class LeaveTypeViewSet(SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les types de congés
     """
@@ -365,13 +619,14 @@ class LeaveTypeViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
     ordering = ['name']
 
 
-class LeaveRequestViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class LeaveRequestViewSet(FastListMixin, SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les demandes de congés
     """
     queryset = LeaveRequest.objects.select_related(
         'organization', 'employee', 'leave_type', 'approved_by'
     ).all()
+    list_reader_class = LeaveRequestListReader
     permission_classes = [IsAuthenticated, IsOrganizationMember]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['organization', 'employee', 'leave_type', 'status']
@@ -409,24 +664,27 @@ class LeaveRequestViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
                 queryset = queryset.none()
         elif role == 'to_approve' and is_admin_manager:
             # Demandes à approuver (si je suis manager/admin)
-            user_member = user.organization_memberships.filter(is_active=True).first()
-            user_role = user_member.role if user_member else 'employee'
+            is_org_admin = user.organization_memberships.filter(
+                is_active=True,
+                role__in=['admin', 'owner']
+            ).exists()
+            employee = getattr(user, 'employee_profile', None)
             
-            if user_role in ['admin', 'owner']:
+            if is_org_admin:
                 # Les Admins/Owners voient TOUTES les demandes en attente de l'organisation
                 queryset = queryset.filter(status='pending')
                 # On exclut ses propres demandes (auto-approbation interdite)
-                if hasattr(user, 'employee_profile'):
-                    queryset = queryset.exclude(employee=user.employee_profile)
-            elif user_role == 'manager':
-                # Les Managers voient seulement les demandes de leurs subordonnés directs
-                if hasattr(user, 'employee_profile'):
-                    queryset = queryset.filter(
-                        employee__manager=user.employee_profile,
-                        status='pending'
-                    )
-                else:
-                    queryset = queryset.none()
+                if employee:
+                    queryset = queryset.exclude(employee=employee)
+            elif employee:
+                # Les Managers voient les demandes dont ils sont l'approbateur courant
+                queryset = queryset.filter(
+                    approvals__approver=employee,
+                    approvals__status=LeaveApproval.STATUS_PENDING,
+                    status='pending'
+                )
+            else:
+                queryset = queryset.none()
         
         return queryset
 
@@ -444,9 +702,26 @@ class LeaveRequestViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
             organization=employee.organization
         )
     
+    def _approval_context(self, request, leave_request):
+        """Retourne (approbateur, override) ou lève PermissionDenied"""
+        approver = getattr(request.user, 'employee_profile', None)
+        if approver is not None and approver.pk == leave_request.employee_id:
+            raise PermissionDenied("Vous ne pouvez pas traiter votre propre demande.")
+        
+        override = request.user.is_superuser or request.user.organization_memberships.filter(
+            organization_id=leave_request.organization_id,
+            is_active=True,
+            role__in=['admin', 'owner']
+        ).exists()
+        
+        if not override and not approvals.has_pending_step(leave_request, approver):
+            raise PermissionDenied("Vous n'êtes pas l'approbateur actuel de cette demande.")
+        
+        return approver, override
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsManagerOrAdmin])
     def approve(self, request, pk=None):
-        """Approuver une demande de congé"""
+        """Approuver une demande de congé (niveau courant ou décision finale)"""
         leave_request = self.get_object()
         
         if leave_request.status != 'pending':
@@ -455,11 +730,11 @@ class LeaveRequestViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        leave_request.status = 'approved'
-        if hasattr(request.user, 'employee_profile'):
-            leave_request.approved_by = request.user.employee_profile
-        leave_request.approved_at = timezone.now()
-        leave_request.save()
+        approver, override = self._approval_context(request, leave_request)
+        try:
+            approvals.approve(leave_request, approver, override=override)
+        except approvals.DecisionError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(leave_request)
         return Response(serializer.data)
@@ -475,12 +750,22 @@ class LeaveRequestViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        leave_request.status = 'rejected'
-        leave_request.rejection_reason = request.data.get('reason', '')
-        leave_request.save()
+        approver, override = self._approval_context(request, leave_request)
+        try:
+            approvals.reject(leave_request, approver, reason=request.data.get('reason', ''), override=override)
+        except approvals.DecisionError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(leave_request)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def pending_count(self, request):
+        """Nombre de demandes en attente dans ma boîte d'approbation"""
+        employee = getattr(request.user, 'employee_profile', None)
+        if not employee:
+            return Response({'count': 0})
+        return Response({'count': approvals.pending_count(employee)})
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsManagerOrAdmin])
     def export_csv(self, request):
@@ -513,12 +798,13 @@ class LeaveRequestViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
 
 # ==================== ATTENDANCE ====================
 
-class AttendanceViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class AttendanceViewSet(FastListMixin, SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les présences
     """
     queryset = Attendance.objects.select_related('organization', 'employee').all()
     serializer_class = AttendanceSerializer
+    list_reader_class = AttendanceReader
     permission_classes = [IsAuthenticated, IsOrganizationMember]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['organization', 'employee', 'date', 'status']
@@ -580,32 +866,156 @@ class AttendanceViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
             'is_clocked_in': attendance.check_in is not None and attendance.check_out is None
         })
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Cumuls mensuels par employé (?month=AAAA-MM, mois courant par défaut ;
+        ?organization, ?employee, ?department) : une lecture de AttendanceMonthlySummary
+        """
+        params = request.query_params
+        try:
+            month = rollups.parse_month(params.get('month'), default=rollups.month_start(timezone.localdate()))
+        except ValueError:
+            raise serializers.ValidationError({"month": "Mois invalide (format AAAA-MM)."})
+        
+        summaries = AttendanceMonthlySummary.objects.filter(month=month).select_related('employee')
+        user = request.user
+        if not user.is_superuser:
+            member = user.organization_memberships.first()
+            if not member:
+                summaries = summaries.none()
+            else:
+                summaries = summaries.filter(organization_id__in=user.organization_memberships.filter(
+                    is_active=True
+                ).values_list('organization_id', flat=True))
+                # Comme pour la liste : un simple employé ne voit que ses propres cumuls
+                if member.role not in ['admin', 'manager', 'owner']:
+                    summaries = summaries.filter(employee__user=user)
+        
+        for param, lookup in (('organization', 'organization_id'), ('employee', 'employee_id'), ('department', 'employee__department_id')):
+            value = params.get(param)
+            if value:
+                if not value.isdigit():
+                    raise serializers.ValidationError({param: "Identifiant invalide."})
+                summaries = summaries.filter(**{lookup: value})
+        
+        summaries = list(summaries.order_by('employee__last_name', 'employee__first_name'))
+        return Response({
+            'month': f"{month:%Y-%m}",
+            'totals': {
+                'employees': len(summaries),
+                'hours_worked': f"{sum(summary.hours_worked for summary in summaries):.2f}",
+                **{
+                    field: sum(getattr(summary, field) for summary in summaries)
+                    for field in ('days_present', 'days_late', 'days_half_day', 'days_absent')
+                },
+            },
+            'results': AttendanceMonthlySummarySerializer(summaries, many=True).data,
+        })
+    
+    def _requested_organization(self, request):
+        """``(organization_id, membre)`` de ?organization (première organisation par défaut) ; 403 si non membre"""
+        memberships = request.user.organization_memberships.filter(is_active=True)
+        org_id = request.query_params.get('organization')
+        if org_id:
+            if not org_id.isdigit():
+                raise serializers.ValidationError({"organization": "Identifiant invalide."})
+        else:
+            org_id = memberships.values_list('organization_id', flat=True).first()
+            if org_id is None:
+                raise serializers.ValidationError({"organization": "Aucune organisation."})
+        member = memberships.filter(organization_id=org_id).first()
+        if not request.user.is_superuser and member is None:
+            raise PermissionDenied("Vous n'êtes pas membre de cette organisation.")
+        return int(org_id), member
+    
+    @staticmethod
+    def _requested_period(params):
+        """``(start, end)`` de ?month=AAAA-MM (mois courant par défaut) ou ?start=&end= (AAAA-MM-JJ)"""
+        try:
+            if params.get('start') or params.get('end'):
+                start = datetime.date.fromisoformat(params.get('start', ''))
+                end = datetime.date.fromisoformat(params.get('end', ''))
+            else:
+                start = rollups.parse_month(params.get('month'), default=rollups.month_start(timezone.localdate()))
+                end = rollups.month_end(start)
+        except ValueError:
+            raise serializers.ValidationError({"period": "Période invalide (?month=AAAA-MM ou ?start=&end= AAAA-MM-JJ)."})
+        if end < start or (end - start).days > 366:
+            raise serializers.ValidationError({"period": "La période doit couvrir de 1 à 366 jours."})
+        return start, end
+    
+    @action(detail=False, methods=['get'])
+    def timesheets(self, request):
+        """
+        Feuilles de temps par employé (heures, heures sup. jour/semaine, retards, nuit, en minutes) :
+        ?month=AAAA-MM (mois courant par défaut) ou ?start=&end= (AAAA-MM-JJ), ?organization, ?employee
+        """
+        params = request.query_params
+        org_id, member = self._requested_organization(request)
+        start, end = self._requested_period(params)
+        
+        employee_ids = None
+        if params.get('employee'):
+            if not params['employee'].isdigit():
+                raise serializers.ValidationError({"employee": "Identifiant invalide."})
+            employee_ids = [int(params['employee'])]
+        # Un simple employé ne voit que sa propre feuille de temps
+        if member is not None and member.role not in ['admin', 'manager', 'owner'] and not request.user.is_superuser:
+            own = list(Employee.objects.filter(user=request.user).values_list('id', flat=True))
+            employee_ids = [pk for pk in own if employee_ids is None or pk in employee_ids]
+        
+        rules = timesheets.get_rules()
+        results = timesheets.compute(org_id, start, end, rules=rules, employee_ids=employee_ids)
+        employees = Employee.objects.only('first_name', 'last_name', 'employee_id').in_bulk(list(results))
+        return Response({
+            'organization': org_id,
+            'start': start,
+            'end': end,
+            'rules': rules._asdict(),
+            'results': [
+                {
+                    'employee': employee_id,
+                    'employee_detail': {
+                        'id': employee_id,
+                        'full_name': employees[employee_id].full_name,
+                        'employee_id': employees[employee_id].employee_id
+                    },
+                    **metrics
+                }
+                for employee_id, metrics in sorted(
+                    results.items(), key=lambda item: (employees[item[0]].last_name, employees[item[0]].first_name)
+                )
+            ],
+        })
+    
+    @action(detail=False, methods=['get'], url_path='arrival-heatmap')
+    def arrival_heatmap(self, request):
+        """
+        Arrivées par département, jour de la semaine et créneau de 15 minutes, avec les retards
+        (compteurs agrégés en base, en cache) : ?month=AAAA-MM ou ?start=&end=, ?organization, ?department
+        """
+        org_id, member = self._requested_organization(request)
+        if not request.user.is_superuser and member.role not in ['admin', 'manager', 'owner']:
+            raise PermissionDenied("Réservé aux managers et administrateurs.")
+        start, end = self._requested_period(request.query_params)
+        department = request.query_params.get('department')
+        if department and not department.isdigit():
+            raise serializers.ValidationError({"department": "Identifiant invalide."})
+        
+        heatmap = analytics.get_arrival_heatmap(org_id, start, end, int(department) if department else None)
+        return Response({'organization': org_id, **heatmap})
+    
     @action(detail=False, methods=['post'])
     def check_in(self, request):
         """Pointer à l'arrivée"""
         if not hasattr(request.user, 'employee_profile'):
             return Response({'error': 'Profil employé non trouvé'}, status=status.HTTP_400_BAD_REQUEST)
             
-        employee = request.user.employee_profile
-        today = timezone.now().date()
-        now_time = timezone.now().time()
-        
-        attendance, created = Attendance.objects.get_or_create(
-            employee=employee,
-            date=today,
-            defaults={
-                'organization': employee.organization,
-                'check_in': now_time,
-                'status': 'present'
-            }
-        )
-        
-        if not created:
-            if attendance.check_in:
-                return Response({'error': 'Déjà pointé aujourd\'hui'}, status=status.HTTP_400_BAD_REQUEST)
-            attendance.check_in = now_time
-            attendance.save()
-            
+        try:
+            attendance = punches.check_in(request.user.employee_profile)
+        except punches.PunchError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(AttendanceSerializer(attendance).data)
 
     @action(detail=False, methods=['post'])
@@ -614,34 +1024,68 @@ class AttendanceViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
         if not hasattr(request.user, 'employee_profile'):
             return Response({'error': 'Profil employé non trouvé'}, status=status.HTTP_400_BAD_REQUEST)
             
-        employee = request.user.employee_profile
-        today = timezone.now().date()
-        now_time = timezone.now().time()
-        
-        attendance = Attendance.objects.filter(employee=employee, date=today).first()
+        try:
+            attendance = punches.check_out(request.user.employee_profile)
+        except punches.PunchError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(AttendanceSerializer(attendance).data)
+
+    @action(
+        detail=False, methods=['post'], url_path='punches',
+        permission_classes=[IsAuthenticated, IsManagerOrAdmin]
+    )
+    def ingest_punches(self, request):
+        """
+        Lot de pointages de badgeuses (idempotent) :
+        {"organization": id, "events": [{"employee_id", "timestamp", "direction", "device_id"}, ...]}
+        """
+        org_id = str(request.data.get('organization', ''))
+        organization = Organization.objects.filter(id=org_id).first() if org_id.isdigit() else None
+        if organization is None:
+            raise serializers.ValidationError({"organization": "L'organisation est requise."})
+        if not request.user.is_superuser and not request.user.organization_memberships.filter(
+            organization=organization, is_active=True, role__in=['manager', 'admin', 'owner']
+        ).exists():
+            raise PermissionDenied("Vous n'êtes pas gestionnaire de cette organisation.")
         
-        if not attendance or not attendance.check_in:
-            return Response({'error': 'Vous devez d\'abord pointer à l\'arrivée'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        if attendance.check_out:
-            return Response({'error': 'Déjà pointé au départ aujourd\'hui'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        attendance.check_out = now_time
+        events = request.data.get('events')
+        if not isinstance(events, list):
+            raise serializers.ValidationError({"events": "Une liste d'événements est requise."})
+        if len(events) > punches.MAX_BATCH_SIZE:
+            raise serializers.ValidationError({"events": f"{punches.MAX_BATCH_SIZE} événements au plus par lot."})
         
-        # Calculer les heures travaillées
-        import datetime
-        dt_in = datetime.datetime.combine(datetime.date.today(), attendance.check_in)
-        dt_out = datetime.datetime.combine(datetime.date.today(), now_time)
-        diff = dt_out - dt_in
-        attendance.hours_worked = diff.total_seconds() / 3600
+        results, valid = {}, []
+        input_serializer = PunchEventInputSerializer()
+        for index, event in enumerate(events):
+            try:
+                valid.append((index, input_serializer.run_validation(event)))
+            except serializers.ValidationError as exc:
+                results[index] = punches.EVENT_REJECTED, exc.detail
         
-        attendance.save()
-        return Response(AttendanceSerializer(attendance).data)
-
+        ingested, days = punches.ingest_events(organization, valid)
+        results.update(ingested)
+        statuses = [results[index][0] for index in range(len(events))]
+        return Response({
+            'received': len(events),
+            'created': statuses.count(punches.EVENT_CREATED),
+            'duplicates': statuses.count(punches.EVENT_DUPLICATE),
+            'rejected': statuses.count(punches.EVENT_REJECTED),
+            'attendances_updated': days,
+            'results': [
+                {'index': index, 'status': event_status, **({'errors': errors} if errors else {})}
+                for index, (event_status, errors) in sorted(results.items())
+            ],
+        })
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsManagerOrAdmin])
     def export_csv(self, request):
-        """Exporter les présences en CSV"""
+        """Exporter les présences en CSV (?year=AAAA inclut les présences archivées de l'année)"""
         queryset = self.filter_queryset(self.get_queryset())
+        year = request.query_params.get('year')
+        if year:
+            if not year.isdigit():
+                raise serializers.ValidationError({"year": "Année invalide."})
+            queryset = queryset.filter(date__year=int(year))
         
         import csv
         from django.http import HttpResponse
@@ -662,13 +1106,35 @@ class AttendanceViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
                 att.hours_worked,
                 att.status
             ])
+        
+        # Années archivées : lignes relues depuis le CSV compressé, mêmes filtres que la table
+        if year:
+            archives = AttendanceArchive.objects.filter(year=int(year))
+            if not request.user.is_superuser:
+                archives = archives.filter(organization_id__in=request.user.organization_memberships.filter(
+                    is_active=True
+                ).values_list('organization_id', flat=True))
+            if request.query_params.get('organization'):
+                archives = archives.filter(organization_id=request.query_params['organization'])
+            wanted = {field: request.query_params[field] for field in ('employee', 'date', 'status') if request.query_params.get(field)}
+            for row in partitions.archived_rows(archives):
+                if all(row[field] == value for field, value in wanted.items()):
+                    writer.writerow([
+                        row['employee_name'],
+                        row['employee_id'],
+                        row['date'],
+                        row['check_in'],
+                        row['check_out'],
+                        row['hours_worked'],
+                        row['status']
+                    ])
             
         return response
 
 
 # ==================== DOCUMENT ====================
 
-class DocumentViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class DocumentViewSet(SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les documents
     """
@@ -687,7 +1153,7 @@ class DocumentViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
 
 # ==================== PAYROLL ====================
 
-class PayrollViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class PayrollViewSet(SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les fiches de paie
     """
@@ -701,50 +1167,159 @@ class PayrollViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsOrganizationAdmin])
     def generate(self, request):
-        """Génère les fiches de paie pour tous les employés pour un mois/année donné"""
-        month = request.data.get('month')
-        year = request.data.get('year')
-        organization = self.get_organization()
-        
-        if not month or not year:
+        """
+        Génère les fiches de paie (brouillons) de tous les employés pour un mois/année donné
+        (api.payroll) ; ``recompute`` recalcule les brouillons existants
+        """
+        try:
+            month = int(request.data.get('month'))
+            year = int(request.data.get('year'))
+            datetime.date(year, month, 1)
+        except (TypeError, ValueError):
             return Response({"error": "Le mois et l'année sont requis."}, status=400)
-            
-        employees = Employee.objects.filter(organization=organization, is_active=True)
-        created_count = 0
-        skipped_count = 0
-        
-        for employee in employees:
-            # Vérifier si elle existe déjà
-            if Payroll.objects.filter(employee=employee, month=month, year=year).exists():
-                skipped_count += 1
-                continue
-            
-            # Calcul basique
-            base_salary = (employee.salary or 0) / 12
-            # Simulation : 22% de retenues, 5% de bonus
-            bonuses = base_salary * 0.05
-            deductions = base_salary * 0.22
-            net_salary = base_salary + bonuses - deductions
-            
-            Payroll.objects.create(
-                organization=organization,
-                employee=employee,
-                month=month,
-                year=year,
-                base_salary=base_salary,
-                bonuses=bonuses,
-                deductions=deductions,
-                net_salary=net_salary,
-                status='draft'
-            )
-            created_count += 1
-            
+        organization = self.get_organization(roles=['admin', 'owner'])
+        recompute = str(request.data.get('recompute', '')).lower() in ('1', 'true', 'yes')
+        
+        counts = payroll.generate(organization, year, month, recompute=recompute)
         return Response({
-            "message": f"Génération terminée: {created_count} créées, {skipped_count} déjà existantes.",
-            "created": created_count,
-            "skipped": skipped_count
+            "message": (
+                f"Génération terminée: {counts['created']} créées, {counts['updated']} recalculées, "
+                f"{counts['skipped']} déjà existantes."
+            ),
+            **counts
         })
 
+    @action(detail=False, methods=['post'])
+    def process(self, request):
+        """
+        Passe les brouillons d'un mois au statut traité, puis rend leurs bulletins en tâche de fond
+        par tranches réparties entre workers (api.payslips)
+        """
+        try:
+            month = int(request.data.get('month'))
+            year = int(request.data.get('year'))
+            datetime.date(year, month, 1)
+        except (TypeError, ValueError):
+            return Response({"error": "Le mois et l'année sont requis."}, status=400)
+        organization = self.get_organization(roles=['admin', 'owner'])
+        
+        with transaction.atomic():
+            processed = Payroll.objects.filter(
+                organization=organization, year=year, month=month, status=Payroll.STATUS_DRAFT
+            ).update(status=Payroll.STATUS_PROCESSED, updated_at=timezone.now())
+            analytics.invalidate_payroll_summary(organization.pk, year, month)
+            
+            def queue_payslips():
+                try:
+                    render_period_payslips.delay(organization.pk, year, month)
+                except Exception:
+                    # Les fiches sont traitées : les bulletins pourront être rendus par la commande render_payslips
+                    logger.exception("Impossible de planifier le rendu des bulletins %02d/%s", month, year)
+            
+            transaction.on_commit(queue_payslips)
+        return Response({"message": f"{processed} fiches de paie traitées.", "processed": processed})
+    
+    @action(detail=False, methods=['post'])
+    def simulate(self, request):
+        """
+        Simulation de la paie d'un mois, sans écriture : ``salary_increase`` (``0.03`` = +3 %) et taux
+        (``bonus_rate``, ``deduction_rate``, ``overtime_rate``) remplacent les réglages ; totaux et
+        détail par département, comparés à la paie aux réglages en vigueur
+        """
+        try:
+            month = int(request.data.get('month'))
+            year = int(request.data.get('year'))
+            datetime.date(year, month, 1)
+        except (TypeError, ValueError):
+            return Response({"error": "Le mois et l'année sont requis."}, status=400)
+        organization = self.get_organization(roles=['admin', 'owner'])
+        overrides = {
+            name: request.data[name] for name in payroll.DEFAULT_RATES
+            if request.data.get(name) not in (None, '')
+        }
+        
+        try:
+            simulation = payroll.simulate(
+                organization, year, month, salary_increase=request.data.get('salary_increase') or None, **overrides
+            )
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
+        return Response({'organization': organization.pk, 'currency': organization.currency, **simulation})
+    
+    @action(detail=False, methods=['get'], url_path='bank-file')
+    def bank_file(self, request):
+        """
+        Fichier de virement des salaires de ``?year=&month=`` (api.payments), écrit en flux :
+        ``?type=sepa`` (pain.001, défaut) ou ``csv`` ; ``?status=processed`` (défaut) ou ``paid`` ;
+        ``?execution_date=AAAA-MM-JJ`` (SEPA, défaut : aujourd'hui)
+        """
+        params = request.query_params
+        try:
+            month = int(params.get('month'))
+            year = int(params.get('year'))
+            datetime.date(year, month, 1)
+            execution_date = (
+                datetime.date.fromisoformat(params['execution_date']) if params.get('execution_date') else None
+            )
+        except (TypeError, ValueError):
+            return Response({"error": "Mois, année ou date d'exécution invalide."}, status=400)
+        file_type = params.get('type') or 'sepa'
+        if file_type not in ('sepa', 'csv'):
+            return Response({"error": "Type de fichier inconnu (sepa ou csv)."}, status=400)
+        status_ = params.get('status') or Payroll.STATUS_PROCESSED
+        if status_ not in payments.EXPORT_STATUSES:
+            return Response({"error": "Seules les fiches traitées ou payées peuvent être virées."}, status=400)
+        organization = self.get_organization(roles=['admin', 'owner'])
+        
+        queryset = payments.payments(organization, year, month, status_)
+        try:
+            expected = payments.prepare(organization, queryset, file_type)
+        except payments.PaymentExportError as exc:
+            return Response({"error": str(exc), "details": exc.errors}, status=400)
+        
+        if file_type == 'sepa':
+            content = payments.sepa_xml(organization, queryset, year, month, expected, execution_date)
+            response = StreamingHttpResponse(content, content_type='application/xml; charset=utf-8')
+            filename = f"virements_{organization.slug}_{year}{month:02d}.xml"
+        else:
+            content = payments.bank_csv(organization, queryset, year, month, expected)
+            response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+            filename = f"virements_{organization.slug}_{year}{month:02d}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Payment-Count'] = expected[0]
+        response['X-Payment-Control-Sum'] = f"{expected[1]:.2f}"
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Masse salariale de ``?year=`` (défaut : année en cours) ou du seul ``?month=``, comparée à l'année
+        précédente : totaux par mois, département et type de contrat (api.analytics) ;
+        ``?status=`` (répétable) filtre les fiches, ``?pivot=department|employment_type&metric=`` croise par mois
+        """
+        params = request.query_params
+        try:
+            year = int(params.get('year') or timezone.localdate().year)
+            month = int(params['month']) if params.get('month') else None
+            datetime.date(year, month or 1, 1)
+        except ValueError:
+            return Response({"error": "Année ou mois invalide."}, status=400)
+        statuses = set(params.getlist('status'))
+        if statuses - {choice for choice, _ in Payroll.STATUS_CHOICES}:
+            return Response({"error": "Statut inconnu."}, status=400)
+        pivot = params.get('pivot') or None
+        metric = params.get('metric') or 'net_salary'
+        if pivot is not None and pivot not in analytics.PAYROLL_PIVOTS:
+            return Response({"error": f"Pivot inconnu (valeurs : {', '.join(analytics.PAYROLL_PIVOTS)})."}, status=400)
+        if metric not in analytics.PAYROLL_AMOUNTS:
+            return Response({"error": f"Montant inconnu (valeurs : {', '.join(analytics.PAYROLL_AMOUNTS)})."}, status=400)
+        
+        organization = self.get_organization(roles=['admin', 'owner'])
+        summary = analytics.build_payroll_summary(
+            organization.pk, year, month, statuses=statuses, pivot=pivot, metric=metric
+        )
+        return Response({'organization': organization.pk, 'currency': organization.currency, **summary})
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_payrolls(self, request):
         """Mes fiches de paie"""
@@ -759,7 +1334,7 @@ class PayrollViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
 
 # ==================== WIDGETS ====================
 
-class EventViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class EventViewSet(SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour afficher les événements (Dashboard)
     """
@@ -794,7 +1369,7 @@ class EventViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
                     )
 
 
-class ProjectViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
+class ProjectViewSet(SparseFieldsViewMixin, OrganizationFilterMixin, viewsets.ModelViewSet):
     """
     ViewSet pour afficher les projets clés (Dashboard)
     """
@@ -805,7 +1380,7 @@ class ProjectViewSet(OrganizationFilterMixin, viewsets.ModelViewSet):
     filterset_fields = ['status']
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
 import environ
+from celery.schedules import crontab
 import os
 
 # Initialize environment variables
@@ -50,6 +51,7 @@ MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # For static files in production
+    "api.middleware.CompressionMiddleware",  # brotli/gzip des réponses volumineuses
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -84,6 +86,11 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default='sqlite:///db.sqlite3')
 }
 
+# Cache (locmemcache:// par défaut, Redis en production via CACHE_URL)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://')
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -136,11 +143,24 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "api.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Compression des réponses (api.middleware) : taille minimale en octets et qualité brotli (0-11)
+RESPONSE_COMPRESSION_MIN_SIZE = env.int('RESPONSE_COMPRESSION_MIN_SIZE', default=1024)
+RESPONSE_BROTLI_QUALITY = env.int('RESPONSE_BROTLI_QUALITY', default=5)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -193,6 +213,57 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    # Absences de la veille (employés actifs sans présence ni congé, hors jours fériés)
+    'mark-absences': {
+        'task': 'api.tasks.mark_absences',
+        'schedule': crontab(hour=env.int('ABSENCE_MARKING_HOUR', default=2), minute=0),
+    },
+    # Partitions mensuelles des présences à venir (PostgreSQL)
+    'create-attendance-partitions': {
+        'task': 'api.tasks.create_attendance_partitions',
+        'schedule': crontab(day_of_month=1, hour=3, minute=0),
+    },
+}
+
+# --- HR Workflows ---
+# Nombre de niveaux de la chaîne hiérarchique sollicités pour approuver un congé
+LEAVE_APPROVAL_LEVELS = env.int('LEAVE_APPROVAL_LEVELS', default=2)
+# Format des identifiants employés générés ({year}, {number}, {org} = slug de l'organisation)
+EMPLOYEE_ID_FORMAT = env('EMPLOYEE_ID_FORMAT', default='EMP-{year}-{number:04d}')
+# Durée maximale d'une journée de travail : un départ ne clôt pas une arrivée plus ancienne
+ATTENDANCE_MAX_SHIFT_HOURS = env.int('ATTENDANCE_MAX_SHIFT_HOURS', default=16)
+# Partitions mensuelles des présences créées à l'avance (PostgreSQL)
+ATTENDANCE_PARTITIONS_AHEAD = env.int('ATTENDANCE_PARTITIONS_AHEAD', default=3)
+# Jours ouvrés pour le marquage des absences (0 = lundi ... 6 = dimanche)
+ATTENDANCE_WORKING_DAYS = [int(day) for day in env.list('ATTENDANCE_WORKING_DAYS', default=['0', '1', '2', '3', '4'])]
+# Règles des feuilles de temps (api.timesheets) : seuils d'heures sup. en heures, arrondi et tolérance en minutes
+TIMESHEET_RULES = {
+    'daily_threshold': env.float('TIMESHEET_DAILY_THRESHOLD', default=8),
+    'weekly_threshold': env.float('TIMESHEET_WEEKLY_THRESHOLD', default=35),
+    'rounding': env.int('TIMESHEET_ROUNDING_MINUTES', default=0),
+    'rounding_mode': env('TIMESHEET_ROUNDING_MODE', default='nearest'),
+    'work_start': env('TIMESHEET_WORK_START', default='09:00'),
+    'late_grace': env.int('TIMESHEET_LATE_GRACE_MINUTES', default=5),
+    'night_start': env('TIMESHEET_NIGHT_START', default='21:00'),
+    'night_end': env('TIMESHEET_NIGHT_END', default='06:00'),
+}
+# Paie (api.payroll) : règles appliquées dans l'ordre et taux ; calcul réparti entre processus au-delà du seuil
+PAYROLL_RULES = env.list('PAYROLL_RULES', default=[
+    'api.payroll.base_salary',
+    'api.payroll.unpaid_leave',
+    'api.payroll.unjustified_absences',
+    'api.payroll.overtime',
+    'api.payroll.bonus',
+    'api.payroll.contributions',
+])
+PAYROLL_RATES = {
+    'bonus_rate': env('PAYROLL_BONUS_RATE', default='0.05'),
+    'deduction_rate': env('PAYROLL_DEDUCTION_RATE', default='0.22'),
+    'overtime_rate': env('PAYROLL_OVERTIME_RATE', default='1.25'),
+}
+PAYROLL_PARALLEL_MIN_EMPLOYEES = env.int('PAYROLL_PARALLEL_MIN_EMPLOYEES', default=50000)
+PAYROLL_WORKERS = env.int('PAYROLL_WORKERS', default=0)  # 0 = nombre de processeurs
 
 # --- Stripe Configuration ---
 STRIPE_PUBLIC_KEY = env('STRIPE_PUBLIC_KEY', default='')
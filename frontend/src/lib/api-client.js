@@ -84,7 +84,8 @@ export const api = {
 
     // Employees
     getEmployees: (params) => apiClient.get("/api/employees/", { params }),
-    getEmployee: (id) => apiClient.get(`/api/employees/${id}/`),
+    lookupEmployees: (q, params) => apiClient.get("/api/employees/lookup/", { params: { q, ...params } }),
+    getEmployee: (id) => apiClient.get(`/api/employees/${id}/`, { params: { expand: "department,manager" } }),
     createEmployee: (data) => apiClient.post("/api/employees/", data),
     updateEmployee: (id, data) => apiClient.put(`/api/employees/${id}/`, data),
     patchEmployee: (id, data) => apiClient.patch(`/api/employees/${id}/`, data),
@@ -101,8 +102,8 @@ export const api = {
     getLeaveTypes: (params) => apiClient.get("/api/leave-types/", { params }),
 
     // Leave Requests
-    getLeaveRequests: (params) => apiClient.get("/api/leaves/", { params }),
-    getLeaveRequest: (id) => apiClient.get(`/api/leaves/${id}/`),
+    getLeaveRequests: (params) => apiClient.get("/api/leaves/", { params: { expand: "leave_type", ...params } }),
+    getLeaveRequest: (id) => apiClient.get(`/api/leaves/${id}/`, { params: { expand: "employee,leave_type,approvals" } }),
     createLeaveRequest: (data) => apiClient.post("/api/leaves/", data),
     updateLeaveRequest: (id, data) => apiClient.put(`/api/leaves/${id}/`, data),
     deleteLeaveRequest: (id) => apiClient.delete(`/api/leaves/${id}/`),
@@ -113,6 +114,9 @@ export const api = {
     // Attendance
     getAttendances: (params) => apiClient.get("/api/attendances/", { params }),
     getAttendanceStatus: () => apiClient.get("/api/attendances/current_status/"),
+    getAttendanceSummary: (params) => apiClient.get("/api/attendances/summary/", { params }),
+    getTimesheets: (params) => apiClient.get("/api/attendances/timesheets/", { params }),
+    getArrivalHeatmap: (params) => apiClient.get("/api/attendances/arrival-heatmap/", { params }),
     checkIn: (data) => apiClient.post("/api/attendances/check_in/", data),
     checkOut: (data) => apiClient.post("/api/attendances/check_out/", data),
     exportAttendances: (params) => apiClient.get("/api/attendances/export_csv/", { params, responseType: 'blob' }),
@@ -124,9 +128,13 @@ export const api = {
     }),
 
     // Payroll
-    getPayrolls: (params) => apiClient.get("/api/payrolls/", { params }),
-    getMyPayrolls: () => apiClient.get("/api/payrolls/my_payrolls/"),
+    getPayrolls: (params) => apiClient.get("/api/payrolls/", { params: { expand: "employee", ...params } }),
+    getMyPayrolls: () => apiClient.get("/api/payrolls/my_payrolls/", { params: { expand: "employee" } }),
     generatePayrolls: (data) => apiClient.post("/api/payrolls/generate/", data),
+    processPayrolls: (data) => apiClient.post("/api/payrolls/process/", data),
+    getPayrollSummary: (params) => apiClient.get("/api/payrolls/summary/", { params }),
+    downloadPayrollBankFile: (params) => apiClient.get("/api/payrolls/bank-file/", { params, responseType: 'blob' }),
+    simulatePayroll: (data) => apiClient.post("/api/payrolls/simulate/", data),
     createPayroll: (data) => apiClient.post("/api/payrolls/", data),
     updatePayroll: (id, data) => apiClient.put(`/api/payrolls/${id}/`, data),
     deletePayroll: (id) => apiClient.delete(`/api/payrolls/${id}/`),